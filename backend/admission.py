@@ -0,0 +1,111 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from models import ConcurrencyLimitConfig
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a call is shed because a concurrency limit and its queue are full."""
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+class Limiter:
+    """
+    Concurrency limit with a bounded FIFO wait queue. A call either gets a
+    slot right away, waits in the queue for at most `queue_timeout`, or is
+    rejected at once when the queue is full. Released slots are handed
+    straight to the oldest waiter. Limits can be changed while calls hold
+    slots. Used from the event loop thread only.
+    """
+    def __init__(self, label: str, config: ConcurrencyLimitConfig):
+        self.label = label  # "global" or the tool name
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.configure(config)
+
+    def configure(self, config: ConcurrencyLimitConfig):
+        self.max_concurrent = config.max_concurrent
+        self.max_queue = config.max_queue
+        self.queue_timeout = config.queue_timeout
+        # A raised limit admits queued calls now rather than at the next release
+        while self._waiters and self._has_capacity():
+            self.active += 1
+            self._waiters.popleft().set_result(None)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _has_capacity(self) -> bool:
+        return not self.max_concurrent or self.active < self.max_concurrent
+
+    async def acquire(self) -> float:
+        """Takes a slot, waiting if allowed; returns the seconds spent queued."""
+        if self._has_capacity() and not self._waiters:
+            self.active += 1
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            raise AdmissionRejected(
+                f"Concurrency limit for {self.label} reached ({self.max_concurrent} running, "
+                f"{len(self._waiters)} queued); retry later",
+                "queue_full"
+            )
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            raise AdmissionRejected(
+                f"Concurrency limit for {self.label} reached; no slot within {self.queue_timeout}s, retry later",
+                "queue_timeout"
+            )
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # The slot was handed over just as the caller went away
+            else:
+                self._discard(waiter)
+            raise
+        return time.perf_counter() - started
+
+    def _discard(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self):
+        """Frees a slot, handing it to the oldest waiter if there is one."""
+        # After a lowered limit, slots are retired until active fits under it again
+        if not self.max_concurrent or self.active <= self.max_concurrent:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.active -= 1
+
+class AdmissionController:
+    """Per-tool limiters in front of one server-wide limiter."""
+    def __init__(self, global_limits: ConcurrencyLimitConfig):
+        self.global_limiter = Limiter("global", global_limits)
+        self.tool_limiters: Dict[str, Limiter] = {}
+
+    def configure(self, global_limits: ConcurrencyLimitConfig, tool_limits: Dict[str, ConcurrencyLimitConfig]):
+        self.global_limiter.configure(global_limits)
+        for name, limits in tool_limits.items():
+            limiter = self.tool_limiters.get(name)
+            if limiter is None:
+                self.tool_limiters[name] = Limiter(name, limits)
+            else:
+                limiter.configure(limits)
+        # Calls holding a dropped limiter release into it; it is simply no longer consulted
+        for name in set(self.tool_limiters) - set(tool_limits):
+            del self.tool_limiters[name]
+
+    def limiters_for(self, name: str) -> Tuple[Limiter, ...]:
+        """Limiters a call to `name` must pass, tool limit first."""
+        limiter: Optional[Limiter] = self.tool_limiters.get(name)
+        return (limiter, self.global_limiter) if limiter is not None else (self.global_limiter,)
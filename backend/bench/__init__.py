@@ -0,0 +1 @@
+"""Benchmarks and load checks for the FastAPI_MCP_PoC backend."""
@@ -0,0 +1,119 @@
+"""
+Compares the vector backends on recall, latency and footprint.
+
+Synthetic, clustered, L2-normalized vectors are loaded into each backend.
+Ground truth is an exact brute-force top-k over the float32 vectors;
+recall@k is the fraction of true neighbours each backend returns.
+Embeddings are generated directly, so no embedding model is needed.
+
+A backend is given as `kind` or `kind:storage`, e.g. numpy:int8 for the
+NumPy index with int8 quantized storage; by default chroma, numpy and
+numpy:int8 are measured, each as configured out of the box (int8 with
+its exact re-rank at --rerank-factor 4). Bytes per vector are reported
+both as scanned by each search and as stored on disk (documents and
+metadata included).
+
+Usage (from backend/):
+    python -m bench.backends --docs 50000 --queries 500 --k 10
+    python -m bench.backends --backends numpy numpy:int8 --rerank-factor 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List
+import numpy as np
+from bench.loop_latency import percentile
+from vector_backends import VectorBackend, create_backend
+
+def disk_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+def synthetic_vectors(count: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Draws normalized vectors around random cluster centres."""
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    truth = []
+    for query in queries:
+        scores = vectors @ query
+        truth.append(set(np.argpartition(-scores, k - 1)[:k].tolist()))
+    return truth
+
+def run_backend(
+    backend: VectorBackend,
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    truth: List[set],
+    k: int,
+    batch_size: int,
+    db_path: str
+) -> Dict[str, float]:
+    started = time.perf_counter()
+    for start in range(0, len(vectors), batch_size):
+        end = min(start + batch_size, len(vectors))
+        backend.add_many(
+            [str(i) for i in range(start, end)],
+            [f"doc {i}" for i in range(start, end)],
+            vectors[start:end],
+            [None] * (end - start)
+        )
+    ingest_seconds = time.perf_counter() - started
+
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        result = backend.query(query.tolist(), k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(expected & {int(doc_id) for doc_id in result.ids})
+    total_seconds = sum(latencies) / 1000
+    return {
+        "scanned_bytes_per_vector": getattr(backend, "bytes_per_vector", None),
+        "disk_bytes_per_vector": round(disk_bytes(db_path) / len(vectors), 1),
+        "ingest_docs_per_sec": round(len(vectors) / ingest_seconds, 1),
+        "recall_at_k": round(hits / (k * len(queries)), 4),
+        "latency_p50_ms": round(percentile(latencies, 50), 3),
+        "latency_p99_ms": round(percentile(latencies, 99), 3),
+        "qps": round(len(queries) / total_seconds, 1) if total_seconds else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy", "numpy:int8"], help="kind or kind:storage")
+    parser.add_argument("--rerank-factor", type=int, default=4, help="Candidates re-ranked per result with int8 storage")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = synthetic_vectors(args.docs, args.dim, args.clusters, rng)
+    queries = synthetic_vectors(args.queries, args.dim, args.clusters, rng)
+    truth = exact_top_k(vectors, queries, args.k)
+
+    results = {}
+    for spec in args.backends:
+        kind, _, storage = spec.partition(":")
+        with tempfile.TemporaryDirectory() as db_path:
+            backend = create_backend(
+                kind, db_path, "bench", embedding_fn=None, storage=storage or "float32",
+                rerank_factor=args.rerank_factor
+            )
+            results[spec] = run_backend(backend, vectors, queries, truth, args.k, args.batch_size, db_path)
+        print(f"{spec:>14}: {results[spec]}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"params": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
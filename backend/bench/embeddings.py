@@ -0,0 +1,41 @@
+"""Offline stand-in for the ONNX embedding model used by benchmarks."""
+import hashlib
+import re
+from typing import Any, Dict
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+_TOKEN = re.compile(r"\w+")
+
+class HashingEmbeddingFunction(EmbeddingFunction[Documents]):
+    """
+    Deterministic feature-hashing embeddings: each token is hashed into one
+    of `dim` buckets and the vector is L2-normalized. Texts sharing words get
+    similar vectors, which is enough for latency and recall comparisons
+    without downloading a model.
+    """
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def __call__(self, input: Documents) -> Embeddings:
+        vectors = np.zeros((len(input), self.dim), dtype=np.float32)
+        for row, text in enumerate(input):
+            for token in _TOKEN.findall(text.lower()):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return list(vectors / norms)
+
+    @staticmethod
+    def name() -> str:
+        return "bench_hashing"
+
+    def get_config(self) -> Dict[str, Any]:
+        return {"dim": self.dim}
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "HashingEmbeddingFunction":
+        return HashingEmbeddingFunction(dim=config.get("dim", 384))
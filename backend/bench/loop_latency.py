@@ -0,0 +1,106 @@
+"""
+Measures event-loop responsiveness while the knowledge base is under load.
+
+A probe coroutine wakes up every few milliseconds, standing in for a
+health check or /metrics poll; its scheduling delay is what every other
+request on the worker would see. The probe runs idle, then alongside N
+concurrent kb_search queries executed inline on the loop (the old
+behaviour) and through VectorService's executor.
+
+Usage (from backend/):
+    python -m bench.loop_latency --concurrency 16 --duration 5
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from typing import Dict, List
+from bench.embeddings import HashingEmbeddingFunction
+from models import KnowledgeBaseConfig
+from vector_service import VectorService, VectorServiceOverloaded
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Returns the pct-th percentile of samples (nearest rank)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+async def probe(stop: asyncio.Event, interval: float, delays: List[float]):
+    """Records how late the loop wakes the probe up after each sleep."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        delays.append((time.perf_counter() - start - interval) * 1000)
+
+async def search_inline(service: VectorService, query: str):
+    """Pre-offload behaviour: embedding and search run on the event loop."""
+    service.backend.query(service.embedding_fn([query])[0], 3)
+
+async def search_offloaded(service: VectorService, query: str):
+    try:
+        await service.query(query)
+    except VectorServiceOverloaded:
+        pass
+
+async def run_scenario(service: VectorService, search, concurrency: int, duration: float) -> Dict[str, float]:
+    stop = asyncio.Event()
+    delays: List[float] = []
+    completed = 0
+
+    async def client(i: int):
+        nonlocal completed
+        while not stop.is_set():
+            await search(service, f"benchmark query {i} {completed}")
+            completed += 1
+            # Yield so inline searches still let the probe run between calls
+            await asyncio.sleep(0)
+
+    tasks = [asyncio.create_task(probe(stop, 0.005, delays))]
+    if search is not None:
+        tasks += [asyncio.create_task(client(i)) for i in range(concurrency)]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return {
+        "probe_p50_ms": round(percentile(delays, 50), 2),
+        "probe_p99_ms": round(percentile(delays, 99), 2),
+        "probe_mean_ms": round(statistics.fmean(delays), 2) if delays else 0.0,
+        "searches_per_sec": round(completed / duration, 1),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--docs", type=int, default=500)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default="chroma")
+    parser.add_argument("--offline", action="store_true", help="Use hashing embeddings instead of the ONNX model")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as db_path:
+        service = VectorService(
+            db_path=db_path,
+            config=KnowledgeBaseConfig(
+                backend=args.backend, max_workers=args.max_workers, max_queue=args.concurrency
+            ),
+            embedding_fn=HashingEmbeddingFunction() if args.offline else None
+        )
+        docs = [f"Synthetic document {i} about topic {i % 37}" for i in range(args.docs)]
+        await service.add_documents(docs, batch_size=1000)
+
+        scenarios = {
+            "idle": None,
+            "inline": search_inline,
+            "offloaded": search_offloaded,
+        }
+        for name, search in scenarios.items():
+            result = await run_scenario(service, search, args.concurrency, args.duration)
+            print(f"{name:>10}: {result}")
+        service.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+"""
+Load test for multi-worker deployments over the real MCP SSE transport.
+
+For each worker count, starts `uvicorn main:app --workers N` with the
+cluster layer enabled and a CPU-bound inline tool, then runs concurrent
+MCP clients (SSE stream + message POSTs) that call the tool in a loop.
+Message POSTs are spread over workers by the kernel, so most of them are
+routed to the worker holding the session's stream. Reports calls/sec and
+latency percentiles per worker count, plus how many POSTs were forwarded.
+
+Usage (from backend/):
+    python -m bench.sse_load --workers 1 2 4 --clients 32 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+import httpx
+import yaml
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from bench.loop_latency import percentile
+
+SPIN_TOOL = {
+    "name": "spin",
+    "description": "Burns CPU for a fixed number of iterations",
+    "input_schema": {"type": "object", "properties": {"n": {"type": "integer"}}, "required": ["n"]},
+    "code": "return sum(i * i for i in range(int(n)))"
+}
+
+def write_config(workdir: str, source: str) -> str:
+    with open(source) as f:
+        config = yaml.safe_load(f) or {}
+    config["tools"] = [t for t in config.get("tools", []) if t["name"] != SPIN_TOOL["name"]] + [SPIN_TOOL]
+    config["cluster"] = {"enabled": True, "runtime_dir": os.path.join(workdir, "run")}
+    # The flat backend opens no database, keeping worker startup cheap
+    config.setdefault("knowledge_base", {})["backend"] = "numpy"
+    path = os.path.join(workdir, "config.yaml")
+    with open(path, "w") as f:
+        yaml.dump(config, f, sort_keys=False)
+    return path
+
+async def wait_ready(base_url: str, workers: int, timeout: float = 60.0):
+    """Waits until every worker has joined the cluster."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                metrics = (await client.get("/metrics")).json()
+                if metrics.get("cluster", {}).get("workers") == workers:
+                    return
+            except (httpx.HTTPError, ValueError):
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"Server did not come up with {workers} workers")
+
+async def run_clients(base_url: str, clients: int, duration: float, work: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        async with sse_client(f"{base_url}/mcp/sse") as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                deadline = time.monotonic() + duration
+                while time.monotonic() < deadline:
+                    start = time.perf_counter()
+                    result = await session.call_tool("spin", {"n": work})
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    errors += bool(result.isError)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    return {
+        "calls": len(latencies),
+        "errors": errors,
+        "calls_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2)
+    }
+
+async def run_workers(args, workers: int, port: int) -> Dict[str, float]:
+    workdir = tempfile.mkdtemp(prefix="mcp-load-")
+    env = {
+        **os.environ,
+        "MCP_CONFIG": write_config(workdir, args.config),
+        "MCP_DB_PATH": os.path.join(workdir, "db")
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        await wait_ready(base_url, workers)
+        result = await run_clients(base_url, args.clients, args.duration, args.work)
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            exposition = (await client.get("/metrics/prometheus")).text
+        # Counters in the exposition are already summed over all workers
+        forwarded = sum(
+            float(line.rsplit(" ", 1)[1]) for line in exposition.splitlines()
+            if line.startswith('mcp_cluster_forwards_total{result="ok"}')
+        )
+        return {"workers": workers, **result, "forwarded": int(forwarded)}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--work", type=int, default=200000, help="Loop iterations per tool call")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--config", default="config.yaml", help="Base config; the spin tool and cluster block are added")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    results = []
+    for workers in args.workers:
+        result = asyncio.run(run_workers(args, workers, args.port))
+        results.append(result)
+        print(
+            f"workers={workers:<3} calls/s={result['calls_per_sec']:<8} p50={result['p50_ms']}ms "
+            f"p95={result['p95_ms']}ms p99={result['p99_ms']}ms errors={result['errors']} "
+            f"forwarded={result['forwarded']}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""
+Reproducible latency/throughput benchmark for the MCP server.
+
+Imports the real application (main.py) against a throwaway config and
+store, ingests a synthetic corpus, serves the app in-process with
+uvicorn on an ephemeral port and measures three layers:
+
+  vector  VectorService.query in each search mode
+  tool    MCPCore._execute_tool for the configured echo/calculator tools
+  mcp     tools/call and resources/read over the real /mcp/sse +
+          /mcp/messages endpoints, one MCP session per client
+
+Each scenario runs once per concurrency level: N clients call it in a
+loop for a warmup period, then for `--duration` seconds of measurement.
+The report has p50/p95/p99/mean latency, requests/sec, errors and the
+process RSS (client and server share the process) per scenario, and is
+written as JSON so runs can be compared with `--compare`.
+
+Query embedding and result caches are disabled so every search does the
+full work; `--caches` keeps the configured sizes. Embeddings come from
+the offline hashing stand-in unless `--embeddings
+onnx` is given. Corpora of a million documents take a while to ingest;
+pass `--db-path` to keep the store and reuse it on the next run.
+
+Usage (from backend/):
+    python -m bench.suite --docs 10000 --concurrency 1 8 32 --output run.json
+    python -m bench.suite --layers mcp --compare run.json
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import uvicorn
+import yaml
+from mcp import ClientSession
+from mcp.client.sse import sse_client
+from bench.corpus import iter_corpus, sample_queries, vocabulary
+from bench.embeddings import HashingEmbeddingFunction
+from bench.loop_latency import percentile
+
+LAYERS = ("vector", "tool", "mcp")
+
+# One call made by a client: (client number, call number) -> succeeded
+Call = Callable[[int, int], Awaitable[bool]]
+# Opens per-client state (e.g. an MCP session) and yields its call function
+ClientFactory = Callable[[], AsyncContextManager[Call]]
+
+def rss_mb() -> float:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+def write_config(workdir: str, source: str, backend: Optional[str], caches: bool) -> str:
+    """Copies the base config, pinning the knowledge base backend and disabling clustering."""
+    with open(source) as f:
+        config = yaml.safe_load(f) or {}
+    knowledge_base = config.setdefault("knowledge_base", {})
+    if backend:
+        knowledge_base["backend"] = backend
+    if not caches:
+        knowledge_base["embedding_cache_entries"] = 0
+        knowledge_base["result_cache_entries"] = 0
+    config.pop("cluster", None)
+    path = os.path.join(workdir, "config.yaml")
+    with open(path, "w") as f:
+        yaml.dump(config, f, sort_keys=False)
+    return path
+
+async def measure(open_client: ClientFactory, concurrency: int, duration: float, warmup: float) -> Dict[str, Any]:
+    """Runs `concurrency` clients in a closed loop and summarizes the measured window."""
+    latencies: List[float] = []
+    errors = 0
+    barrier = asyncio.Barrier(concurrency)
+    window: Dict[str, float] = {}
+
+    async def client(number: int):
+        nonlocal errors
+        async with open_client() as call:
+            # The window opens once every client is connected
+            await barrier.wait()
+            if not window:
+                now = time.perf_counter()
+                window.update(start=now + warmup, end=now + warmup + duration)
+            calls = 0
+            while True:
+                started = time.perf_counter()
+                if started >= window["end"]:
+                    break
+                try:
+                    ok = await call(number, calls)
+                except Exception:
+                    ok = False
+                calls += 1
+                if started >= window["start"]:
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    errors += not ok
+
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / duration, 1),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        "rss_mb": rss_mb(),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+def _stateless(call: Call) -> ClientFactory:
+    @asynccontextmanager
+    async def open_client():
+        yield call
+    return open_client
+
+def _succeeded(text: str) -> bool:
+    return not text.startswith(("Error", "Execution Error"))
+
+def vector_scenarios(app, queries: List[str]) -> Dict[str, ClientFactory]:
+    service = app.vector_service
+    modes = ["vector", "lexical", "hybrid"] if service.config.lexical.enabled else ["vector"]
+
+    def search(mode: str) -> Call:
+        async def call(client: int, number: int) -> bool:
+            await service.query(queries[(client * 7919 + number) % len(queries)], n_results=5, mode=mode)
+            return True
+        return call
+
+    return {f"kb_search.{mode}": _stateless(search(mode)) for mode in modes}
+
+def tool_scenarios(app) -> Dict[str, ClientFactory]:
+    core = app.mcp_core
+    tools = core.registry.tools
+    arguments = {
+        # Distinct expressions, so a pure-tool cache does not answer every call
+        "calculator": lambda client, number: {"expression": f"{client} * {number} + 1"},
+        "echo": lambda client, number: {"message": f"client {client} call {number}"}
+    }
+
+    def execute(name: str) -> Call:
+        async def call(client: int, number: int) -> bool:
+            registry = core.registry
+            result = await core._execute_tool(registry, registry.tools[name], arguments[name](client, number))
+            return _succeeded(result[0].text)
+        return call
+
+    return {f"execute_tool.{name}": _stateless(execute(name)) for name in arguments if name in tools}
+
+def mcp_scenarios(app, base_url: str, queries: List[str]) -> Dict[str, ClientFactory]:
+    tools = app.mcp_core.registry.tools
+
+    def session_client(request: Callable[[ClientSession, int, int], Awaitable[bool]]) -> ClientFactory:
+        @asynccontextmanager
+        async def open_client():
+            async with sse_client(f"{base_url}/mcp/sse") as (read, write):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    yield lambda client, number: request(session, client, number)
+        return open_client
+
+    def tool_call(name: str, arguments: Callable[[int, int], Dict[str, Any]]):
+        async def request(session: ClientSession, client: int, number: int) -> bool:
+            result = await session.call_tool(name, arguments(client, number))
+            return not result.isError and _succeeded(result.content[0].text)
+        return session_client(request)
+
+    async def read_resource(session: ClientSession, client: int, number: int) -> bool:
+        uri = app.mcp_core.registry.resource_list[0].uri
+        await session.read_resource(uri)
+        return True
+
+    scenarios = {
+        "tools/call.kb_search": tool_call(
+            "kb_search", lambda client, number: {"query": queries[(client * 7919 + number) % len(queries)]}
+        )
+    }
+    if "echo" in tools:
+        scenarios["tools/call.echo"] = tool_call(
+            "echo", lambda client, number: {"message": f"client {client} call {number}"}
+        )
+    if "calculator" in tools:
+        scenarios["tools/call.calculator"] = tool_call(
+            "calculator", lambda client, number: {"expression": f"{client} * {number} + 1"}
+        )
+    if app.mcp_core.registry.resource_list:
+        scenarios["resources/read"] = session_client(read_resource)
+    return scenarios
+
+async def ingest(app, args) -> Dict[str, Any]:
+    """Loads the synthetic corpus; documents already in a reused store are skipped before embedding."""
+    started = time.perf_counter()
+    vocab = vocabulary(seed=args.seed)
+    report: Dict[str, Any] = {"added": 0, "skipped": 0}
+    async for report in app.vector_service.iter_add_documents(
+        iter_corpus(args.docs, seed=args.seed, vocab=vocab), args.batch_size
+    ):
+        if report["batch"] % 20 == 0:
+            print(f"  ingested {report['documents']}/{args.docs} ({report['docs_per_sec']} docs/s)", flush=True)
+    elapsed = time.perf_counter() - started
+    return {
+        "documents": args.docs,
+        "added": report["added"],
+        "skipped": report["skipped"],
+        "seconds": round(elapsed, 2),
+        "docs_per_sec": round((report["added"] + report["skipped"]) / elapsed, 1) if elapsed > 0 else 0.0,
+        "rss_mb": rss_mb()
+    }
+
+@asynccontextmanager
+async def serve(app) -> AsyncIterator[str]:
+    """Serves the app with uvicorn on an ephemeral port in this event loop."""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, lifespan="off", log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args) -> Dict[str, Any]:
+    workdir = tempfile.mkdtemp(prefix="mcp-bench-")
+    os.environ["MCP_CONFIG"] = write_config(workdir, args.config, args.backend, args.caches)
+    os.environ["MCP_DB_PATH"] = args.db_path or os.path.join(workdir, "db")
+    try:
+        app = importlib.import_module("main")
+        if args.embeddings == "hashing":
+            # Picked up when the knowledge base opens, instead of the ONNX model
+            app.vector_service.embedding_fn = HashingEmbeddingFunction()
+        report: Dict[str, Any] = {
+            "meta": {
+                "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "backend": app.vector_service.config.backend,
+                "args": vars(args)
+            },
+            "results": []
+        }
+        async with app.lifespan(app.app):
+            await app.vector_service.initialize()
+            report["startup"] = app.mcp_core.get_metrics()["startup"]
+            print(f"Ingesting {args.docs} synthetic documents...", flush=True)
+            report["ingest"] = await ingest(app, args)
+            queries = sample_queries(args.queries, seed=args.seed)
+            async with serve(app.app) as base_url:
+                layers = {
+                    "vector": lambda: vector_scenarios(app, queries),
+                    "tool": lambda: tool_scenarios(app),
+                    "mcp": lambda: mcp_scenarios(app, base_url, queries)
+                }
+                for layer in args.layers:
+                    for scenario, open_client in layers[layer]().items():
+                        for concurrency in args.concurrency:
+                            result = await measure(open_client, concurrency, args.duration, args.warmup)
+                            result = {"layer": layer, "scenario": scenario, "concurrency": concurrency, **result}
+                            report["results"].append(result)
+                            print(
+                                f"{layer:<7} {scenario:<24} c={concurrency:<4} rps={result['rps']:<9} "
+                                f"p50={result['p50_ms']}ms p95={result['p95_ms']}ms p99={result['p99_ms']}ms "
+                                f"errors={result['errors']} rss={result['rss_mb']}MB",
+                                flush=True
+                            )
+        return report
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def compare(baseline_path: str, report: Dict[str, Any]):
+    """Prints throughput and latency changes against a previous run."""
+    with open(baseline_path) as f:
+        baseline = {
+            (r["layer"], r["scenario"], r["concurrency"]): r for r in json.load(f)["results"]
+        }
+
+    def change(old: float, new: float) -> str:
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    print(f"\nCompared with {baseline_path}:")
+    for result in report["results"]:
+        old = baseline.get((result["layer"], result["scenario"], result["concurrency"]))
+        if old is None:
+            continue
+        print(
+            f"{result['layer']:<7} {result['scenario']:<24} c={result['concurrency']:<4} "
+            f"rps {change(old['rps'], result['rps']):>8}  p50 {change(old['p50_ms'], result['p50_ms']):>8}  "
+            f"p99 {change(old['p99_ms'], result['p99_ms']):>8}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--layers", nargs="+", choices=LAYERS, default=list(LAYERS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=5.0, help="Measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Unmeasured seconds before each window")
+    parser.add_argument("--docs", type=int, default=10000, help="Synthetic corpus size (1k to 1M+)")
+    parser.add_argument("--queries", type=int, default=1000, help="Distinct queries cycled through by clients")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], help="Overrides knowledge_base.backend")
+    parser.add_argument("--caches", action="store_true", help="Keep the knowledge base query caches enabled")
+    parser.add_argument("--embeddings", choices=["hashing", "onnx"], default="hashing")
+    parser.add_argument("--config", default="config.yaml", help="Base config to benchmark")
+    parser.add_argument("--db-path", help="Keep the store here and reuse it across runs")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    parser.add_argument("--compare", help="Previous JSON report to compare against")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(args.compare, report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+_MISSING = object()
+
+def canonical_key(arguments: Dict[str, Any]) -> str:
+    """Serializes call arguments so that equal arguments give equal keys regardless of key order."""
+    return json.dumps(arguments, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=repr)
+
+class LRUCache:
+    """
+    Least-recently-used cache bounded by entry count and, optionally, by
+    the total size of its values as reported by `sizeof`. With a `ttl`,
+    entries older than that many seconds are treated as misses.
+    Not thread-safe: callers use it from the event loop thread.
+    """
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = sys.getsizeof,
+        ttl: Optional[float] = None
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the cached value (marking it recently used) or `default`."""
+        entry = self._entries.get(key, _MISSING)
+        if entry is not _MISSING and entry[2] is not None and entry[2] <= time.monotonic():
+            del self._entries[key]
+            self._bytes -= entry[1]
+            entry = _MISSING
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        """Stores a value, evicting least recently used entries to stay within bounds."""
+        if self.max_entries <= 0:
+            return
+        size = self.sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._entries[key] = (value, size, expires)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self._bytes > self.max_bytes
+        ):
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def clear(self):
+        """Drops all entries; hit and miss counters are kept."""
+        self._entries.clear()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns hit/miss counters and current occupancy."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self._bytes
+        }
+
+class _Flight:
+    """A shared in-flight computation and the number of callers awaiting it."""
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into one computation whose
+    result (or exception) is fanned out to every caller. A caller that is
+    cancelled only detaches itself; the shared computation is cancelled
+    when its last caller goes away.
+    """
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Awaits the in-flight computation for `key`, starting `fn()` if there is none."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(fn()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            self.coalesced += 1
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Forget it now, not in the done callback, so that a caller
+                # arriving before the task finishes cancelling starts afresh
+                self._forget(key, flight)
+                flight.task.cancel()
+            raise
+
+    def _forget(self, key: Hashable, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def __len__(self) -> int:
+        return len(self._flights)
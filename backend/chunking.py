@@ -0,0 +1,60 @@
+import re
+from collections import deque
+from typing import Deque, Iterator, NamedTuple
+
+_TOKEN = re.compile(r"\S+")
+
+class Chunk(NamedTuple):
+    """A window of a larger document, with character offsets into it."""
+    index: int
+    start: int
+    end: int
+    text: str
+
+def iter_chunks(text: str, size: int, overlap: int = 0, unit: str = "chars") -> Iterator[Chunk]:
+    """
+    Lazily splits text into overlapping windows of `size` characters or
+    whitespace-delimited tokens. Chunks are produced one at a time, so
+    callers can embed and write them without materializing the full list.
+    """
+    if size <= 0:
+        raise ValueError("Chunk size must be positive")
+    if not 0 <= overlap < size:
+        raise ValueError("Chunk overlap must be between 0 and the chunk size")
+    if unit == "chars":
+        return _iter_char_chunks(text, size, overlap)
+    if unit == "tokens":
+        return _iter_token_chunks(text, size, overlap)
+    raise ValueError(f"Unknown chunking unit: {unit}")
+
+def _iter_char_chunks(text: str, size: int, overlap: int) -> Iterator[Chunk]:
+    step = size - overlap
+    index = 0
+    start = 0
+    while True:
+        end = min(start + size, len(text))
+        yield Chunk(index, start, end, text[start:end])
+        if end >= len(text):
+            return
+        index += 1
+        start += step
+
+def _iter_token_chunks(text: str, size: int, overlap: int) -> Iterator[Chunk]:
+    # Only the current window of token spans is kept in memory
+    window: Deque["re.Match[str]"] = deque()
+    index = 0
+    pending = False  # Window holds tokens not yet emitted in a chunk
+    for match in _TOKEN.finditer(text):
+        window.append(match)
+        pending = True
+        if len(window) == size:
+            start, end = window[0].start(), window[-1].end()
+            yield Chunk(index, start, end, text[start:end])
+            index += 1
+            pending = False
+            for _ in range(size - overlap):
+                window.popleft()
+    if pending or index == 0:
+        start = window[0].start() if window else 0
+        end = window[-1].end() if window else len(text)
+        yield Chunk(index, start, end, text[start:end])
@@ -0,0 +1,419 @@
+import asyncio
+import json
+import os
+import re
+import socket
+import sqlite3
+import struct
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from cache import LRUCache
+from config_manager import ConfigManager
+from metrics import FamilySamples, MetricsRegistry
+from models import ClusterConfig
+
+# The SSE transport announces the session in its first event: ...?session_id=<hex>
+_SESSION_ID = re.compile(rb"session_id=([0-9a-f]{32})")
+_FRAME_HEADER = struct.Struct(">I")
+
+# Top-level /metrics counters that are summed across workers
+SUMMED_METRICS = ("tools_called", "resources_read", "vector_queries", "errors", "sse_sessions")
+
+ASGIApp = Callable[[dict, Callable, Callable], Awaitable[None]]
+
+async def _read_frame(reader: asyncio.StreamReader) -> Optional[bytes]:
+    try:
+        header = await reader.readexactly(_FRAME_HEADER.size)
+    except asyncio.IncompleteReadError:
+        return None
+    return await reader.readexactly(_FRAME_HEADER.unpack(header)[0])
+
+def _write_frame(writer: asyncio.StreamWriter, payload: bytes):
+    writer.write(_FRAME_HEADER.pack(len(payload)) + payload)
+
+class SessionDirectory:
+    """
+    Shared SQLite registry of live workers (address + heartbeat) and the
+    sessions each one owns. Blocking; ClusterNode calls it from threads.
+    """
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS workers (worker TEXT PRIMARY KEY, address TEXT, heartbeat REAL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, worker TEXT)")
+
+    def heartbeat(self, worker: str, address: str, stale_after: float) -> List[Tuple[str, str]]:
+        """Refreshes this worker, drops stale ones (and their sessions) and returns the live peers."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO workers VALUES (?, ?, ?)", (worker, address, now))
+            self._db.execute(
+                "DELETE FROM sessions WHERE worker IN (SELECT worker FROM workers WHERE heartbeat < ?)",
+                (now - stale_after,)
+            )
+            self._db.execute("DELETE FROM workers WHERE heartbeat < ?", (now - stale_after,))
+            rows = self._db.execute("SELECT worker, address FROM workers WHERE worker != ?", (worker,)).fetchall()
+        return rows
+
+    def remove_worker(self, worker: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE worker = ?", (worker,))
+            self._db.execute("DELETE FROM workers WHERE worker = ?", (worker,))
+
+    def add_session(self, session_id: str, worker: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?)", (session_id, worker))
+
+    def remove_session(self, session_id: str):
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def owner(self, session_id: str) -> Optional[str]:
+        """Returns the address of the worker owning a session, if it is alive."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT w.address FROM sessions s JOIN workers w ON w.worker = s.worker WHERE s.session_id = ?",
+                (session_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        self._db.close()
+
+class ClusterNode:
+    """
+    Session routing for running the server as several worker processes.
+
+    Each worker listens on a Unix socket (or TCP port) and records itself
+    and the SSE sessions it holds in a shared SQLite directory. A message
+    POST for a session held by another worker is forwarded there and its
+    response relayed back. The same channel serves metrics collection and
+    config reload broadcasts. When disabled, every call goes straight to
+    the local transport.
+    """
+    def __init__(
+        self,
+        config: ClusterConfig,
+        post_message: ASGIApp,
+        config_manager: ConfigManager,
+        metrics_registry: MetricsRegistry,
+        metrics_summary: Callable[[], Dict[str, Any]]
+    ):
+        self.config = config
+        self.enabled = config.enabled
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._post_message = post_message
+        self._config_manager = config_manager
+        self._metrics_registry = metrics_registry
+        self._metrics_summary = metrics_summary
+        self.address: Optional[str] = None
+        self._directory: Optional[SessionDirectory] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        # Live peers as of the last heartbeat: worker id -> address
+        self.peers: Dict[str, str] = {}
+        self._local_sessions: set = set()
+        # Session owners never change, so lookups are cached until the owner is unreachable
+        self._owners = LRUCache(max_entries=10000)
+        self._idle_connections: Dict[str, List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]]] = {}
+        self._forwards = metrics_registry.counter(
+            "mcp_cluster_forwards_total", "Message POSTs forwarded to the worker owning the session", ["result"]
+        )
+
+    async def start(self):
+        """Opens the session directory, starts listening for peers and begins heartbeats."""
+        if not self.enabled:
+            return
+        runtime_dir = os.path.abspath(self.config.runtime_dir)
+        os.makedirs(runtime_dir, exist_ok=True)
+        self._directory = await asyncio.to_thread(SessionDirectory, os.path.join(runtime_dir, "sessions.db"))
+        if self.config.transport == "unix":
+            path = os.path.join(runtime_dir, f"worker-{os.getpid()}.sock")
+            if os.path.exists(path):
+                os.unlink(path)  # Left behind by a crashed worker with a recycled PID
+            self._server = await asyncio.start_unix_server(self._serve_peer, path=path)
+            self.address = f"unix:{path}"
+        else:
+            self._server = await asyncio.start_server(self._serve_peer, host=self.config.host, port=0)
+            port = self._server.sockets[0].getsockname()[1]
+            self.address = f"tcp:{self.config.host}:{port}"
+        await self._heartbeat()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        if not self.enabled or self._directory is None:
+            return
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+        self._server.close()
+        for connections in self._idle_connections.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle_connections.clear()
+        await asyncio.to_thread(self._directory.remove_worker, self.worker_id)
+        self._directory.close()
+        if self.address.startswith("unix:") and os.path.exists(self.address[5:]):
+            os.unlink(self.address[5:])
+
+    async def _heartbeat(self):
+        peers = await asyncio.to_thread(
+            self._directory.heartbeat, self.worker_id, self.address, self.config.heartbeat_seconds * 3
+        )
+        self.peers = dict(peers)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.config.heartbeat_seconds)
+            try:
+                await self._heartbeat()
+            except sqlite3.Error:
+                pass  # Directory busy; the next beat retries well within the stale window
+
+    # --- SSE sessions ---
+
+    @asynccontextmanager
+    async def sse_session(self, send: Callable):
+        """
+        Wraps the ASGI `send` of an SSE connection to learn its session ID
+        from the endpoint event and register this worker as its owner.
+        """
+        if not self.enabled:
+            yield send
+            return
+        session_id: Optional[str] = None
+
+        async def tracking_send(message: dict):
+            nonlocal session_id
+            if session_id is None and message["type"] == "http.response.body":
+                match = _SESSION_ID.search(message.get("body", b""))
+                if match:
+                    session_id = match.group(1).decode()
+                    self._local_sessions.add(session_id)
+                    await asyncio.to_thread(self._directory.add_session, session_id, self.worker_id)
+            await send(message)
+
+        try:
+            yield tracking_send
+        finally:
+            if session_id is not None:
+                self._local_sessions.discard(session_id)
+                await asyncio.to_thread(self._directory.remove_session, session_id)
+
+    # --- Message routing ---
+
+    async def handle_post_message(self, scope: dict, receive: Callable, send: Callable):
+        """ASGI app for /mcp/messages: handles local sessions and forwards the rest to their owner."""
+        if not self.enabled:
+            return await self._post_message(scope, receive, send)
+        query = parse_qs(scope.get("query_string", b"").decode())
+        session_id = (query.get("session_id") or [""])[0]
+        if not session_id or session_id in self._local_sessions:
+            return await self._post_message(scope, receive, send)
+        address = self._owners.get(session_id)
+        if address is None:
+            address = await asyncio.to_thread(self._directory.owner, session_id)
+            if address is None or address == self.address:
+                # Unknown session: the local transport answers with its usual 404
+                return await self._post_message(scope, receive, send)
+            self._owners.put(session_id, address)
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        request = {
+            "op": "post",
+            "path": scope["path"],
+            "query_string": scope.get("query_string", b"").decode(),
+            "headers": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in scope["headers"]]
+        }
+        try:
+            reply, payload = await self._forward(address, request, body)
+            self._forwards.inc("ok")
+        except asyncio.TimeoutError:
+            # The owner is there but slow; its route stays cached
+            self._forwards.inc("error")
+            reply, payload = {"status": 502, "headers": [["content-type", "text/plain"]]}, b"Session owner timed out"
+        except (OSError, asyncio.IncompleteReadError):
+            # Not even a fresh connection got through: look the owner up again next time
+            self._forwards.inc("error")
+            self._owners.put(session_id, None)
+            reply, payload = {"status": 502, "headers": [["content-type", "text/plain"]]}, b"Session owner unreachable"
+        await send({
+            "type": "http.response.start",
+            "status": reply["status"],
+            "headers": [[k.encode("latin-1"), v.encode("latin-1")] for k, v in reply["headers"]]
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+    async def _forward(self, address: str, request: dict, body: bytes) -> Tuple[dict, bytes]:
+        """
+        Forwards a message POST to its owner. A pooled connection can have
+        gone stale (the peer restarted or closed it while idle), so a failure
+        on one is retried once on a fresh connection after dropping the
+        address's other idle connections, which are likely stale too.
+        """
+        pooled = bool(self._idle_connections.get(address))
+        try:
+            return await asyncio.wait_for(self._call(address, request, body), self.config.forward_timeout)
+        except (OSError, asyncio.IncompleteReadError):
+            if not pooled:
+                raise
+        for _, writer in self._idle_connections.pop(address, []):
+            writer.close()
+        return await asyncio.wait_for(self._call(address, request, body), self.config.forward_timeout)
+
+    async def _connect(self, address: str):
+        idle = self._idle_connections.get(address)
+        if idle:
+            return idle.pop()
+        if address.startswith("unix:"):
+            return await asyncio.open_unix_connection(address[5:])
+        _, host, port = address.split(":", 2)
+        return await asyncio.open_connection(host, int(port))
+
+    async def _call(self, address: str, request: dict, body: bytes = b"") -> Tuple[dict, bytes]:
+        """Sends one request to a peer over a pooled connection and returns its reply."""
+        reader, writer = await self._connect(address)
+        try:
+            _write_frame(writer, json.dumps(request).encode())
+            _write_frame(writer, body)
+            await writer.drain()
+            header = await _read_frame(reader)
+            payload = await _read_frame(reader)
+            if header is None or payload is None:
+                raise asyncio.IncompleteReadError(b"", None)
+        except BaseException:
+            writer.close()
+            raise
+        self._idle_connections.setdefault(address, []).append((reader, writer))
+        return json.loads(header), payload
+
+    async def _serve_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                header = await _read_frame(reader)
+                body = await _read_frame(reader) if header is not None else None
+                if body is None:
+                    return
+                reply, payload = await self._dispatch(json.loads(header), body)
+                _write_frame(writer, json.dumps(reply).encode())
+                _write_frame(writer, payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request: dict, body: bytes) -> Tuple[dict, bytes]:
+        op = request["op"]
+        if op == "post":
+            return await self._replay_post(request, body)
+        if op == "metrics":
+            payload = {"families": self._metrics_registry.collect(), "summary": self._metrics_summary()}
+            return {"status": 200}, json.dumps(payload, default=str).encode()
+        if op == "reload":
+            reloaded = await self._config_manager.reload()
+            return {"status": 200}, json.dumps({"reloaded": reloaded}).encode()
+        return {"status": 400}, f"Unknown op {op}".encode()
+
+    async def _replay_post(self, request: dict, body: bytes) -> Tuple[dict, bytes]:
+        """Runs a forwarded POST through the local transport and captures its response."""
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": request["path"],
+            "raw_path": request["path"].encode(),
+            "root_path": "",
+            "query_string": request["query_string"].encode(),
+            "headers": [(k.encode("latin-1"), v.encode("latin-1")) for k, v in request["headers"]],
+            "client": None,
+            "server": None
+        }
+        delivered = False
+        reply = {"status": 500, "headers": []}
+        chunks: List[bytes] = []
+
+        async def receive():
+            nonlocal delivered
+            if delivered:
+                return {"type": "http.disconnect"}
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message: dict):
+            if message["type"] == "http.response.start":
+                reply["status"] = message["status"]
+                reply["headers"] = [
+                    [k.decode("latin-1"), v.decode("latin-1")] for k, v in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self._post_message(scope, receive, send)
+        return reply, b"".join(chunks)
+
+    # --- Cluster-wide views ---
+
+    async def _gather(self, request: dict) -> List[Tuple[str, Optional[dict]]]:
+        """Sends a request to every live peer concurrently; unreachable peers yield None."""
+        async def ask(worker: str, address: str):
+            try:
+                _, payload = await asyncio.wait_for(self._call(address, request), self.config.forward_timeout)
+                return worker, json.loads(payload)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+                return worker, None
+
+        return await asyncio.gather(*(ask(w, a) for w, a in self.peers.items()))
+
+    async def collect_families(self) -> List[Tuple[str, List[FamilySamples]]]:
+        """Returns (worker, families) for this worker and every reachable peer."""
+        collected = [(self.worker_id, self._metrics_registry.collect())]
+        if self.enabled:
+            for worker, payload in await self._gather({"op": "metrics"}):
+                if payload is not None:
+                    collected.append((worker, payload["families"]))
+        return collected
+
+    async def metrics_summary(self) -> Dict[str, Any]:
+        """
+        The local /metrics document, with the top-level counters summed
+        across workers and a per-worker breakdown under `workers`.
+        """
+        local = self._metrics_summary()
+        if not self.enabled:
+            return local
+        summaries = {self.worker_id: local}
+        for worker, payload in await self._gather({"op": "metrics"}):
+            summaries[worker] = payload["summary"] if payload is not None else None
+        merged = dict(local)
+        for key in SUMMED_METRICS:
+            merged[key] = sum(s.get(key, 0) for s in summaries.values() if s)
+        merged["workers"] = {
+            worker: {key: s.get(key, 0) for key in SUMMED_METRICS} if s else {"unreachable": True}
+            for worker, s in summaries.items()
+        }
+        merged["cluster"] = {
+            "worker": self.worker_id,
+            "workers": len(summaries),
+            "local_sessions": len(self._local_sessions),
+            "forwarded": self._forwards.value("ok"),
+            "forward_errors": self._forwards.value("error")
+        }
+        return merged
+
+    async def broadcast_reload(self):
+        """Asks every peer to reload config.yaml now rather than at its next poll."""
+        if self.enabled:
+            await self._gather({"op": "reload"})
@@ -1,47 +1,208 @@
+import asyncio
+import logging
 import yaml
 import os
-from typing import Optional
+import tempfile
+import time
+from typing import Callable, List, NamedTuple, Optional, Tuple
 from models import ServerConfig
 
+logger = logging.getLogger("uvicorn.error")
+
+# Prepares derived state for a config off the event loop and returns a
+# callable that installs it; raising rejects the config
+ConfigListener = Callable[[ServerConfig], Optional[Callable[[], None]]]
+
+# Settings read once at startup. A reload that changes them is installed (and
+# shown by /config) but they only take effect after a restart; every other
+# setting applies on reload.
+RESTART_REQUIRED = (
+    "knowledge_base.backend",
+    "knowledge_base.max_workers",
+    "knowledge_base.embedding_cache_entries",
+    "knowledge_base.embedding_cache_bytes",
+    "knowledge_base.result_cache_entries",
+    "knowledge_base.lexical",
+    "knowledge_base.default_collection",
+    "tool_pool.workers",
+    "tool_pool.start_method",
+    "cluster",
+)
+
+def restart_required(running: ServerConfig, config: ServerConfig) -> List[str]:
+    """The restart-only settings that differ between the running config and `config`."""
+    changed = []
+    for path in RESTART_REQUIRED:
+        current, new = running, config
+        for part in path.split("."):
+            current, new = getattr(current, part), getattr(new, part)
+        if current != new:
+            changed.append(path)
+    return changed
+
+class ConfigSnapshot(NamedTuple):
+    """One installed configuration version and the YAML it was loaded from."""
+    version: int
+    config: ServerConfig
+    raw_yaml: str
+
 class ConfigManager:
     """
     Manages the server configuration stored in a YAML file.
     Provides methods to load, save, and reload configuration dynamically.
+
+    The active configuration is an immutable snapshot swapped in with a
+    single assignment. Updates (from the UI or from edits to the file,
+    picked up by `watch()`) are parsed, validated and prepared by the
+    listeners in a worker thread, then installed together on the event loop.
+    Settings in RESTART_REQUIRED keep their startup values until a restart;
+    `restart_pending` lists those the installed config changes.
     """
-    def __init__(self, config_path: str = "config.yaml"):
+    def __init__(self, config_path: str = "config.yaml", watch_interval: float = 1.0):
         self.config_path = config_path
-        self.config: Optional[ServerConfig] = None
+        self.watch_interval = watch_interval
+        self.snapshot: Optional[ConfigSnapshot] = None
+        self.last_error: Optional[str] = None
+        # The config the process started with; restart-only settings come from it
+        self.startup_config: Optional[ServerConfig] = None
+        self.restart_pending: List[str] = []
+        self._listeners: List[ConfigListener] = []
+        # (mtime, size) of the file as last loaded or written by us
+        self._file_signature: Optional[Tuple[int, int]] = None
+        self._update_lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
         self.load()
 
+    @property
+    def config(self) -> ServerConfig:
+        return self.snapshot.config
+
+    @property
+    def version(self) -> int:
+        return self.snapshot.version
+
+    def add_listener(self, callback: ConfigListener):
+        """
+        Registers a callback that prepares derived state for a new configuration.
+        Callbacks run in a worker thread before the config is installed and
+        return an installer (or None); raising rejects the update.
+        """
+        self._listeners.append(callback)
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.config_path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
     def load(self) -> ServerConfig:
         """Loads configuration from the YAML file."""
         if not os.path.exists(self.config_path):
             # Return default config if file doesn't exist
-            self.config = ServerConfig(name="Default MCP Server")
+            self.snapshot = ConfigSnapshot(1, ServerConfig(name="Default MCP Server"), "")
+            self.startup_config = self.config
             return self.config
-            
+
         with open(self.config_path, "r") as f:
-            data = yaml.safe_load(f) or {}
-            self.config = ServerConfig(**data)
+            raw_yaml = f.read()
+        self._file_signature = self._stat()
+        self.snapshot = ConfigSnapshot(1, self._parse(raw_yaml), raw_yaml)
+        self.startup_config = self.config
         return self.config
 
+    @staticmethod
+    def _parse(yaml_content: str) -> ServerConfig:
+        data = yaml.safe_load(yaml_content) or {}
+        # Validate with Pydantic
+        return ServerConfig(**data)
+
+    def _write_file(self, content: str):
+        """Writes the file through a temp file and rename, so readers never see a partial file."""
+        directory = os.path.dirname(os.path.abspath(self.config_path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".config-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.config_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._file_signature = self._stat()
+
     def save(self, config: ServerConfig):
         """Saves the current configuration to the YAML file."""
-        self.config = config
-        with open(self.config_path, "w") as f:
-            yaml.dump(self.config.dict(), f, sort_keys=False)
+        raw_yaml = yaml.dump(config.dict(), sort_keys=False)
+        self._write_file(raw_yaml)
+        self.snapshot = ConfigSnapshot(self.version + 1, config, raw_yaml)
 
     def get_raw_yaml(self) -> str:
         """Returns the raw YAML string for editing in the UI."""
-        if not os.path.exists(self.config_path):
-            return ""
-        with open(self.config_path, "r") as f:
-            return f.read()
+        return self.snapshot.raw_yaml
 
-    def update_from_yaml(self, yaml_content: str):
-        """Updates configuration from a raw YAML string."""
-        data = yaml.safe_load(yaml_content)
-        # Validate with Pydantic
-        new_config = ServerConfig(**data)
-        self.save(new_config)
-        return new_config
+    def _prepare(self, yaml_content: str) -> Tuple[ServerConfig, List[Callable[[], None]]]:
+        """Parses and validates a config and lets every listener prepare for it."""
+        config = self._parse(yaml_content)
+        installers = [callback(config) for callback in self._listeners]
+        return config, [install for install in installers if install is not None]
+
+    def _install(self, config: ServerConfig, raw_yaml: str, installers: List[Callable[[], None]]):
+        # No awaits here: handlers see either the old or the new version, never a mix
+        for install in installers:
+            install()
+        self.snapshot = ConfigSnapshot(self.version + 1, config, raw_yaml)
+        self.last_error = None
+        self.restart_pending = restart_required(self.startup_config, config)
+        if self.restart_pending:
+            logger.warning(
+                "Config version %d changes settings that apply after a restart: %s",
+                self.version, ", ".join(self.restart_pending)
+            )
+
+    async def update_from_yaml(self, yaml_content: str) -> ServerConfig:
+        """Updates configuration from a raw YAML string and writes it to the file."""
+        async with self._update_lock:
+            config, installers = await asyncio.to_thread(self._prepare, yaml_content)
+            await asyncio.to_thread(self._write_file, yaml_content)
+            self._install(config, yaml_content, installers)
+        return config
+
+    async def reload(self) -> bool:
+        """
+        Reloads the file if it changed since it was last loaded or written.
+        An invalid file is reported in `last_error` and the current config kept.
+        """
+        async with self._update_lock:
+            signature = self._stat()
+            if signature is None or signature == self._file_signature:
+                return False
+            self._file_signature = signature
+            try:
+                with open(self.config_path, "r") as f:
+                    raw_yaml = f.read()
+                if raw_yaml == self.snapshot.raw_yaml:
+                    return False
+                config, installers = await asyncio.to_thread(self._prepare, raw_yaml)
+            except Exception as e:
+                self.last_error = f"{time.strftime('%Y-%m-%d %H:%M:%S')}: {e}"
+                return False
+            self._install(config, raw_yaml, installers)
+            return True
+
+    async def watch(self):
+        """Polls the config file and reloads it when it changes."""
+        while True:
+            await asyncio.sleep(self.watch_interval)
+            await self.reload()
+
+    def start_watching(self):
+        """Starts the file watcher; needs a running event loop."""
+        if self._watch_task is None and self.watch_interval > 0:
+            self._watch_task = asyncio.get_running_loop().create_task(self.watch())
+
+    def stop_watching(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
@@ -0,0 +1,156 @@
+import asyncio
+import random
+import time
+from typing import Any, Dict, List, Optional
+from models import EventLogConfig
+
+FIELDS = ("seq", "ts", "kind", "name", "duration_ms", "outcome", "session_id", "detail")
+
+class EventLog:
+    """
+    Fixed-size ring buffer of structured events (tool calls, resource
+    reads). Storage is preallocated as one list per field; recording an
+    event overwrites the fields of the oldest slot and allocates nothing
+    else, so it is cheap enough to leave on under load.
+
+    Every recorded event gets the next sequence number. Readers pass the
+    last number they saw as a cursor and get only newer events; events
+    overwritten before a reader got to them are reported as missed.
+    Successful events can be sampled per event name; errors and slow
+    events are always kept. Used from the event loop thread only.
+    """
+    def __init__(self, config: EventLogConfig):
+        self.capacity = 0
+        self.latest = 0  # Sequence number of the newest event
+        self._first = 1  # Sequence number of the first event the slots still hold
+        self.recorded = 0
+        self.sampled_out = 0
+        self._columns: Dict[str, List[Any]] = {field: [] for field in FIELDS}
+        self._wakeup: Optional[asyncio.Future] = None
+        self.configure(config)
+
+    def configure(self, config: EventLogConfig):
+        self.sample_rate = config.sample_rate
+        self.sample_rates = dict(config.sample_rates)
+        self.slow_ms = config.slow_ms
+        if config.capacity != self.capacity:
+            self._resize(max(1, config.capacity))
+
+    def _resize(self, capacity: int):
+        """Reallocates the slots, keeping the newest events that still fit."""
+        kept = range(max(self.oldest, self.latest - capacity + 1), self.latest + 1) if self.latest else range(0)
+        self._first = kept.start if self.latest else 1
+        columns = {field: [None] * capacity for field in FIELDS}
+        for seq in kept:
+            old, new = seq % self.capacity, seq % capacity
+            for field in FIELDS:
+                columns[field][new] = self._columns[field][old]
+        self._columns = columns
+        self.capacity = capacity
+
+    @property
+    def oldest(self) -> int:
+        """Sequence number of the oldest event still held (0 when empty)."""
+        if not self.latest:
+            return 0
+        return max(self._first, self.latest - self.capacity + 1)
+
+    def record(
+        self,
+        kind: str,
+        name: str,
+        duration: float,
+        outcome: str = "ok",
+        session_id: Optional[str] = None,
+        detail: Optional[str] = None
+    ):
+        """Records one event, unless a successful fast event is sampled out."""
+        duration_ms = duration * 1000
+        if outcome == "ok" and not (self.slow_ms is not None and duration_ms >= self.slow_ms):
+            rate = self.sample_rates.get(name, self.sample_rate)
+            if rate < 1.0 and random.random() >= rate:
+                self.sampled_out += 1
+                return
+        self.latest += 1
+        self.recorded += 1
+        slot = self.latest % self.capacity
+        columns = self._columns
+        columns["seq"][slot] = self.latest
+        columns["ts"][slot] = time.time()
+        columns["kind"][slot] = kind
+        columns["name"][slot] = name
+        columns["duration_ms"][slot] = round(duration_ms, 3)
+        columns["outcome"][slot] = outcome
+        columns["session_id"][slot] = session_id
+        columns["detail"][slot] = detail
+        if self._wakeup is not None:
+            self._wakeup.set_result(None)
+            self._wakeup = None
+
+    def _event(self, seq: int) -> Dict[str, Any]:
+        slot = seq % self.capacity
+        return {field: self._columns[field][slot] for field in FIELDS}
+
+    def _matches(self, seq: int, filters: Dict[str, Any]) -> bool:
+        slot = seq % self.capacity
+        columns = self._columns
+        for field, value in filters.items():
+            if field == "min_duration_ms":
+                if columns["duration_ms"][slot] < value:
+                    return False
+            elif columns[field][slot] != value:
+                return False
+        return True
+
+    def query(self, cursor: Optional[int] = None, limit: int = 100, **filters) -> Dict[str, Any]:
+        """
+        Returns up to `limit` matching events newer than `cursor`, oldest
+        first, with the cursor to pass next time. Without a cursor, returns
+        the newest matching events. Filters: kind, name, outcome,
+        session_id (exact) and min_duration_ms; None values are ignored.
+        """
+        filters = {field: value for field, value in filters.items() if value is not None}
+        events: List[Dict[str, Any]] = []
+        missed = 0
+        if cursor is None:
+            seq = self.latest
+            while seq >= self.oldest and seq and len(events) < limit:
+                if self._matches(seq, filters):
+                    events.append(self._event(seq))
+                seq -= 1
+            events.reverse()
+            next_cursor = self.latest
+        else:
+            if cursor > self.latest:
+                cursor = 0  # A cursor from before a restart
+            start = max(cursor + 1, self.oldest)
+            missed = max(0, start - cursor - 1) if self.latest else 0
+            next_cursor = max(cursor, self.latest) if self.latest else cursor
+            for seq in range(start, self.latest + 1):
+                if self._matches(seq, filters):
+                    events.append(self._event(seq))
+                    if len(events) == limit:
+                        next_cursor = seq
+                        break
+        return {"events": events, "cursor": next_cursor, "missed": missed, "latest": self.latest}
+
+    async def wait(self, cursor: int, timeout: float) -> bool:
+        """Waits until an event newer than `cursor` is recorded; False on timeout."""
+        if self.latest > cursor:
+            return True
+        if self._wakeup is None:
+            self._wakeup = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._wakeup), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "size": self.latest - self.oldest + 1 if self.latest else 0,
+            "latest": self.latest,
+            "recorded": self.recorded,
+            "sampled_out": self.sampled_out
+        }
@@ -0,0 +1,280 @@
+import heapq
+import json
+import math
+import os
+import pickle
+import re
+import threading
+import unicodedata
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from vector_backends import matches_where
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, run a single worker
+    fcntl = None
+
+# Words, plus compound identifiers such as ERR-1042, v2.3.1 or foo_bar/baz
+_COMPOUND = re.compile(r"\w+(?:[-.:/]\w+)*")
+_WORD = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Case-folded terms of a text. A compound identifier yields itself and
+    its parts, so `ERR-1042` matches queries for the code or for `1042`.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    terms = []
+    for match in _COMPOUND.finditer(text):
+        compound = match.group()
+        terms.append(compound)
+        if not compound.isalnum():
+            terms.extend(_WORD.findall(compound))
+    return terms
+
+def _file_stat(path: str) -> Optional[Tuple[int, int, int]]:
+    """Identifies a version of a file: inode, modification time and size; None if missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+class BM25Index:
+    """
+    Incremental in-memory inverted index scored with Okapi BM25.
+
+    Postings map each term to {internal doc number: term frequency}.
+    Deletes are tombstones skipped at query time and purged on compaction.
+    State persists as a pickle snapshot plus an append-only JSON log of
+    later adds and deletes; loading reads the snapshot and replays the log.
+    The log is folded into a new snapshot once it grows past
+    `compact_every` entries. Thread-safe; methods block on file I/O.
+
+    Several processes (cluster workers) may share the files. Appends and
+    compactions hold an exclusive lock on `<path>.lock`, and every
+    operation first catches up with what other processes wrote: the log
+    tail they appended, or the whole state when one of them compacted.
+    """
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75, compact_every: int = 10000):
+        self.snapshot_path = path + ".pkl"
+        self.log_path = path + ".log"
+        self.lock_path = path + ".lock"
+        self.k1 = k1
+        self.b = b
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        with self._file_lock(shared=True):
+            self._load()
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """Holds the cross-process lock on the index files (a no-op without fcntl)."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _load(self):
+        """(Re)builds the state from the snapshot and the whole log."""
+        self._ids: List[str] = []
+        self._numbers: Dict[str, int] = {}
+        self._lengths: List[int] = []
+        self._metadatas: List[Optional[dict]] = []
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._deleted: Set[int] = set()
+        self._total_length = 0
+        self._log_entries = 0
+        # Bytes of the log applied so far, and the snapshot they apply to
+        self._log_offset = 0
+        self._snapshot_stat = _file_stat(self.snapshot_path)
+        if self._snapshot_stat is not None:
+            with open(self.snapshot_path, "rb") as f:
+                state = pickle.load(f)
+            self._ids = state["ids"]
+            self._lengths = state["lengths"]
+            self._metadatas = state["metadatas"]
+            self._postings = state["postings"]
+            self._numbers = {doc_id: n for n, doc_id in enumerate(self._ids)}
+            self._total_length = sum(self._lengths)
+        self._replay_log()
+
+    def _replay_log(self):
+        """Applies the log entries written since the last replay."""
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            tail = f.read()
+        # Writers append whole lines under the lock; stop at a torn last line all the same
+        tail = tail[:tail.rfind(b"\n") + 1]
+        for line in tail.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "delete" in entry:
+                self._delete_one(entry["delete"])
+            else:
+                self._add_one(entry["id"], entry["terms"], entry.get("metadata"))
+            self._log_entries += 1
+        self._log_offset += len(tail)
+
+    def _stale(self) -> bool:
+        """True when another process has appended to the log or compacted since the last sync."""
+        if _file_stat(self.snapshot_path) != self._snapshot_stat:
+            return True
+        try:
+            return os.path.getsize(self.log_path) != self._log_offset
+        except FileNotFoundError:
+            return self._log_offset != 0
+
+    def _sync(self):
+        """Catches up with other processes; the caller holds the file lock."""
+        if _file_stat(self.snapshot_path) != self._snapshot_stat or (
+            os.path.exists(self.log_path) and os.path.getsize(self.log_path) < self._log_offset
+        ):
+            self._load()
+        else:
+            self._replay_log()
+
+    def __len__(self) -> int:
+        return len(self._numbers)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._numbers
+
+    def _add_one(self, doc_id: str, terms: Dict[str, int], metadata: Optional[dict]):
+        if doc_id in self._numbers:
+            return
+        number = len(self._ids)
+        self._ids.append(doc_id)
+        self._numbers[doc_id] = number
+        length = sum(terms.values())
+        self._lengths.append(length)
+        self._metadatas.append(metadata or None)
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[number] = tf
+
+    def _delete_one(self, doc_id: str) -> bool:
+        number = self._numbers.pop(doc_id, None)
+        if number is None:
+            return False
+        self._deleted.add(number)
+        self._total_length -= self._lengths[number]
+        return True
+
+    def add_many(self, ids: List[str], documents: List[str], metadatas: List[Optional[dict]]):
+        """Indexes documents whose IDs are not indexed yet."""
+        entries = []
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            terms: Dict[str, int] = {}
+            for term in tokenize(document):
+                terms[term] = terms.get(term, 0) + 1
+            entries.append({"id": doc_id, "terms": terms, "metadata": metadata or None})
+        with self._lock, self._file_lock():
+            self._sync()
+            entries = [e for e in entries if e["id"] not in self._numbers]
+            if not entries:
+                return
+            self._append_log(entries)
+            for entry in entries:
+                self._add_one(entry["id"], entry["terms"], entry["metadata"])
+            self._maybe_compact()
+
+    def delete(self, ids: Iterable[str]) -> int:
+        with self._lock, self._file_lock():
+            self._sync()
+            removed = [doc_id for doc_id in ids if doc_id in self._numbers]
+            if not removed:
+                return 0
+            self._append_log([{"delete": doc_id} for doc_id in removed])
+            for doc_id in removed:
+                self._delete_one(doc_id)
+            self._maybe_compact()
+            return len(removed)
+
+    def _append_log(self, entries: List[dict]):
+        """Appends entries to the log; the caller holds the file lock and is in sync."""
+        with open(self.log_path, "ab") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8"))
+            self._log_offset = f.tell()
+        self._log_entries += len(entries)
+
+    def _maybe_compact(self):
+        if self._log_entries >= self.compact_every:
+            self._compact()
+
+    def compact(self):
+        """Drops tombstoned documents and folds the log into a fresh snapshot."""
+        with self._lock, self._file_lock():
+            self._sync()
+            self._compact()
+
+    def _compact(self):
+        """compact() for a caller holding both locks."""
+        if self._deleted:
+            live = [n for n in range(len(self._ids)) if n not in self._deleted]
+            renumber = {old: new for new, old in enumerate(live)}
+            self._ids = [self._ids[n] for n in live]
+            self._lengths = [self._lengths[n] for n in live]
+            self._metadatas = [self._metadatas[n] for n in live]
+            postings = {}
+            for term, docs in self._postings.items():
+                kept = {renumber[n]: tf for n, tf in docs.items() if n in renumber}
+                if kept:
+                    postings[term] = kept
+            self._postings = postings
+            self._numbers = {doc_id: n for n, doc_id in enumerate(self._ids)}
+            self._deleted = set()
+        state = {
+            "ids": self._ids,
+            "lengths": self._lengths,
+            "metadatas": self._metadatas,
+            "postings": self._postings
+        }
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.snapshot_path)
+        # The snapshot now covers everything logged so far, by any process (the lock is held)
+        open(self.log_path, "w").close()
+        self._snapshot_stat = _file_stat(self.snapshot_path)
+        self._log_entries = 0
+        self._log_offset = 0
+
+    def search(self, query: str, n_results: int, where: Optional[dict] = None) -> List[Tuple[str, float]]:
+        """Returns up to `n_results` (id, BM25 score) pairs, best first."""
+        terms = set(tokenize(query))
+        with self._lock:
+            if self._stale():
+                with self._file_lock(shared=True):
+                    self._sync()
+            count = len(self._numbers)
+            if not count or not terms:
+                return []
+            avg_length = self._total_length / count
+            scores: Dict[int, float] = {}
+            for term in terms:
+                docs = self._postings.get(term)
+                if not docs:
+                    continue
+                # Tombstones stay in the postings until compaction but must not count towards df
+                postings = [(n, tf) for n, tf in docs.items() if n not in self._deleted] if self._deleted else docs.items()
+                df = len(postings)
+                if not df:
+                    continue
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                for number, tf in postings:
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[number] / avg_length)
+                    scores[number] = scores.get(number, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+            if where:
+                scores = {n: s for n, s in scores.items() if matches_where(self._metadatas[n], where)}
+            best = heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+            return [(self._ids[n], score) for n, score in best]
@@ -1,29 +1,91 @@
+import time
+_started = time.perf_counter()
+
+import asyncio
+import hashlib
+import json
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from mcp.server import NotificationOptions, InitializationOptions
 from mcp.server.sse import SseServerTransport
 from config_manager import ConfigManager
-from vector_service import VectorService
+from vector_service import VectorService, VectorServiceOverloaded
 from mcp_core import MCPCore
+from metrics import MetricsRegistry, merge_families, render_families
+from cluster import ClusterNode
 import uvicorn
 import os
+from typing import Optional
+
+logger = logging.getLogger("uvicorn.error")
+startup_phases = {"imports": time.perf_counter() - _started}
 
 # 1. Initialize Modular Components
-config_manager = ConfigManager(config_path="config.yaml")
-vector_service = VectorService(db_path="./db")
-mcp_core = MCPCore(config_manager, vector_service)
+# Cheap by design: the vector store and embedding model are opened in the background
+_phase_started = time.perf_counter()
+config_manager = ConfigManager(config_path=os.getenv("MCP_CONFIG", "config.yaml"))
+metrics_registry = MetricsRegistry()
+vector_service = VectorService(
+    db_path=os.getenv("MCP_DB_PATH", "./db"),
+    config=config_manager.config.knowledge_base,
+    metrics_registry=metrics_registry
+)
+mcp_core = MCPCore(config_manager, vector_service, metrics_registry)
+
+# MCP SSE transport; the cluster node routes message POSTs to the worker holding the session
+mcp_transport = SseServerTransport("/mcp/messages")
+cluster = ClusterNode(
+    config_manager.config.cluster,
+    mcp_transport.handle_post_message,
+    config_manager,
+    metrics_registry,
+    mcp_core.get_metrics
+)
+startup_phases["components"] = time.perf_counter() - _phase_started
+mcp_core.startup = startup_phases
+
+def _format_phases(phases) -> str:
+    return ", ".join(f"{phase}={seconds * 1000:.0f}ms" for phase, seconds in phases.items())
+
+async def _report_kb_ready():
+    """Logs the knowledge base startup breakdown once it is ready (or failed)."""
+    try:
+        await vector_service.initialize()
+    except Exception as e:
+        logger.error("Knowledge base failed to initialize: %s", e)
+        return
+    logger.info("Knowledge base ready: %s", _format_phases(vector_service.startup))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Starts worker pools and the config watcher on startup and releases them on shutdown."""
+    phase_started = time.perf_counter()
+    vector_service.start()
+    mcp_core.start()
+    config_manager.start_watching()
+    await cluster.start()
+    startup_phases["lifespan"] = time.perf_counter() - phase_started
+    startup_phases["total"] = time.perf_counter() - _started
+    logger.info("Server started (knowledge base warming up): %s", _format_phases(startup_phases))
+    kb_report = asyncio.get_running_loop().create_task(_report_kb_ready())
+    yield
+    kb_report.cancel()
+    await cluster.stop()
+    config_manager.stop_watching()
+    await mcp_core.close()
+    vector_service.close()
 
 # 2. FastAPI Application Setup
 app = FastAPI(
     title=config_manager.config.name,
     version=config_manager.config.version,
-    description="FastAPI_MCP_PoC: Unified MCP & Knowledge Base"
+    description="FastAPI_MCP_PoC: Unified MCP & Knowledge Base",
+    lifespan=lifespan
 )
 
-# 3. MCP SSE Transport Setup
-# This exposes the MCP protocol over SSE.
-# The SseServerTransport handles the SSE connection and message routing.
-mcp_transport = SseServerTransport("/mcp/messages")
-
 @app.get("/")
 async def health_check():
     """Simple health check and version info."""
@@ -34,15 +96,67 @@ async def health_check():
         "mcp_endpoint": "/mcp/sse"
     }
 
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and serving requests."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """
+    Readiness probe: 200 once the knowledge base is open and its model is
+    warmed up, 503 (with the phases done so far) until then.
+    """
+    ready = vector_service.ready
+    body = {
+        "status": "ready" if ready else "starting",
+        "error": vector_service.init_error,
+        "startup": {
+            component: {phase: round(seconds, 3) for phase, seconds in phases.items()}
+            for component, phases in mcp_core.startup_phases().items()
+        }
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+def conditional_json(request: Request, payload) -> Response:
+    """
+    JSON response tagged with an ETag of its body. A client that sends the
+    same tag in If-None-Match gets an empty 304 instead of the body.
+    """
+    body = json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
 @app.get("/metrics")
-async def get_metrics():
-    """Exposes internal metrics to the Python Frontend."""
-    return mcp_core.get_metrics()
+async def get_metrics(request: Request):
+    """Exposes internal metrics to the Python Frontend (summed across workers when clustered)."""
+    return conditional_json(request, await cluster.metrics_summary())
+
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """Exposes metrics in the Prometheus text format for scraping."""
+    if cluster.enabled:
+        body = render_families(merge_families(await cluster.collect_families()))
+    else:
+        body = metrics_registry.render_prometheus()
+    return PlainTextResponse(
+        body,
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 @app.get("/config")
-async def get_config():
+async def get_config(request: Request):
     """Returns the current raw YAML configuration."""
-    return {"yaml": config_manager.get_raw_yaml()}
+    return conditional_json(request, {
+        "yaml": config_manager.get_raw_yaml(),
+        "version": config_manager.version,
+        "reload_error": config_manager.last_error,
+        # Settings changed since startup that only apply after a restart
+        "restart_pending": config_manager.restart_pending
+    })
 
 @app.post("/config/update")
 async def update_config(request: Request):
@@ -50,34 +164,298 @@ async def update_config(request: Request):
     data = await request.json()
     new_config_yaml = data.get("yaml")
     if new_config_yaml:
-        config_manager.update_from_yaml(new_config_yaml)
+        try:
+            await config_manager.update_from_yaml(new_config_yaml)
+            await cluster.broadcast_reload()
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
         return {"status": "success", "message": "Configuration updated"}
     return {"status": "error", "message": "No YAML provided"}
 
+# --- Event Log ---
+@app.get("/logs")
+async def get_logs(
+    cursor: Optional[int] = None,
+    limit: int = 100,
+    kind: Optional[str] = None,
+    name: Optional[str] = None,
+    outcome: Optional[str] = None,
+    session_id: Optional[str] = None,
+    min_duration_ms: Optional[float] = None
+):
+    """
+    Returns logged events newer than `cursor` (oldest first) and the cursor
+    to pass next time; without a cursor, the newest events. Per worker.
+    """
+    return mcp_core.event_log.query(
+        cursor, min(max(limit, 1), 1000),
+        kind=kind, name=name, outcome=outcome, session_id=session_id, min_duration_ms=min_duration_ms
+    )
+
+@app.get("/logs/stream")
+async def stream_logs(
+    request: Request,
+    cursor: Optional[int] = None,
+    kind: Optional[str] = None,
+    name: Optional[str] = None,
+    outcome: Optional[str] = None,
+    session_id: Optional[str] = None,
+    min_duration_ms: Optional[float] = None
+):
+    """
+    Tails the event log as Server-Sent Events, one `id: <seq>` event per
+    log event. Reconnecting clients resume from Last-Event-ID.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    event_log = mcp_core.event_log
+    filters = dict(kind=kind, name=name, outcome=outcome, session_id=session_id, min_duration_ms=min_duration_ms)
+
+    async def events():
+        position = event_log.latest if cursor is None else cursor
+        while True:
+            if not await event_log.wait(position, timeout=15.0):
+                yield ": keep-alive\n\n"
+                continue
+            page = event_log.query(position, 500, **filters)
+            if page["missed"]:
+                yield f"event: missed\ndata: {page['missed']}\n\n"
+            for event in page["events"]:
+                yield f"id: {event['seq']}\ndata: {json.dumps(event)}\n\n"
+            position = page["cursor"]
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# --- Knowledge Base Endpoints ---
+class RequestStreamingResponse(StreamingResponse):
+    """
+    Streaming response for endpoints that keep reading the request body while
+    responding. The stock response listens for client disconnects on `receive`,
+    which would race the handler for body chunks, so it only streams here.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+async def _iter_ndjson_records(request: Request):
+    """Parses a streamed NDJSON body into (content, metadata) records without buffering it."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_record(line)
+    if buffer.strip():
+        yield _parse_record(buffer)
+
+def _parse_record(line: bytes):
+    """Accepts either a JSON string or an object with `content` and optional `metadata`."""
+    item = json.loads(line)
+    if isinstance(item, str):
+        return item, None
+    return item["content"], item.get("metadata")
+
+@app.post("/kb/ingest")
+async def ingest(request: Request, batch_size: int = 0, collection: Optional[str] = None, ttl: Optional[float] = None):
+    """
+    Bulk-ingests an NDJSON stream of documents into a collection (the
+    default one unless `collection` is given), expiring them after `ttl`
+    seconds if set. Streams back one NDJSON progress line per batch,
+    followed by a summary line.
+    """
+    async def progress():
+        started = time.perf_counter()
+        report = {"documents": 0, "added": 0, "skipped": 0, "batch": 0}
+        try:
+            async for report in vector_service.iter_add_documents(
+                _iter_ndjson_records(request), batch_size or None, collection, ttl
+            ):
+                yield json.dumps({k: v for k, v in report.items() if k != "ids"}) + "\n"
+        except Exception as e:
+            yield json.dumps({
+                "status": "error", "message": str(e),
+                "added": report["added"], "skipped": report["skipped"]
+            }) + "\n"
+            return
+        elapsed = time.perf_counter() - started
+        yield json.dumps({
+            "status": "success",
+            "documents": report["documents"],
+            "added": report["added"],
+            "skipped": report["skipped"],
+            "batches": report["batch"],
+            "elapsed": round(elapsed, 3),
+            "docs_per_sec": round((report["added"] + report["skipped"]) / elapsed, 1) if elapsed > 0 else 0.0
+        }) + "\n"
+
+    return RequestStreamingResponse(progress(), media_type="application/x-ndjson")
+
+@app.get("/kb/export")
+async def export_snapshot(collection: Optional[str] = None, compression: str = "zlib"):
+    """
+    Streams a snapshot of a collection: IDs, documents, metadata and raw
+    embeddings in compressed columnar batches, for /kb/import elsewhere.
+    """
+    chunks = vector_service.iter_export(collection, compression)
+    try:
+        # Pulled before responding so a bad collection is a 400, not a truncated 200
+        header = await anext(chunks)
+    except VectorServiceOverloaded as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=503)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+
+    async def body():
+        yield header
+        async for chunk in chunks:
+            yield chunk
+
+    name = collection or vector_service.config.default_collection
+    return StreamingResponse(
+        body(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{name}.kbsnap"'}
+    )
+
+@app.post("/kb/import")
+async def import_snapshot(request: Request, collection: Optional[str] = None):
+    """
+    Loads a snapshot from the streamed request body into a collection
+    without re-embedding it. Streams back one NDJSON progress line per
+    batch, followed by a summary line.
+    """
+    async def progress():
+        report = {"rows": 0, "added": 0, "skipped": 0, "batch": 0}
+        try:
+            async for report in vector_service.iter_import(request.stream(), collection):
+                yield json.dumps(report) + "\n"
+        except Exception as e:
+            yield json.dumps({
+                "status": "error", "message": str(e),
+                "added": report["added"], "skipped": report["skipped"]
+            }) + "\n"
+            return
+        yield json.dumps({"status": "success", **report}) + "\n"
+
+    return RequestStreamingResponse(progress(), media_type="application/x-ndjson")
+
+@app.post("/kb/delete")
+async def delete_documents(request: Request):
+    """Deletes documents (with all their chunks) by ID. Body: `ids`, optional `collection`."""
+    data = await request.json()
+    ids = data.get("ids")
+    if not isinstance(ids, list) or not ids:
+        return JSONResponse({"status": "error", "message": "No ids provided"}, status_code=400)
+    try:
+        removed = await vector_service.delete_documents([str(doc_id) for doc_id in ids], data.get("collection"))
+    except VectorServiceOverloaded as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=503)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+    return {"status": "success", "removed": removed}
+
+@app.post("/kb/compact")
+async def compact(collection: Optional[str] = None):
+    """Sweeps expired documents from a collection and reclaims the space of deleted ones now."""
+    try:
+        result = await vector_service.compact(collection)
+    except VectorServiceOverloaded as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=503)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+    return {"status": "success", **result}
+
+# --- Resources ---
+@app.get("/resources/read")
+async def read_resource(uri: str):
+    """
+    Streams the content of an MCP resource in chunks, so large resources
+    (e.g. kb://doc/{id}) are never built as one string.
+    """
+    try:
+        mime_type, chunks = mcp_core.open_resource(uri)
+        # Pulled before responding so a missing resource is a 404, not a truncated 200
+        first = await anext(chunks, "")
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=404)
+
+    async def body():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(body(), media_type=mime_type)
+
+@app.post("/kb/search")
+async def search(request: Request):
+    """
+    Searches the knowledge base. Body: `query`, optional `n_results`,
+    `mode` (vector, lexical or hybrid), `where`, `collapse` and
+    `collection` (a name, a list of names or "*" for all).
+    """
+    data = await request.json()
+    query = data.get("query")
+    if not query:
+        return JSONResponse({"status": "error", "message": "No query provided"}, status_code=400)
+    started = time.perf_counter()
+    try:
+        results = await vector_service.query(
+            query,
+            n_results=min(max(int(data.get("n_results", 3)), 1), 50),
+            where=data.get("where"),
+            collapse=bool(data.get("collapse", False)),
+            mode=data.get("mode", "vector"),
+            collections=data.get("collection") or None
+        )
+    except VectorServiceOverloaded as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=503)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e)}, status_code=400)
+    return {
+        "status": "success",
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
 # --- SSE Endpoints for MCP Protocol ---
+class AlreadySentResponse(Response):
+    """Returned by endpoints whose ASGI app has already sent the full response."""
+    async def __call__(self, scope, receive, send):
+        pass
+
 @app.get("/mcp/sse")
 async def sse(request: Request):
     """SSE endpoint for MCP client connections."""
-    async with mcp_transport.connect_sse(request.scope, request.receive, request.send) as (read_stream, write_stream):
-        await mcp_core.server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name=config_manager.config.name,
-                server_version=config_manager.config.version,
-                capabilities=mcp_core.server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+    mcp_core.session_opened()
+    try:
+        async with cluster.sse_session(request._send) as send, \
+                mcp_transport.connect_sse(request.scope, request.receive, send) as (read_stream, write_stream):
+            await mcp_core.server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name=config_manager.config.name,
+                    server_version=config_manager.config.version,
+                    capabilities=mcp_core.server.get_capabilities(
+                        notification_options=NotificationOptions(tools_changed=True),
+                        experimental_capabilities={},
+                    ),
                 ),
-            ),
-        )
+            )
+    finally:
+        mcp_core.session_closed()
+    return AlreadySentResponse()
 
 @app.post("/mcp/messages")
 async def messages(request: Request):
     """Post messages endpoint for MCP protocol."""
-    await mcp_transport.handle_post_message(request.scope, request.receive, request.send)
+    await cluster.handle_post_message(request.scope, request.receive, request._send)
+    return AlreadySentResponse()
 
 if __name__ == "__main__":
     # Run the server
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Several workers need an import string and `cluster.enabled: true` in config.yaml
+    workers = int(os.getenv("WORKERS", 1))
+    uvicorn.run("main:app" if workers > 1 else app, host="0.0.0.0", port=port, workers=workers)
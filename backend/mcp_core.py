@@ -1,10 +1,106 @@
 import asyncio
-from typing import Any, Dict, List, Optional
+import time
+import weakref
+from contextlib import asynccontextmanager
+from types import FunctionType
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 from mcp.server import Server
+from mcp.server.lowlevel.helper_types import ReadResourceContents
 import mcp.types as types
+from admission import AdmissionController, AdmissionRejected
+from cache import canonical_key
 from config_manager import ConfigManager
-from models import ToolConfig, ResourceConfig
-from vector_service import VectorService
+from event_log import EventLog
+from metrics import MetricsRegistry
+from models import ServerConfig, ToolConfig, ResourceConfig
+from registry import Registry, build_registry
+from resources import ResourceRenderer
+from tool_pool import ToolProcessPool
+from vector_service import VectorService, check_collections
+
+# Built-in knowledge base tools, listed ahead of the configured ones
+BASE_TOOLS = (
+    types.Tool(
+        name="kb_search",
+        description="Search the knowledge base for information",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "query": {"type": "string", "description": "Search query"},
+                "mode": {
+                    "type": "string",
+                    "enum": ["vector", "lexical", "hybrid"],
+                    "description": "vector: semantic similarity (default); lexical: exact terms such as "
+                                   "identifiers and error codes (BM25); hybrid: both, fused by rank"
+                },
+                "n_results": {
+                    "type": "integer",
+                    "minimum": 1,
+                    "maximum": 50,
+                    "description": "Number of results to return (default 3)"
+                },
+                "where": {
+                    "type": "object",
+                    "description": "Metadata filter, e.g. {\"source\": \"manual\"} or "
+                                   "{\"year\": {\"$gte\": 2023}}"
+                },
+                "collapse": {
+                    "type": "boolean",
+                    "description": "Return at most one chunk per source document"
+                },
+                "collection": {
+                    "type": ["string", "array"],
+                    "items": {"type": "string"},
+                    "description": "Collection to search, a list of collections searched together, "
+                                   "or \"*\" for all (default: the default collection)"
+                }
+            },
+            "required": ["query"]
+        }
+    ),
+    types.Tool(
+        name="kb_add",
+        description="Add information to the knowledge base",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "content": {"type": "string", "description": "Content to add"},
+                "collection": {"type": "string", "description": "Collection to add to (default: the default collection)"},
+                "ttl_seconds": {"type": "number", "description": "Delete the document after this many seconds"}
+            },
+            "required": ["content"]
+        }
+    ),
+    types.Tool(
+        name="kb_add_batch",
+        description="Add many documents to the knowledge base in one call",
+        inputSchema={
+            "type": "object",
+            "properties": {
+                "documents": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Contents to add"
+                },
+                "metadatas": {
+                    "type": "array",
+                    "items": {"type": "object"},
+                    "description": "Optional metadata for each document, in the same order"
+                },
+                "collection": {"type": "string", "description": "Collection to add to (default: the default collection)"},
+                "ttl_seconds": {"type": "number", "description": "Delete the documents after this many seconds"}
+            },
+            "required": ["documents"]
+        }
+    ),
+)
+
+# Default templates of the resource providers, used when a resource has no content
+PROVIDER_TEMPLATES = {
+    "kb_stats": "{{ data | tojson(indent=2) }}\n",
+    "recent_ingests": "{{ data | tojson(indent=2) }}\n",
+    "kb_document": "{% for part in data.parts %}{{ part }}{% endfor %}"
+}
 
 class MCPCore:
     """
@@ -12,136 +108,536 @@ class MCPCore:
     resource management, and dynamic execution of Python code.
     Now integrated with VectorService for Knowledge Base access.
     """
-    def __init__(self, config_manager: ConfigManager, vector_service: VectorService):
+    def __init__(
+        self,
+        config_manager: ConfigManager,
+        vector_service: VectorService,
+        metrics_registry: Optional[MetricsRegistry] = None
+    ):
         self.config_manager = config_manager
         self.vector_service = vector_service
+        self.metrics_registry = metrics_registry or MetricsRegistry()
+        self._setup_metrics()
         self.server = Server(self.config_manager.config.name)
         self._setup_handlers()
+
+        # Shared globals for tool execution; arguments are layered on per call
+        self._exec_globals = {
+            "__builtins__": __builtins__,
+            "asyncio": asyncio,
+            "import_module": __import__,
+            "vector_service": self.vector_service  # Allow tools to access vector service
+        }
+        # Tools and resources are indexed (and tool code compiled) once per config
+        self.resource_renderer = ResourceRenderer(
+            {
+                "kb_stats": self._provide_kb_stats,
+                "recent_ingests": self._provide_recent_ingests,
+                "kb_document": self._provide_kb_document
+            }
+        )
+        self.registry: Registry = build_registry(
+            self.config_manager.config, BASE_TOOLS, resource_providers=PROVIDER_TEMPLATES
+        )
+        self.config_manager.add_listener(self._on_config_update)
+        # Sessions that have listed or called tools, notified when the tool set changes
+        self._sessions: "weakref.WeakSet" = weakref.WeakSet()
+        self._notify_tasks = set()
+        # Per-tool and global concurrency limits with bounded wait queues
+        concurrency = self.config_manager.config.concurrency
+        self.admission = AdmissionController(concurrency)
+        self.admission.configure(concurrency, concurrency.tools)
+        # Worker processes for tools configured with `execution: process`
+        self.tool_pool = ToolProcessPool(self.config_manager.config.tool_pool)
         
-        # Simple metrics
+        # Simple counters; the dashboard reads these through get_metrics()
         self.metrics = {
             "tools_called": 0,
             "resources_read": 0,
             "vector_queries": 0,
             "errors": 0
         }
+        # Structured events of tool calls and resource reads
+        self.event_log = EventLog(self.config_manager.config.event_log)
+        # Seconds per server startup phase, filled in by the application
+        self.startup: Dict[str, float] = {}
 
     def _setup_handlers(self):
         """Registers MCP handlers for listing/calling tools and resources."""
         
         @self.server.list_tools()
         async def handle_list_tools() -> List[types.Tool]:
-            # Default vector tools + configured tools
-            base_tools = [
-                types.Tool(
-                    name="kb_search",
-                    description="Search the knowledge base for information",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "query": {"type": "string", "description": "Search query"}
-                        },
-                        "required": ["query"]
-                    }
-                ),
-                types.Tool(
-                    name="kb_add",
-                    description="Add information to the knowledge base",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "content": {"type": "string", "description": "Content to add"}
-                        },
-                        "required": ["content"]
-                    }
-                )
-            ]
-            
-            config_tools = [
-                types.Tool(
-                    name=t.name,
-                    description=t.description,
-                    inputSchema=t.input_schema
-                )
-                for t in self.config_manager.config.tools
-            ]
-            return base_tools + config_tools
+            self._track_session()
+            # Prebuilt per config version: default vector tools + configured tools
+            return self.registry.tool_list
 
         @self.server.call_tool()
         async def handle_call_tool(
             name: str, arguments: Dict[str, Any] | None
         ) -> List[types.TextContent]:
+            self._track_session()
             self.metrics["tools_called"] += 1
-            arguments = arguments or {}
-
-            # Handle internal vector tools
-            if name == "kb_search":
-                self.metrics["vector_queries"] += 1
-                results = await self.vector_service.query(arguments.get("query", ""))
-                return [types.TextContent(type="text", text="\n".join(results))]
-            
-            if name == "kb_add":
-                doc_id = await self.vector_service.add_document(arguments.get("content", ""))
-                return [types.TextContent(type="text", text=f"Added to KB with ID: {doc_id}")]
-
-            # Handle dynamic configured tools
-            tool = next((t for t in self.config_manager.config.tools if t.name == name), None)
-            if not tool:
-                self.metrics["errors"] += 1
-                raise ValueError(f"Tool {name} not found")
-            
-            return await self._execute_tool(tool, arguments)
+            label = self._tool_label(name)
+            self._tool_calls.inc(label)
+            started = time.perf_counter()
+            outcome, detail = "ok", None
+            try:
+                async with self._admitted(label):
+                    result = await self._call_tool(name, arguments or {})
+                if result and result[0].text.startswith("Execution Error"):
+                    outcome, detail = "error", result[0].text
+                return result
+            except AdmissionRejected as e:
+                outcome, detail = "rejected", str(e)
+                self._record_error(self._tool_errors, label)
+                raise
+            except Exception as e:
+                outcome, detail = "error", str(e)
+                self._record_error(self._tool_errors, label)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                self._tool_duration.observe(label, value=elapsed)
+                self.event_log.record("tool", label, elapsed, outcome, self._session_id(), detail)
 
         @self.server.list_resources()
         async def handle_list_resources() -> List[types.Resource]:
-            return [
-                types.Resource(
-                    uri=r.uri,
-                    name=r.name,
-                    description=r.description,
-                    mimeType="text/plain"
-                )
-                for r in self.config_manager.config.resources
-            ]
+            return self.registry.resource_list
+
+        @self.server.list_resource_templates()
+        async def handle_list_resource_templates() -> List[types.ResourceTemplate]:
+            return self.registry.resource_templates
 
         @self.server.read_resource()
-        async def handle_read_resource(uri: str) -> str:
-            self.metrics["resources_read"] += 1
-            resource = next((r for r in self.config_manager.config.resources if r.uri == uri), None)
-            if not resource:
-                self.metrics["errors"] += 1
-                raise ValueError(f"Resource {uri} not found")
-            return resource.content
-
-    async def _execute_tool(self, tool: ToolConfig, arguments: Dict[str, Any]) -> List[types.TextContent]:
-        """Dynamically executes Python code defined in the tool configuration."""
+        async def handle_read_resource(uri: str) -> List[ReadResourceContents]:
+            mime_type, chunks = self.open_resource(str(uri))
+            # An MCP result is one message, so the chunks are joined once here
+            content = "".join([chunk async for chunk in chunks])
+            return [ReadResourceContents(content=content, mime_type=mime_type)]
+
+    def open_resource(self, uri: str) -> Tuple[str, AsyncIterator[str]]:
+        """
+        Resolves a resource read through the current registry's router.
+        Returns its MIME type and a stream of content chunks; raises
+        ValueError for an unknown URI.
+        """
+        self.metrics["resources_read"] += 1
+        registry = self.registry
+        resolved = registry.resource_router.match(uri)
+        # Templated resources are labelled by their template, not by each concrete URI
+        label = resolved[0].config.uri if resolved else "<unknown>"
+        self._resource_reads.inc(label)
+        if resolved is None:
+            self._record_error(self._resource_errors, label)
+            raise ValueError(f"Resource {uri} not found")
+        resource, params = resolved
+        return resource.config.mime_type, self._stream_resource(registry, resource, uri, params, label)
+
+    async def _stream_resource(self, registry, resource, uri: str, params: Dict[str, str], label: str):
+        started = time.perf_counter()
+        session_id = self._session_id()
+        outcome, detail = "ok", uri if params else None
         try:
-            # Prepare execution environment
-            exec_globals = {
-                "__builtins__": __builtins__,
-                "asyncio": asyncio,
-                "import_module": __import__,
-                "vector_service": self.vector_service  # Allow tools to access vector service
-            }
-            # Inject arguments directly into the local scope
-            exec_locals = arguments.copy()
-            
-            # Wrap tool code in an async function
-            indented_code = "\n".join(f"    {line}" for line in tool.code.splitlines())
-            wrapper = f"async def __mcp_execute__():\n{indented_code}"
-            
-            exec(wrapper, exec_globals, exec_locals)
-            func = exec_locals["__mcp_execute__"]
-            
-            # Execute and capture result
-            result = await func()
-            
-            return [types.TextContent(type="text", text=str(result))]
+            async for chunk in self.resource_renderer.stream(registry, resource, uri, params):
+                yield chunk
         except Exception as e:
-            self.metrics["errors"] += 1
+            outcome, detail = "error", f"{uri}: {e}"
+            self._record_error(self._resource_errors, label)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self._resource_duration.observe(label, value=elapsed)
+            self.event_log.record("resource", label, elapsed, outcome, session_id, detail)
+
+    async def _provide_kb_stats(self, params: Dict[str, str]) -> Dict[str, Any]:
+        return self.vector_service.get_stats()
+
+    async def _provide_recent_ingests(self, params: Dict[str, str]) -> Dict[str, Any]:
+        return {"ingests": self.vector_service.recent_ingests()}
+
+    async def _provide_kb_document(self, params: Dict[str, str]) -> Dict[str, Any]:
+        """A stored document; its text is streamed to the template as `data.parts`."""
+        doc_id = params.get("id", "")
+        rows = self.vector_service.iter_document(doc_id)
+        first = await anext(rows, None)
+        if first is None:
+            raise ValueError(f"Document {doc_id} not found")
+
+        async def parts():
+            yield first[0]
+            async for text, _ in rows:
+                yield text
+
+        return {"id": doc_id, "metadata": first[1] or {}, "parts": parts()}
+
+    @asynccontextmanager
+    async def _admitted(self, label: str):
+        """
+        Holds a slot of the tool's limiter and then the global one for the
+        duration of a call. A rejection raises AdmissionRejected, which the
+        SDK returns to the client as an error result straight away.
+        """
+        acquired = []
+        try:
+            for limiter in self.admission.limiters_for(label):
+                try:
+                    waited = await limiter.acquire()
+                except AdmissionRejected as e:
+                    self._admission_rejections.inc(limiter.label, e.reason)
+                    raise
+                acquired.append(limiter)
+                self._admission_wait.observe(limiter.label, value=waited)
+            yield
+        finally:
+            for limiter in reversed(acquired):
+                limiter.release()
+
+    async def _call_tool(self, name: str, arguments: Dict[str, Any]) -> List[types.TextContent]:
+        """Dispatches a tool call to the built-in KB tools or a configured tool."""
+        # Handle internal vector tools
+        if name == "kb_search":
+            self.metrics["vector_queries"] += 1
+            results = await self.vector_service.query(
+                arguments.get("query", ""),
+                n_results=int(arguments.get("n_results", 3)),
+                where=arguments.get("where") or None,
+                collapse=bool(arguments.get("collapse", False)),
+                mode=arguments.get("mode", "vector"),
+                collections=arguments.get("collection") or None
+            )
+            return [types.TextContent(type="text", text="\n".join(results))]
+        
+        if name == "kb_add":
+            doc_id = await self.vector_service.add_document(
+                arguments.get("content", ""),
+                collection=arguments.get("collection") or None,
+                ttl=arguments.get("ttl_seconds")
+            )
+            return [types.TextContent(type="text", text=f"Added to KB with ID: {doc_id}")]
+
+        if name == "kb_add_batch":
+            documents = arguments.get("documents", [])
+            metadatas = arguments.get("metadatas")
+            if metadatas is not None and len(metadatas) != len(documents):
+                raise ValueError("metadatas must have one entry per document")
+            result = await self.vector_service.add_documents(
+                documents, metadatas,
+                collection=arguments.get("collection") or None,
+                ttl=arguments.get("ttl_seconds")
+            )
+            return [types.TextContent(
+                type="text",
+                text=f"Ingested {result['documents']} documents into KB: {result['added']} entries added, "
+                     f"{result['skipped']} already present, in {result['batches']} batches "
+                     f"({result['docs_per_sec']} entries/sec)"
+            )]
+
+        # Handle dynamic configured tools; the registry is read once so
+        # the call runs against a single config version
+        registry = self.registry
+        tool = registry.tools.get(name)
+        if not tool:
+            raise ValueError(f"Tool {name} not found")
+        
+        return await self._execute_tool(registry, tool, arguments)
+
+    def _setup_metrics(self):
+        """Declares per-tool/resource counters and latency histograms, plus scrape-time collectors."""
+        registry = self.metrics_registry
+        self._tool_calls = registry.counter("mcp_tool_calls_total", "Tool calls", ["tool"])
+        self._tool_errors = registry.counter("mcp_tool_errors_total", "Failed tool calls", ["tool"])
+        self._tool_duration = registry.histogram("mcp_tool_duration_seconds", "Tool call latency", ["tool"])
+        self._tool_cache_requests = registry.counter(
+            "mcp_tool_cache_requests_total", "Result cache lookups of pure tools", ["tool", "result"]
+        )
+        self._resource_reads = registry.counter("mcp_resource_reads_total", "Resource reads", ["uri"])
+        self._resource_errors = registry.counter("mcp_resource_errors_total", "Failed resource reads", ["uri"])
+        self._resource_duration = registry.histogram(
+            "mcp_resource_duration_seconds", "Resource read latency", ["uri"]
+        )
+        self._admission_rejections = registry.counter(
+            "mcp_admission_rejections_total", "Tool calls shed by concurrency limits", ["scope", "reason"]
+        )
+        self._admission_wait = registry.histogram(
+            "mcp_admission_wait_seconds", "Time tool calls waited for a concurrency slot", ["scope"]
+        )
+        for key in ("queued", "active"):
+            registry.add_collector(
+                f"mcp_admission_{key}", "gauge", f"Tool calls {key} per concurrency limit",
+                lambda key=key: [
+                    (f"mcp_admission_{key}", {"scope": limiter.label}, getattr(limiter, key))
+                    for limiter in self._all_limiters()
+                ]
+            )
+        self._sse_active = registry.gauge("mcp_sse_sessions_active", "Open MCP SSE sessions")
+        self._sse_total = registry.counter("mcp_sse_sessions_total", "MCP SSE sessions opened")
+        registry.add_collector(
+            "mcp_event_log_events_total", "counter", "Events offered to the event log by result",
+            lambda: [
+                ("mcp_event_log_events_total", {"result": "recorded"}, self.event_log.recorded),
+                ("mcp_event_log_events_total", {"result": "sampled_out"}, self.event_log.sampled_out)
+            ]
+        )
+        registry.add_collector(
+            "mcp_config_version", "gauge", "Version of the installed configuration snapshot",
+            lambda: [("mcp_config_version", {}, self.config_manager.version)]
+        )
+        registry.add_collector(
+            "mcp_startup_phase_seconds", "gauge", "Time spent in each startup phase",
+            lambda: [
+                ("mcp_startup_phase_seconds", {"component": component, "phase": phase}, seconds)
+                for component, phases in self.startup_phases().items()
+                for phase, seconds in phases.items()
+            ]
+        )
+        registry.add_collector(
+            "kb_ready", "gauge", "Whether the knowledge base is open and its model warmed up",
+            lambda: [("kb_ready", {}, int(self.vector_service.ready))]
+        )
+        registry.add_collector(
+            "kb_documents", "gauge", "Documents stored in the knowledge base",
+            lambda: [("kb_documents", {}, self.vector_service.get_stats()["count"])]
+        )
+        registry.add_collector(
+            "kb_collection_documents", "gauge", "Documents stored per knowledge base collection",
+            lambda: [
+                ("kb_collection_documents", {"collection": name}, collection["count"])
+                for name, collection in self.vector_service.get_stats()["collections"].items()
+            ]
+        )
+        registry.add_collector(
+            "kb_bytes_on_disk", "gauge", "Size of the knowledge base store on disk (as of the last reconcile)",
+            lambda: [("kb_bytes_on_disk", {}, self.vector_service.get_stats()["bytes_on_disk"])]
+        )
+        registry.add_collector(
+            "kb_cache_requests_total", "counter", "Knowledge base cache lookups by result",
+            self._collect_cache_samples
+        )
+        for key in ("workers", "busy", "waiting", "saturation"):
+            registry.add_collector(
+                f"mcp_tool_pool_{key}", "gauge", f"Tool worker pool {key}",
+                lambda key=key: [(f"mcp_tool_pool_{key}", {}, self.tool_pool.get_stats()[key])]
+            )
+        for key in ("calls", "timeouts", "crashes", "restarts"):
+            registry.add_collector(
+                f"mcp_tool_pool_{key}_total", "counter", f"Tool worker pool {key}",
+                lambda key=key: [(f"mcp_tool_pool_{key}_total", {}, self.tool_pool.get_stats()[key])]
+            )
+
+    def _all_limiters(self):
+        return (self.admission.global_limiter, *self.admission.tool_limiters.values())
+
+    def _collect_cache_samples(self):
+        for cache, stats in self.vector_service.get_stats()["caches"].items():
+            yield "kb_cache_requests_total", {"cache": cache, "result": "hit"}, stats["hits"]
+            yield "kb_cache_requests_total", {"cache": cache, "result": "miss"}, stats["misses"]
+
+    def _tool_label(self, name: str) -> str:
+        """Metric label for a tool; unknown names share one label to bound cardinality."""
+        if name in self.registry.tools or any(t.name == name for t in BASE_TOOLS):
+            return name
+        return "<unknown>"
+
+    def _record_error(self, counter, label: str):
+        self.metrics["errors"] += 1
+        counter.inc(label)
+
+    def session_opened(self):
+        """Called by the SSE endpoint when a client connects."""
+        self._sse_active.inc()
+        self._sse_total.inc()
+
+    def session_closed(self):
+        self._sse_active.dec()
+
+    def _track_session(self):
+        try:
+            self._sessions.add(self.server.request_context.session)
+        except LookupError:
+            pass  # Called outside a request (tool list refresh on reload)
+
+    def _session_id(self) -> Optional[str]:
+        """SSE session ID of the MCP request being handled, if any."""
+        try:
+            request = self.server.request_context.request
+        except LookupError:
+            return None
+        # The POST that carried the message names its session in the query string
+        query_params = getattr(request, "query_params", None)
+        return query_params.get("session_id") if query_params is not None else None
+
+    def _on_config_update(self, config: ServerConfig):
+        """
+        Builds the registry for a new config (in the config manager's worker
+        thread) and returns the installer that swaps it in with a single
+        assignment. Calls already running keep the registry they started with.
+        """
+        registry = build_registry(config, BASE_TOOLS, self.registry, PROVIDER_TEMPLATES)
+        check_collections(config.knowledge_base)
+
+        def install():
+            self.vector_service.configure(config.knowledge_base)
+            self.tool_pool.configure(config.tool_pool)
+            self.admission.configure(config.concurrency, config.concurrency.tools)
+            self.event_log.configure(config.event_log)
+            previous, self.registry = self.registry, registry
+            if registry.tool_list != previous.tool_list:
+                task = asyncio.get_running_loop().create_task(self._tools_changed())
+                self._notify_tasks.add(task)
+                task.add_done_callback(self._notify_tasks.discard)
+
+        return install
+
+    async def _tools_changed(self):
+        """
+        Refreshes the SDK's copy of the tool list, which it validates call
+        arguments against, by going through its tools/list handler; then
+        notifies the sessions.
+        """
+        await self.server.request_handlers[types.ListToolsRequest](types.ListToolsRequest(method="tools/list"))
+        await self._notify_tools_changed()
+
+    async def _notify_tools_changed(self):
+        """Sends notifications/tools/list_changed to every tracked session."""
+        for session in list(self._sessions):
+            try:
+                await session.send_tool_list_changed()
+            except Exception:
+                # The session's stream is gone; it disconnected
+                self._sessions.discard(session)
+
+    async def _execute_tool(
+        self, registry: Registry, tool: ToolConfig, arguments: Dict[str, Any]
+    ) -> List[types.TextContent]:
+        """
+        Executes the precompiled Python code of a configured tool. Results
+        of tools marked pure are served from the registry's cache; errors
+        are never cached.
+        """
+        cache = registry.result_caches.get(tool.name)
+        if cache is not None:
+            key = canonical_key(arguments)
+            text = cache.get(key)
+            self._tool_cache_requests.inc(tool.name, "miss" if text is None else "hit")
+            if text is not None:
+                return [types.TextContent(type="text", text=text)]
+        try:
+            text = await self._run_tool_code(registry, tool, arguments)
+        except Exception as e:
+            self._record_error(self._tool_errors, tool.name)
             return [types.TextContent(type="text", text=f"Execution Error: {str(e)}")]
+        if cache is not None:
+            cache.put(key, text)
+        return [types.TextContent(type="text", text=text)]
+
+    async def _run_tool_code(self, registry: Registry, tool: ToolConfig, arguments: Dict[str, Any]) -> str:
+        compiled = registry.compiled[tool.name]
+
+        if tool.execution == "process":
+            return await self.tool_pool.run(
+                compiled.digest, compiled.code, arguments, tool.timeout, tool.rlimits
+            )
+
+        # Arguments are exposed as globals so the tool body can reference them by name
+        exec_globals = {**self._exec_globals, **arguments}
+        func = FunctionType(compiled.code, exec_globals)
+
+        # Execute and capture result
+        result = await func()
+        return str(result)
 
     def get_metrics(self) -> Dict[str, Any]:
         """Returns internal metrics for the dashboard."""
         stats = self.vector_service.get_stats()
-        return {**self.metrics, "kb_count": stats["count"]}
+        return {
+            **self.metrics,
+            "startup": {
+                component: {phase: round(seconds, 3) for phase, seconds in phases.items()}
+                for component, phases in self.startup_phases().items()
+            },
+            "kb_ready": stats["ready"],
+            "kb_init_error": stats["init_error"],
+            "kb_count": stats["count"],
+            "kb_collections": stats["collections"],
+            "kb_dimension": stats["dimension"],
+            "kb_bytes_on_disk": stats["bytes_on_disk"],
+            "kb_last_ingest": stats["last_ingest"],
+            "kb_last_reconcile": stats["last_reconcile"],
+            "kb_pending": stats["pending"],
+            "kb_coalesced": stats["coalesced"],
+            "kb_caches": stats["caches"],
+            "kb_timings": stats["timings"],
+            "tool_pool": self.tool_pool.get_stats(),
+            "tool_stats": {
+                label[0]: self._call_stats(histogram, self._tool_errors.value(*label))
+                for label, histogram in self._tool_duration.children.items()
+            },
+            "tool_caches": self._tool_cache_stats(),
+            "event_log": self.event_log.get_stats(),
+            "admission": self._admission_stats(),
+            "resource_stats": {
+                label[0]: self._call_stats(histogram, self._resource_errors.value(*label))
+                for label, histogram in self._resource_duration.children.items()
+            },
+            "sse_sessions": self._sse_active.value(),
+            "config_version": self.config_manager.version,
+            "tool_registry_version": self.registry.version
+        }
+
+    def startup_phases(self) -> Dict[str, Dict[str, float]]:
+        """Seconds per startup phase, for the server process and the knowledge base."""
+        return {"server": self.startup, "knowledge_base": self.vector_service.startup}
+
+    def _admission_stats(self) -> Dict[str, Any]:
+        """Occupancy, rejections and queue wait per concurrency limit."""
+        stats = {}
+        for limiter in self._all_limiters():
+            wait = self._admission_wait.labels(limiter.label).summary()
+            stats[limiter.label] = {
+                "max_concurrent": limiter.max_concurrent,
+                "active": limiter.active,
+                "queued": limiter.queued,
+                "rejected": int(sum(
+                    value for (scope, _), value in self._admission_rejections.children.items()
+                    if scope == limiter.label
+                )),
+                "wait_p50_ms": wait["p50_ms"],
+                "wait_p99_ms": wait["p99_ms"]
+            }
+        return stats
+
+    def _tool_cache_stats(self) -> Dict[str, Any]:
+        """Hit ratios since startup and occupancy of the current version's caches, per tool."""
+        caches = self.registry.result_caches
+        names = set(caches) | {tool for tool, _ in self._tool_cache_requests.children}
+        stats = {}
+        for name in sorted(names):
+            hits = self._tool_cache_requests.value(name, "hit")
+            misses = self._tool_cache_requests.value(name, "miss")
+            cache = caches.get(name)
+            stats[name] = {
+                "hits": int(hits),
+                "misses": int(misses),
+                "hit_ratio": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                "entries": len(cache) if cache is not None else 0,
+                "bytes": cache.stats()["bytes"] if cache is not None else 0
+            }
+        return stats
+
+    @staticmethod
+    def _call_stats(histogram, errors: float) -> Dict[str, Any]:
+        summary = histogram.summary()
+        return {
+            "calls": summary.pop("count"),
+            "errors": int(errors),
+            **summary
+        }
+
+    def start(self):
+        """Warms up the tool worker pool when any configured tool runs out of process."""
+        if any(t.execution == "process" for t in self.registry.tools.values()):
+            self.tool_pool.start()
+
+    async def close(self):
+        """Stops background workers."""
+        await self.tool_pool.shutdown()
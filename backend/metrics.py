@@ -0,0 +1,208 @@
+import bisect
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow tools
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# A sample produced by a collector: metric name, labels, value
+Sample = Tuple[str, Dict[str, str], float]
+# A metric family as collected: name, type, help text, samples
+FamilySamples = Tuple[str, str, str, List[Sample]]
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect plus three increments."""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One slot per bucket plus the +Inf overflow
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile as the upper bound of the bucket containing it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self) -> Dict[str, object]:
+        """Count, mean and bucket-bound p50/p99 in milliseconds, for JSON consumers."""
+        def bound_ms(q: float):
+            value = self.quantile(q)
+            # Beyond the last bucket there is no finite bound (and JSON has no Infinity)
+            return None if value == float("inf") else value * 1000
+
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": bound_ms(0.5),
+            "p99_ms": bound_ms(0.99)
+        }
+
+class _Family:
+    """A metric with a fixed label set; children are created on first use."""
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.children: Dict[Tuple[str, ...], object] = {}
+
+    def _labels_dict(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.label_names, key))
+
+class CounterFamily(_Family):
+    kind = "counter"
+
+    def inc(self, *label_values: str, amount: float = 1):
+        self.children[label_values] = self.children.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self.children.get(label_values, 0)
+
+    def samples(self) -> Iterable[Sample]:
+        for key, value in self.children.items():
+            yield self.name, self._labels_dict(key), value
+
+class GaugeFamily(CounterFamily):
+    kind = "gauge"
+
+    def set(self, *label_values: str, value: float):
+        self.children[label_values] = value
+
+    def dec(self, *label_values: str, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+class HistogramFamily(_Family):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.bucket_bounds = tuple(buckets)
+
+    def labels(self, *label_values: str) -> Histogram:
+        histogram = self.children.get(label_values)
+        if histogram is None:
+            histogram = self.children[label_values] = Histogram(self.bucket_bounds)
+        return histogram
+
+    def observe(self, *label_values: str, value: float):
+        self.labels(*label_values).observe(value)
+
+    def samples(self) -> Iterable[Sample]:
+        for key, histogram in self.children.items():
+            labels = self._labels_dict(key)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, histogram.sum
+            yield f"{self.name}_count", labels, histogram.count
+
+class MetricsRegistry:
+    """
+    In-process metrics with Prometheus text exposition. Recording is a few
+    dict/list operations without locks: all updates happen on the event
+    loop thread (executor timings are measured in the worker thread and
+    recorded after the await). Values that already live elsewhere (KB
+    stats, pool stats) are pulled at scrape time through collectors.
+    """
+    def __init__(self):
+        self._families: Dict[str, _Family] = {}
+        self._collectors: List[Tuple[str, str, str, Callable[[], Iterable[Sample]]]] = []
+
+    def _register(self, family: _Family) -> _Family:
+        existing = self._families.get(family.name)
+        if existing is not None:
+            return existing
+        self._families[family.name] = family
+        return family
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> CounterFamily:
+        return self._register(CounterFamily(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> GaugeFamily:
+        return self._register(GaugeFamily(name, help_text, labels))
+
+    def histogram(
+        self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> HistogramFamily:
+        return self._register(HistogramFamily(name, help_text, labels, buckets))
+
+    def add_collector(self, name: str, kind: str, help_text: str, collect: Callable[[], Iterable[Sample]]):
+        """Registers a callback producing samples for metric `name` at scrape time."""
+        self._collectors.append((name, kind, help_text, collect))
+
+    def collect(self) -> List[FamilySamples]:
+        """Returns every metric family with its current samples (plain, JSON-serializable data)."""
+        families = [
+            (family.name, family.kind, family.help, list(family.samples()))
+            for family in self._families.values()
+        ]
+        families.extend(
+            (name, kind, help_text, list(collect()))
+            for name, kind, help_text, collect in self._collectors
+        )
+        return families
+
+    def render_prometheus(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format (0.0.4)."""
+        return render_families(self.collect())
+
+def render_families(families: Iterable[FamilySamples]) -> str:
+    lines = []
+    for name, kind, help_text, samples in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample_name, labels, value in samples:
+            lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+def merge_families(per_worker: Iterable[Tuple[str, List[FamilySamples]]]) -> List[FamilySamples]:
+    """
+    Combines the families collected from several worker processes.
+    Counters and histograms are summed per label set; gauges describe one
+    process each, so their samples are kept apart with a `worker` label.
+    """
+    merged: Dict[str, Tuple[str, str, Dict[Tuple, Sample]]] = {}
+    for worker, families in per_worker:
+        for name, kind, help_text, samples in families:
+            _, _, combined = merged.setdefault(name, (kind, help_text, {}))
+            for sample_name, labels, value in samples:
+                if kind == "gauge":
+                    labels = {**labels, "worker": worker}
+                key = (sample_name, tuple(sorted(labels.items())))
+                previous = combined.get(key)
+                combined[key] = (sample_name, labels, value + (previous[2] if previous else 0))
+    return [
+        (name, kind, help_text, list(combined.values()))
+        for name, (kind, help_text, combined) in merged.items()
+    ]
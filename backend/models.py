@@ -1,20 +1,115 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Literal, Optional
 from pydantic import BaseModel, Field
 
+class RLimitsConfig(BaseModel):
+    memory_mb: Optional[int] = None  # Address-space limit for the worker while the tool runs
+    cpu_seconds: Optional[int] = None  # CPU time budget per call; exceeding it kills the worker
+
+class ToolCacheConfig(BaseModel):
+    pure: bool = False  # Same arguments always give the same result; nothing is cached otherwise
+    ttl: Optional[float] = None  # Seconds a result stays valid; None keeps it until evicted
+    max_entries: int = 256
+    max_bytes: int = 1024 * 1024  # Upper bound on cached result text
+
 class ToolConfig(BaseModel):
     name: str
     description: str
     input_schema: Dict[str, Any]
     code: str  # Python code to execute for this tool
+    execution: Literal["inline", "process"] = "inline"  # "process" runs in the worker pool
+    timeout: Optional[float] = None  # Wall-clock seconds for process execution
+    rlimits: RLimitsConfig = Field(default_factory=RLimitsConfig)
+    cache: Optional[ToolCacheConfig] = None  # Memoize results of pure tools
 
 class ResourceConfig(BaseModel):
     name: str
     description: str
-    uri: str
-    content: str # Can be a template or static content
+    uri: str  # May contain {param} placeholders, e.g. kb://doc/{id}
+    content: str = ""  # Static text, or a Jinja template (see `template`)
+    template: bool = False  # Render content with Jinja; implied by a provider or URI parameters
+    provider: Optional[str] = None  # Live data exposed to the template as `data` (kb_stats, recent_ingests, kb_document)
+    ttl: Optional[float] = None  # Seconds a rendered result is served from memory; None renders every read
+    mime_type: str = "text/plain"
+
+class ChunkingConfig(BaseModel):
+    enabled: bool = True
+    unit: Literal["chars", "tokens"] = "chars"  # Window by characters or whitespace tokens
+    size: int = 1000  # Window length in `unit`s
+    overlap: int = 200  # Units shared by consecutive windows
+
+class LexicalConfig(BaseModel):
+    enabled: bool = True  # Keep a BM25 index next to the vector store for lexical/hybrid search
+    k1: float = 1.2  # BM25 term-frequency saturation
+    b: float = 0.75  # BM25 document-length normalization
+    rrf_k: int = 60  # Reciprocal rank fusion constant for hybrid search
+    compact_every: int = 10000  # Logged index updates before they are folded into the snapshot
+
+class CollectionConfig(BaseModel):
+    description: str = ""  # What the collection holds, e.g. the owning team
+    # Vector encoding (numpy backend): int8 scans a quarter of the float32 bytes, then re-ranks
+    # against the float32 vectors kept on disk. No float16: NumPy scans it slower than float32.
+    storage: Literal["float32", "int8"] = "float32"
+    rerank_factor: int = 4  # Candidates re-scored exactly per requested result with int8 storage
+    ttl_seconds: Optional[float] = None  # Default lifetime of added documents; None keeps them until deleted
+
+class CompactionConfig(BaseModel):
+    interval_seconds: float = 300.0  # Background sweep of expired documents and compaction; 0 disables it
+    min_deleted_fraction: float = 0.2  # Compact a collection once this share of its stored rows is deleted
+
+class KnowledgeBaseConfig(BaseModel):
+    backend: Literal["chroma", "numpy"] = "chroma"  # Vector store engine
+    max_workers: int = 4  # Threads for embedding and ChromaDB calls
+    max_queue: int = 64  # Calls allowed to wait for a thread before rejecting
+    batch_size: int = 256  # Documents embedded and written per bulk-ingest batch
+    embedding_cache_entries: int = 2048  # Query embeddings kept in memory
+    embedding_cache_bytes: int = 16 * 1024 * 1024  # Upper bound on cached embedding memory
+    result_cache_entries: int = 1024  # kb_search results kept per collection version
+    stats_refresh_seconds: float = 30.0  # Background reconcile of cached KB stats; 0 disables it
+    chunking: ChunkingConfig = Field(default_factory=ChunkingConfig)
+    lexical: LexicalConfig = Field(default_factory=LexicalConfig)
+    default_collection: str = "knowledge_base"  # Used when a call names no collection
+    # Further named collections (e.g. one per tenant), each with its own store and lexical index;
+    # the default collection may be listed too, to set its storage
+    collections: Dict[str, CollectionConfig] = {}
+    compaction: CompactionConfig = Field(default_factory=CompactionConfig)
+
+class ToolPoolConfig(BaseModel):
+    workers: int = 2  # Warm worker processes for tools with `execution: process`
+    default_timeout: float = 10.0  # Seconds, when a tool sets no timeout
+    # fork copies the server's threads' locks mid-use and can deadlock a worker; forkserver
+    # forks workers from a clean single-threaded process started on first use
+    start_method: Literal["fork", "forkserver", "spawn"] = "forkserver"
+
+class ConcurrencyLimitConfig(BaseModel):
+    max_concurrent: int = 0  # Calls running at once; 0 means unlimited
+    max_queue: int = 0  # Calls allowed to wait for a slot; beyond this they are rejected at once
+    queue_timeout: Optional[float] = 1.0  # Seconds a queued call waits before it is rejected
+
+class ConcurrencyConfig(ConcurrencyLimitConfig):
+    # Server-wide limit above; per-tool limits (built-in kb_* tools included) below
+    tools: Dict[str, ConcurrencyLimitConfig] = {}
+
+class ClusterConfig(BaseModel):
+    enabled: bool = False  # Turn on when running several workers (uvicorn --workers N)
+    runtime_dir: str = "./run"  # Shared session registry and worker sockets
+    transport: Literal["unix", "tcp"] = "unix"  # How workers reach each other; tcp for several nodes
+    host: str = "127.0.0.1"  # Address advertised to peers with the tcp transport
+    heartbeat_seconds: float = 2.0  # Workers missing three heartbeats are dropped
+    forward_timeout: float = 10.0  # Seconds to wait for the owning worker to accept a message
+
+class EventLogConfig(BaseModel):
+    capacity: int = 10000  # Events kept in memory; the oldest are overwritten
+    sample_rate: float = 1.0  # Fraction of successful events recorded
+    sample_rates: Dict[str, float] = {}  # Per tool or resource name, e.g. for high-QPS tools
+    slow_ms: Optional[float] = None  # Events at least this slow are always recorded
 
 class ServerConfig(BaseModel):
     name: str = "Flexible MCP Server"
     version: str = "0.1.0"
     tools: List[ToolConfig] = []
     resources: List[ResourceConfig] = []
+    knowledge_base: KnowledgeBaseConfig = Field(default_factory=KnowledgeBaseConfig)
+    tool_pool: ToolPoolConfig = Field(default_factory=ToolPoolConfig)
+    concurrency: ConcurrencyConfig = Field(default_factory=ConcurrencyConfig)
+    cluster: ClusterConfig = Field(default_factory=ClusterConfig)
+    event_log: EventLogConfig = Field(default_factory=EventLogConfig)
@@ -0,0 +1,150 @@
+import hashlib
+from types import CodeType
+from typing import Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+import jsonschema
+import mcp.types as types
+from cache import LRUCache
+from models import ServerConfig, ToolConfig
+from resources import CompiledResource, ResourceRouter, compile_resource
+
+class CompiledTool(NamedTuple):
+    """Code object of a configured tool, tagged with the digest of its source."""
+    digest: str
+    code: CodeType
+
+def compile_tool(tool: ToolConfig) -> CodeType:
+    """Compiles tool code into the code object of an async wrapper function."""
+    indented_code = "\n".join(f"    {line}" for line in tool.code.splitlines())
+    wrapper = f"async def __mcp_execute__():\n{indented_code}"
+    try:
+        module_code = compile(wrapper, f"<tool:{tool.name}>", "exec")
+    except SyntaxError as e:
+        raise ValueError(f"Tool {tool.name} failed to compile: {e}") from e
+    # The wrapper function is the only code constant of the module
+    return next(c for c in module_code.co_consts if isinstance(c, CodeType))
+
+def check_input_schema(tool: ToolConfig):
+    """Rejects an input schema that is not valid JSON Schema, before clients see it."""
+    try:
+        jsonschema.validators.validator_for(tool.input_schema).check_schema(tool.input_schema)
+    except jsonschema.SchemaError as e:
+        raise ValueError(f"Tool {tool.name} has an invalid input schema: {e.message}") from e
+
+class Registry:
+    """
+    Immutable index of the tools and resources of one config version.
+    Handlers read a registry reference once per request, so a config
+    update is installed by swapping that reference. Memoized results of
+    pure tools and rendered resources live here too, so a new version
+    starts with empty caches.
+    """
+    def __init__(
+        self,
+        version: int,
+        tools: Dict[str, ToolConfig],
+        compiled: Dict[str, CompiledTool],
+        resources: Dict[str, CompiledResource],
+        tool_list: Tuple[types.Tool, ...],
+        resource_list: Tuple[types.Resource, ...],
+        result_caches: Dict[str, LRUCache],
+        resource_templates: Tuple[types.ResourceTemplate, ...] = (),
+        resource_caches: Optional[Dict[str, LRUCache]] = None,
+    ):
+        self.version = version
+        self.tools = tools
+        self.compiled = compiled
+        self.resources = resources  # Keyed by URI (or URI template)
+        self.tool_list = tool_list
+        self.resource_list = resource_list
+        self.result_caches = result_caches
+        self.resource_templates = resource_templates
+        self.resource_caches = resource_caches or {}
+        self.resource_router = ResourceRouter(list(resources.values()))
+
+def build_registry(
+    config: ServerConfig,
+    base_tools: Sequence[types.Tool] = (),
+    previous: Optional[Registry] = None,
+    resource_providers: Mapping[str, str] = {},
+) -> Registry:
+    """
+    Builds the registry for a config. Tools whose name and source digest
+    are unchanged since the previous registry reuse its code objects, and
+    resource templates are likewise compiled once per source.
+    `resource_providers` maps provider names to their default templates.
+    """
+    previous_compiled = previous.compiled if previous else {}
+    tools: Dict[str, ToolConfig] = {}
+    compiled: Dict[str, CompiledTool] = {}
+    for tool in config.tools:
+        digest = hashlib.sha256(tool.code.encode("utf-8")).hexdigest()
+        cached = previous_compiled.get(tool.name)
+        if cached is None or cached.digest != digest:
+            cached = CompiledTool(digest, compile_tool(tool))
+        check_input_schema(tool)
+        tools[tool.name] = tool
+        compiled[tool.name] = cached
+
+    previous_resources = previous.resources if previous else {}
+    resources = {
+        r.uri: compile_resource(r, dict(resource_providers), previous_resources.get(r.uri))
+        for r in config.resources
+    }
+    resource_caches = {
+        r.uri: LRUCache(max_entries=256, max_bytes=1024 * 1024, sizeof=len, ttl=r.ttl)
+        for r in config.resources
+        if r.ttl
+    }
+
+    result_caches = {
+        t.name: LRUCache(
+            max_entries=t.cache.max_entries,
+            max_bytes=t.cache.max_bytes,
+            sizeof=len,
+            ttl=t.cache.ttl
+        )
+        for t in config.tools
+        if t.cache is not None and t.cache.pure
+    }
+
+    tool_list: List[types.Tool] = list(base_tools)
+    tool_list.extend(
+        types.Tool(
+            name=t.name,
+            description=t.description,
+            inputSchema=t.input_schema
+        )
+        for t in config.tools
+    )
+    resource_list = tuple(
+        types.Resource(
+            uri=r.config.uri,
+            name=r.config.name,
+            description=r.config.description,
+            mimeType=r.config.mime_type
+        )
+        for r in resources.values()
+        if not r.params
+    )
+    resource_templates = tuple(
+        types.ResourceTemplate(
+            uriTemplate=r.config.uri,
+            name=r.config.name,
+            description=r.config.description,
+            mimeType=r.config.mime_type
+        )
+        for r in resources.values()
+        if r.params
+    )
+
+    return Registry(
+        version=previous.version + 1 if previous else 1,
+        tools=tools,
+        compiled=compiled,
+        resources=resources,
+        tool_list=tuple(tool_list),
+        resource_list=resource_list,
+        result_caches=result_caches,
+        resource_templates=resource_templates,
+        resource_caches=resource_caches,
+    )
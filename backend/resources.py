@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import re
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import unquote
+import jinja2
+from models import ResourceConfig
+
+# Rendered output is handed out in pieces of about this many characters
+STREAM_CHUNK_CHARS = 64 * 1024
+
+_PARAM = re.compile(r"\{(\w+)\}")
+
+# Async rendering lets templates iterate over streamed provider data
+_environment = jinja2.Environment(
+    enable_async=True,
+    autoescape=False,
+    keep_trailing_newline=True,
+    undefined=jinja2.StrictUndefined
+)
+
+# Fetches the live data of a provider for one read: URI parameters -> `data`
+Provider = Callable[[Dict[str, str]], Awaitable[Any]]
+
+class CompiledResource(NamedTuple):
+    """A configured resource with its URI parameters and compiled template."""
+    config: ResourceConfig
+    params: Tuple[str, ...]
+    digest: str
+    template: Optional[jinja2.Template]
+
+def uri_params(uri: str) -> Tuple[str, ...]:
+    return tuple(_PARAM.findall(uri))
+
+def compile_template(source: str, name: str) -> jinja2.Template:
+    try:
+        return _environment.from_string(source)
+    except jinja2.TemplateSyntaxError as e:
+        raise ValueError(f"Resource {name} failed to compile: {e}") from e
+
+def compile_resource(
+    resource: ResourceConfig,
+    default_templates: Dict[str, str],
+    previous: Optional[CompiledResource] = None
+) -> CompiledResource:
+    """
+    Compiles the template of a resource, reusing the previous version's
+    template when its source is unchanged. Resources with a provider and
+    no content of their own render the provider's default template.
+    """
+    params = uri_params(resource.uri)
+    if resource.provider is not None and resource.provider not in default_templates:
+        raise ValueError(
+            f"Resource {resource.name} has an unknown provider: {resource.provider} "
+            f"(expected one of {', '.join(default_templates)})"
+        )
+    if not (resource.template or resource.provider or params):
+        return CompiledResource(resource, params, "", None)
+    source = resource.content or default_templates.get(resource.provider, "")
+    digest = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    if previous is not None and previous.digest == digest and previous.template is not None:
+        return CompiledResource(resource, params, digest, previous.template)
+    return CompiledResource(resource, params, digest, compile_template(source, resource.name))
+
+class ResourceRouter:
+    """
+    Resolves a URI to a resource. Fixed URIs are a dict lookup; URI
+    templates are compiled into one alternation regex, so a read costs a
+    single match however many templates are configured.
+    """
+    def __init__(self, resources: Sequence[CompiledResource]):
+        self._exact: Dict[str, CompiledResource] = {}
+        self._templates: List[CompiledResource] = []
+        alternatives = []
+        for resource in resources:
+            if not resource.params:
+                self._exact[resource.config.uri] = resource
+                continue
+            group = f"r{len(self._templates)}"
+            self._templates.append(resource)
+            alternatives.append(f"(?P<{group}>{self._pattern(resource.config.uri, group)})")
+        self._regex = re.compile("|".join(alternatives)) if alternatives else None
+
+    @staticmethod
+    def _pattern(uri: str, group: str) -> str:
+        pattern, position = "", 0
+        for match in _PARAM.finditer(uri):
+            pattern += re.escape(uri[position:match.start()]) + f"(?P<{group}_{match.group(1)}>[^/?#]+)"
+            position = match.end()
+        return pattern + re.escape(uri[position:])
+
+    def match(self, uri: str) -> Optional[Tuple[CompiledResource, Dict[str, str]]]:
+        resource = self._exact.get(uri)
+        if resource is not None:
+            return resource, {}
+        if self._regex is None:
+            return None
+        match = self._regex.fullmatch(uri)
+        if match is None:
+            return None
+        # The outer group of an alternative closes last, so it is the last group matched
+        group = match.lastgroup
+        resource = self._templates[int(group[1:])]
+        return resource, {name: unquote(match.group(f"{group}_{name}")) for name in resource.params}
+
+async def _rechunk(pieces: AsyncIterator[str], size: int = STREAM_CHUNK_CHARS) -> AsyncIterator[str]:
+    """Joins small rendered pieces and splits large ones into chunks of about `size` characters."""
+    buffer: List[str] = []
+    buffered = 0
+    async for piece in pieces:
+        while len(piece) > size:
+            if buffered:
+                yield "".join(buffer)
+                buffer, buffered = [], 0
+            yield piece[:size]
+            piece = piece[size:]
+            await asyncio.sleep(0)  # Let other requests run between large chunks
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield "".join(buffer)
+            buffer, buffered = [], 0
+    if buffered:
+        yield "".join(buffer)
+
+class ResourceRenderer:
+    """
+    Renders resource reads as a stream of text chunks. Dynamic content
+    comes from named providers; results of resources with a `ttl` are
+    served from the registry's per-resource cache until they expire.
+    """
+    def __init__(self, providers: Dict[str, Provider]):
+        self.providers = providers
+
+    async def stream(
+        self, registry, resource: CompiledResource, uri: str, params: Dict[str, str]
+    ) -> AsyncIterator[str]:
+        """Yields the content of a resolved read of `uri` in chunks."""
+        cache = registry.resource_caches.get(resource.config.uri)
+        if cache is not None:
+            cached = cache.get(uri)
+            if cached is not None:
+                for start in range(0, max(len(cached), 1), STREAM_CHUNK_CHARS):
+                    yield cached[start:start + STREAM_CHUNK_CHARS]
+                return
+        # Kept for the cache until the output outgrows it
+        kept: Optional[List[str]] = [] if cache is not None else None
+        kept_chars = 0
+        async for chunk in _rechunk(self._render(resource, uri, params)):
+            if kept is not None:
+                kept.append(chunk)
+                kept_chars += len(chunk)
+                if cache.max_bytes is not None and kept_chars > cache.max_bytes:
+                    kept = None
+            yield chunk
+        if kept is not None:
+            cache.put(uri, "".join(kept))
+
+    async def _render(self, resource: CompiledResource, uri: str, params: Dict[str, str]) -> AsyncIterator[str]:
+        if resource.template is None:
+            yield resource.config.content
+            return
+        data = None
+        if resource.config.provider is not None:
+            data = await self.providers[resource.config.provider](params)
+        async for piece in resource.template.generate_async(uri=uri, params=params, data=data):
+            yield piece
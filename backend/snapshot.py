@@ -0,0 +1,145 @@
+"""
+Streaming knowledge base snapshots.
+
+A snapshot is a sequence of frames after an 8-byte magic:
+
+    frame   = kind (1 byte) + payload length (uint32, little-endian) + payload
+    H       = header, JSON: format, collection, dimension, compression, ...
+    B       = one batch of rows, compressed as a whole when compression is on:
+              JSON length (uint32) + JSON {ids, documents, metadatas}
+              + the embeddings as one raw float32 little-endian matrix
+    E       = end, JSON {"rows": n}; a stream without it is truncated
+
+Batches are columnar, so the embeddings travel as a single buffer that
+is loaded with np.frombuffer, never re-embedded. Writers and readers
+hold one batch at a time, whatever the size of the collection.
+"""
+import json
+import struct
+import zlib
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+MAGIC = b"KBSNAP1\n"
+FORMAT_VERSION = 1
+COMPRESSIONS = ("none", "zlib")
+
+_FRAME = struct.Struct("<cI")
+_LENGTH = struct.Struct("<I")
+
+class SnapshotError(ValueError):
+    """Raised for a malformed, truncated or incompatible snapshot."""
+
+class SnapshotBatch(NamedTuple):
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[Optional[dict]]
+    embeddings: np.ndarray
+
+def _frame(kind: bytes, payload: bytes) -> bytes:
+    return _FRAME.pack(kind, len(payload)) + payload
+
+def encode_header(header: Dict[str, Any]) -> bytes:
+    if header.get("compression", "none") not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression: {header['compression']} (expected one of {', '.join(COMPRESSIONS)})")
+    return MAGIC + _frame(b"H", json.dumps({"format": FORMAT_VERSION, **header}).encode("utf-8"))
+
+def encode_batch(
+    ids: List[str],
+    documents: List[str],
+    metadatas: List[Optional[dict]],
+    embeddings: np.ndarray,
+    compression: str = "none"
+) -> bytes:
+    columns = json.dumps({"ids": ids, "documents": documents, "metadatas": metadatas}).encode("utf-8")
+    matrix = np.ascontiguousarray(embeddings, dtype="<f4")
+    payload = _LENGTH.pack(len(columns)) + columns + matrix.tobytes()
+    if compression == "zlib":
+        payload = zlib.compress(payload, 6)
+    return _frame(b"B", payload)
+
+def encode_end(rows: int) -> bytes:
+    return _frame(b"E", json.dumps({"rows": rows}).encode("utf-8"))
+
+def decode_batch(payload: bytes, header: Dict[str, Any]) -> SnapshotBatch:
+    """Decodes the payload of a B frame (CPU-bound; run it off the event loop)."""
+    try:
+        if header["compression"] == "zlib":
+            payload = zlib.decompress(payload)
+        (length,) = _LENGTH.unpack_from(payload)
+        columns = json.loads(payload[_LENGTH.size:_LENGTH.size + length])
+        embeddings = np.frombuffer(payload, dtype="<f4", offset=_LENGTH.size + length)
+    except (zlib.error, struct.error, ValueError) as e:
+        raise SnapshotError(f"Corrupt snapshot batch: {e}") from e
+    rows = len(columns["ids"])
+    if embeddings.size != rows * header["dimension"] or len(columns["documents"]) != rows:
+        raise SnapshotError("Corrupt snapshot batch: column lengths do not match")
+    return SnapshotBatch(
+        columns["ids"],
+        columns["documents"],
+        columns["metadatas"] or [None] * rows,
+        embeddings.reshape(rows, header["dimension"]).astype(np.float32)
+    )
+
+class SnapshotReader:
+    """
+    Splits a snapshot arriving in arbitrary chunks into frames. feed()
+    returns the complete frames so far: ("header", dict), ("batch", raw
+    payload for decode_batch) and ("end", dict). close() raises if the
+    stream stopped before its end frame.
+    """
+    def __init__(self):
+        self._buffer = bytearray()
+        self._magic = False
+        self.header: Optional[Dict[str, Any]] = None
+        self.ended = False
+
+    def feed(self, chunk: bytes) -> List[Tuple[str, Any]]:
+        self._buffer += chunk
+        frames: List[Tuple[str, Any]] = []
+        if not self._magic:
+            if len(self._buffer) < len(MAGIC):
+                return frames
+            if bytes(self._buffer[:len(MAGIC)]) != MAGIC:
+                raise SnapshotError("Not a knowledge base snapshot")
+            del self._buffer[:len(MAGIC)]
+            self._magic = True
+        for kind, payload in self._frames():
+            if self.ended:
+                raise SnapshotError("Data after the end of the snapshot")
+            if kind == b"H":
+                self.header = self._header(payload)
+                frames.append(("header", self.header))
+            elif self.header is None:
+                raise SnapshotError("Snapshot does not start with a header")
+            elif kind == b"B":
+                frames.append(("batch", payload))
+            elif kind == b"E":
+                self.ended = True
+                frames.append(("end", json.loads(payload)))
+            else:
+                raise SnapshotError(f"Unknown snapshot frame: {kind!r}")
+        return frames
+
+    def _frames(self) -> Iterator[Tuple[bytes, bytes]]:
+        while len(self._buffer) >= _FRAME.size:
+            kind, length = _FRAME.unpack_from(self._buffer)
+            end = _FRAME.size + length
+            if len(self._buffer) < end:
+                return
+            payload = bytes(self._buffer[_FRAME.size:end])
+            del self._buffer[:end]
+            yield kind, payload
+
+    @staticmethod
+    def _header(payload: bytes) -> Dict[str, Any]:
+        header = json.loads(payload)
+        if header.get("format") != FORMAT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot format: {header.get('format')}")
+        if header.get("compression") not in COMPRESSIONS or not isinstance(header.get("dimension"), int):
+            raise SnapshotError("Snapshot header is missing its compression or dimension")
+        return header
+
+    def close(self):
+        if not self.ended:
+            raise SnapshotError("Snapshot is truncated (no end frame)")
@@ -0,0 +1,64 @@
+"""
+Shared fixtures. The backend modules import each other by their flat
+names, so the backend directory is put on sys.path; run the suite from
+backend/ with `python -m pytest`. Embeddings come from the offline
+hashing stand-in used by the benchmarks, so no model is downloaded.
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from bench.embeddings import HashingEmbeddingFunction
+from config_manager import ConfigManager
+from mcp_core import MCPCore
+from metrics import MetricsRegistry
+from models import KnowledgeBaseConfig
+from vector_service import VectorService
+
+@pytest.fixture
+def make_service(tmp_path):
+    """
+    Builds VectorService instances over `tmp_path` (or a subdirectory of
+    it) with background loops off; they are closed after the test.
+    """
+    services = []
+
+    def make(subdir: str = "db", embedding_fn=None, **options) -> VectorService:
+        options.setdefault("backend", "numpy")
+        options.setdefault("stats_refresh_seconds", 0)
+        options.setdefault("compaction", {"interval_seconds": 0})
+        service = VectorService(
+            str(tmp_path / subdir),
+            KnowledgeBaseConfig(**options),
+            embedding_fn or HashingEmbeddingFunction(),
+            MetricsRegistry()
+        )
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        service.close()
+
+@pytest.fixture
+def make_core(tmp_path, make_service):
+    """
+    Builds an MCPCore from a YAML config written to `tmp_path`, with the
+    file watcher off and a `make_service` knowledge base; its tool pool
+    is shut down after the test.
+    """
+    cores = []
+
+    def make(yaml_content: str) -> MCPCore:
+        path = tmp_path / "config.yaml"
+        path.write_text(yaml_content)
+        core = MCPCore(ConfigManager(str(path), watch_interval=0), make_service(), MetricsRegistry())
+        cores.append(core)
+        return core
+
+    yield make
+    for core in cores:
+        asyncio.run(core.close())
@@ -0,0 +1,126 @@
+import asyncio
+import mcp.types as types
+import pytest
+from admission import AdmissionRejected, Limiter
+from models import ConcurrencyLimitConfig
+
+def limiter(**limits) -> Limiter:
+    return Limiter("test", ConcurrencyLimitConfig(**limits))
+
+def test_queued_calls_are_admitted_in_arrival_order():
+    gate = limiter(max_concurrent=1, max_queue=5, queue_timeout=None)
+    admitted = []
+
+    async def call(i):
+        await gate.acquire()
+        admitted.append(i)
+        await asyncio.sleep(0)
+        gate.release()
+
+    async def scenario():
+        await gate.acquire()
+        calls = []
+        for i in range(5):
+            calls.append(asyncio.ensure_future(call(i)))
+            await asyncio.sleep(0)  # Queue them one after the other
+        assert gate.queued == 5 and admitted == []
+        gate.release()
+        await asyncio.gather(*calls)
+        assert admitted == [0, 1, 2, 3, 4]
+        assert gate.active == 0 and gate.queued == 0
+
+    asyncio.run(scenario())
+
+def test_full_queue_is_rejected_at_once():
+    gate = limiter(max_concurrent=1, max_queue=1, queue_timeout=5)
+
+    async def scenario():
+        await gate.acquire()
+        waiting = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await asyncio.wait_for(gate.acquire(), 0.1)
+        assert rejected.value.reason == "queue_full"
+        gate.release()
+        await waiting
+        assert gate.active == 1
+
+    asyncio.run(scenario())
+
+def test_queued_call_times_out():
+    gate = limiter(max_concurrent=1, max_queue=1, queue_timeout=0.05)
+
+    async def scenario():
+        await gate.acquire()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await gate.acquire()
+        assert rejected.value.reason == "queue_timeout"
+        assert gate.queued == 0 and gate.active == 1
+
+    asyncio.run(scenario())
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    gate = limiter(max_concurrent=1, max_queue=2, queue_timeout=None)
+
+    async def scenario():
+        await gate.acquire()
+        first = asyncio.ensure_future(gate.acquire())
+        second = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        gate.release()
+        await second
+        gate.release()
+        assert gate.active == 0 and gate.queued == 0
+
+    asyncio.run(scenario())
+
+def test_raised_limit_admits_queued_calls():
+    gate = limiter(max_concurrent=1, max_queue=2, queue_timeout=None)
+
+    async def scenario():
+        await gate.acquire()
+        waiting = [asyncio.ensure_future(gate.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        gate.configure(ConcurrencyLimitConfig(max_concurrent=3, max_queue=2, queue_timeout=None))
+        await asyncio.gather(*waiting)
+        assert gate.active == 3
+
+    asyncio.run(scenario())
+
+CONFIG = """
+name: test
+tools:
+  - name: slow
+    description: Sleeps briefly
+    input_schema: {type: object, properties: {}}
+    code: |
+      await asyncio.sleep(0.2)
+      return "done"
+concurrency:
+  tools:
+    slow: {max_concurrent: 1, max_queue: 0}
+"""
+
+def call_tool(core, name, arguments=None):
+    request = types.CallToolRequest(
+        method="tools/call", params=types.CallToolRequestParams(name=name, arguments=arguments or {})
+    )
+    return core.server.request_handlers[types.CallToolRequest](request)
+
+def test_shed_call_gets_an_error_result_at_once(make_core):
+    core = make_core(CONFIG)
+
+    async def scenario():
+        running = asyncio.ensure_future(call_tool(core, "slow"))
+        await asyncio.sleep(0.05)
+        shed = await asyncio.wait_for(call_tool(core, "slow"), 0.1)
+        assert shed.root.isError
+        assert "Concurrency limit for slow reached" in shed.root.content[0].text
+        done = await running
+        assert not done.root.isError and done.root.content[0].text == "done"
+        stats = core.get_metrics()["admission"]["slow"]
+        assert stats["rejected"] == 1 and stats["active"] == 0
+
+    asyncio.run(scenario())
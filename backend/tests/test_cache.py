@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from cache import SingleFlight
+
+def test_concurrent_calls_share_one_computation():
+    flights = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def scenario():
+        results = await asyncio.gather(*(flights.do("key", compute) for _ in range(5)))
+        assert results == ["result"] * 5
+        assert len(calls) == 1 and flights.coalesced == 4
+        assert len(flights) == 0
+
+    asyncio.run(scenario())
+
+def test_cancelled_waiter_only_detaches():
+    flights = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "result"
+
+    async def scenario():
+        first = asyncio.ensure_future(flights.do("key", compute))
+        second = asyncio.ensure_future(flights.do("key", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "result"
+        assert first.cancelled()
+
+    asyncio.run(scenario())
+
+def test_call_after_last_waiter_cancels_starts_afresh():
+    flights = SingleFlight()
+    started = []
+
+    async def compute():
+        started.append(1)
+        await asyncio.sleep(0.02)
+        return "result"
+
+    async def scenario():
+        only = asyncio.ensure_future(flights.do("key", compute))
+        await asyncio.sleep(0)
+        only.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await only
+        # The cancelled computation has not finished unwinding yet
+        assert await flights.do("key", compute) == "result"
+        assert len(started) == 2
+
+    asyncio.run(scenario())
+
+def test_exceptions_reach_every_caller():
+    flights = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0)
+        raise RuntimeError("boom")
+
+    async def scenario():
+        results = await asyncio.gather(*(flights.do("key", compute) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    asyncio.run(scenario())
@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from chunking import iter_chunks
+
+TEXT = " ".join(f"word{i}" for i in range(500))
+
+async def read_document(service, doc_id, collection=None):
+    parts = []
+    async for text, metadata in service.iter_document(doc_id, collection):
+        parts.append(text)
+    return "".join(parts), metadata if parts else None
+
+@pytest.mark.parametrize("unit", ["chars", "tokens"])
+def test_chunks_carry_their_offsets(unit):
+    chunks = list(iter_chunks(TEXT, 50, 10, unit))
+    assert len(chunks) > 1
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+    for chunk in chunks:
+        assert TEXT[chunk.start:chunk.end] == chunk.text
+    assert chunks[0].start == 0 and chunks[-1].end == len(TEXT)
+    # Consecutive windows overlap (or touch), so nothing is dropped
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.start <= previous.end
+
+def test_char_chunks_overlap_by_the_configured_amount():
+    chunks = list(iter_chunks("abcdefghij", 4, 1))
+    assert [chunk.text for chunk in chunks] == ["abcd", "defg", "ghij"]
+
+def test_small_text_is_a_single_chunk():
+    assert list(iter_chunks("short", 100, 10)) == [(0, 0, 5, "short")]
+
+@pytest.mark.parametrize("size, overlap", [(0, 0), (10, 10), (10, -1)])
+def test_invalid_windows_are_rejected(size, overlap):
+    with pytest.raises(ValueError):
+        iter_chunks(TEXT, size, overlap)
+
+def test_chunked_document_is_reassembled_exactly(make_service):
+    service = make_service(chunking={"size": 120, "overlap": 30})
+    text = "\n".join(f"line {i}: {'lorem ipsum ' * (i % 5)}" for i in range(60))
+
+    async def scenario():
+        doc_id = await service.add_document(text, {"source": "test"})
+        assert service.get_stats()["count"] > 1  # Stored as chunks
+        reassembled, metadata = await read_document(service, doc_id)
+        assert reassembled == text
+        assert metadata == {"source": "test"}
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("overlap", [5, 0])
+def test_token_chunks_are_reassembled(make_service, overlap):
+    service = make_service(chunking={"unit": "tokens", "size": 20, "overlap": overlap})
+    tokens = [f"token{i}" for i in range(100)]
+    text = "  ".join(tokens)
+
+    async def scenario():
+        doc_id = await service.add_document(text)
+        reassembled, _ = await read_document(service, doc_id)
+        if overlap:
+            assert reassembled == text
+        else:
+            # Whitespace between windows that do not overlap comes back as one space
+            windows = ["  ".join(tokens[i:i + 20]) for i in range(0, len(tokens), 20)]
+            assert reassembled == " ".join(windows)
+
+    asyncio.run(scenario())
+
+def test_small_document_is_stored_whole(make_service):
+    service = make_service(chunking={"size": 1000, "overlap": 100})
+
+    async def scenario():
+        doc_id = await service.add_document("a short note", {"tag": "x"})
+        assert await read_document(service, doc_id) == ("a short note", {"tag": "x"})
+        assert await read_document(service, "missing") == ("", None)
+
+    asyncio.run(scenario())
@@ -0,0 +1,107 @@
+import asyncio
+import time
+import pytest
+from cluster import ClusterNode, SessionDirectory
+from config_manager import ConfigManager
+from metrics import MetricsRegistry
+from models import ClusterConfig
+
+SESSION = "0123456789abcdef0123456789abcdef"
+
+def test_directory_tracks_owners_and_drops_stale_workers(tmp_path):
+    directory = SessionDirectory(str(tmp_path / "sessions.db"))
+    assert directory.heartbeat("a", "tcp:127.0.0.1:1", 60) == []
+    assert directory.heartbeat("b", "tcp:127.0.0.1:2", 60) == [("a", "tcp:127.0.0.1:1")]
+    directory.add_session(SESSION, "a")
+    assert directory.owner(SESSION) == "tcp:127.0.0.1:1"
+    assert directory.owner("f" * 32) is None
+    # A worker that stops beating is dropped with its sessions
+    time.sleep(0.05)
+    assert directory.heartbeat("b", "tcp:127.0.0.1:2", 0.01) == []
+    assert directory.owner(SESSION) is None
+    directory.add_session(SESSION, "b")
+    directory.remove_worker("b")
+    assert directory.owner(SESSION) is None
+    directory.close()
+
+def make_node(tmp_path, worker_id: str, posts: list) -> ClusterNode:
+    async def post_message(scope, receive, send):
+        body = (await receive())["body"]
+        posts.append((worker_id, scope["query_string"], body))
+        await send({"type": "http.response.start", "status": 202, "headers": [(b"content-type", b"text/plain")]})
+        await send({"type": "http.response.body", "body": b"Accepted by " + worker_id.encode()})
+
+    config = ClusterConfig(enabled=True, runtime_dir=str(tmp_path), transport="tcp", heartbeat_seconds=60)
+    node = ClusterNode(config, post_message, ConfigManager(str(tmp_path / "none.yaml")), MetricsRegistry(), dict)
+    node.worker_id = worker_id  # Both nodes live in this process
+    return node
+
+async def post(node: ClusterNode, body: bytes = b"{}"):
+    scope = {"type": "http", "path": "/mcp/messages/", "query_string": f"session_id={SESSION}".encode(), "headers": []}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    await node.handle_post_message(scope, receive, send)
+    return sent[0]["status"], sent[1]["body"]
+
+@pytest.fixture
+def nodes(tmp_path):
+    """Two started nodes sharing a directory; `owner` holds the session."""
+    posts = []
+    owner, other = make_node(tmp_path, "owner", posts), make_node(tmp_path, "other", posts)
+
+    def run(scenario):
+        async def main():
+            await owner.start()
+            await other.start()
+            owner._local_sessions.add(SESSION)
+            await asyncio.to_thread(owner._directory.add_session, SESSION, owner.worker_id)
+            try:
+                await scenario(owner, other, posts)
+            finally:
+                await other.stop()
+                await owner.stop()
+        asyncio.run(main())
+
+    return run
+
+def test_post_is_forwarded_to_the_owner(nodes):
+    async def scenario(owner, other, posts):
+        assert await post(other, b'{"n": 1}') == (202, b"Accepted by owner")
+        assert await post(owner, b'{"n": 2}') == (202, b"Accepted by owner")
+        assert [(worker, body) for worker, _, body in posts] == [("owner", b'{"n": 1}'), ("owner", b'{"n": 2}')]
+        assert other._forwards.value("ok") == 1
+        assert len(other._idle_connections[owner.address]) == 1  # Pooled for the next POST
+
+    nodes(scenario)
+
+def test_stale_pooled_connection_is_retried_on_a_fresh_one(nodes):
+    async def scenario(owner, other, posts):
+        await post(other)
+        # The owner dropped the idle connection, as after a restart
+        for _, writer in other._idle_connections[owner.address]:
+            writer.transport.abort()
+        await asyncio.sleep(0)
+        assert await post(other) == (202, b"Accepted by owner")
+        assert other._owners.get(SESSION) == owner.address
+        assert other._forwards.value("error") == 0
+
+    nodes(scenario)
+
+def test_unreachable_owner_is_forgotten(nodes):
+    async def scenario(owner, other, posts):
+        await post(other)
+        for _, writer in other._idle_connections[owner.address]:
+            writer.transport.abort()
+        owner._server.close()
+        await owner._server.wait_closed()
+        status, body = await post(other)
+        assert (status, body) == (502, b"Session owner unreachable")
+        assert other._owners.get(SESSION) is None
+
+    nodes(scenario)
@@ -0,0 +1,30 @@
+import asyncio
+import pytest
+
+def test_collections_deduplicate_independently(make_service):
+    service = make_service(collections={"other": {}})
+
+    async def scenario():
+        await service.add_documents(["alpha"])
+        result = await service.add_documents(["alpha"], collection="other")
+        assert result["added"] == 1
+        assert await service.query("alpha", 1, collections="other") == ["alpha"]
+
+    asyncio.run(scenario())
+
+def test_search_fans_out_across_collections(make_service):
+    service = make_service(collections={"support": {}, "billing": {}})
+
+    async def scenario():
+        await service.add_documents(["reset a password from the login page"], collection="support")
+        await service.add_documents(["refunds for a duplicate invoice"], collection="billing")
+        assert await service.query("duplicate invoice refunds", 1, collections="support") == [
+            "reset a password from the login page"
+        ]
+        assert await service.query("duplicate invoice refunds", 1, collections="*") == ["refunds for a duplicate invoice"]
+        both = await service.query("password invoice", 5, collections=["support", "billing"])
+        assert sorted(both) == ["refunds for a duplicate invoice", "reset a password from the login page"]
+        with pytest.raises(ValueError):
+            await service.query("anything", collections="missing")
+
+    asyncio.run(scenario())
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import pytest
+from config_manager import ConfigManager
+
+INITIAL = 'name: "test"\nversion: "1"\n'
+
+@pytest.fixture
+def manager(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text(INITIAL)
+    return ConfigManager(str(path), watch_interval=0)
+
+def edit_file(manager, content):
+    with open(manager.config_path, "w") as f:
+        f.write(content)
+    # Make sure the change is visible even within the file system's timestamp granularity
+    stat = os.stat(manager.config_path)
+    os.utime(manager.config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+def test_update_installs_every_listener_at_once(manager):
+    installed = []
+    manager.add_listener(lambda config: lambda: installed.append(("a", config.version)))
+    manager.add_listener(lambda config: None)  # Nothing to install
+    manager.add_listener(lambda config: lambda: installed.append(("b", config.version)))
+
+    config = asyncio.run(manager.update_from_yaml('name: "test"\nversion: "2"\n'))
+    assert config.version == "2" and manager.config is config
+    assert manager.version == 2
+    assert installed == [("a", "2"), ("b", "2")]
+    with open(manager.config_path) as f:
+        assert f.read() == 'name: "test"\nversion: "2"\n'
+
+def test_failing_listener_rolls_the_update_back(manager):
+    installed = []
+    manager.add_listener(lambda config: lambda: installed.append(config.version))
+
+    def reject(config):
+        if config.version == "bad":
+            raise ValueError("listener refused")
+        return None
+
+    manager.add_listener(reject)
+    before = manager.snapshot
+    with pytest.raises(ValueError, match="listener refused"):
+        asyncio.run(manager.update_from_yaml('name: "test"\nversion: "bad"\n'))
+    # Nothing was installed or written, not even by the listener that prepared fine
+    assert manager.snapshot is before
+    assert installed == []
+    with open(manager.config_path) as f:
+        assert f.read() == INITIAL
+
+def test_invalid_yaml_is_rejected(manager):
+    with pytest.raises(Exception):
+        asyncio.run(manager.update_from_yaml("tools: 3\n"))
+    assert manager.version == 1 and manager.config.name == "test"
+
+def test_reload_keeps_the_config_when_the_file_is_invalid(manager):
+    async def scenario():
+        edit_file(manager, "tools: [1, 2\n")
+        assert await manager.reload() is False
+        assert manager.last_error is not None
+        assert manager.config.version == "1"
+        # A later valid edit is installed and clears the error
+        edit_file(manager, 'name: "test"\nversion: "3"\n')
+        assert await manager.reload() is True
+        assert manager.config.version == "3" and manager.version == 2
+        assert manager.last_error is None
+        # Unchanged file: nothing to do
+        assert await manager.reload() is False
+
+    asyncio.run(scenario())
+
+def test_reload_rolls_back_on_a_failing_listener(manager):
+    def reject(config):
+        raise RuntimeError("cannot apply")
+
+    manager.add_listener(reject)
+
+    async def scenario():
+        edit_file(manager, 'name: "test"\nversion: "4"\n')
+        assert await manager.reload() is False
+        assert "cannot apply" in manager.last_error
+        assert manager.config.version == "1" and manager.version == 1
+
+    asyncio.run(scenario())
+
+def test_restart_only_settings_are_reported(manager):
+    async def scenario():
+        await manager.update_from_yaml('name: "test"\nknowledge_base:\n  max_workers: 9\n  batch_size: 10\n')
+        assert manager.restart_pending == ["knowledge_base.max_workers"]
+        await manager.update_from_yaml(INITIAL)
+        assert manager.restart_pending == []
+
+    asyncio.run(scenario())
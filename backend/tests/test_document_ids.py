@@ -0,0 +1,24 @@
+import asyncio
+import pytest
+from vector_service import document_id
+
+BACKENDS = ["numpy", "chroma"]
+
+def test_document_id_is_content_addressed():
+    assert document_id("Hello   world") == document_id("Hello world")
+    assert document_id("Hello world") != document_id("Hello world!")
+    assert len(document_id("x")) == 32
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_known_documents_are_skipped(make_service, backend):
+    service = make_service(backend=backend)
+
+    async def scenario():
+        first = await service.add_documents(["alpha", "beta", "alpha"])
+        assert (first["added"], first["skipped"]) == (2, 1)
+        assert first["ids"] == [document_id("alpha"), document_id("beta")]
+        again = await service.add_documents(["beta", "gamma"])
+        assert (again["added"], again["skipped"]) == (1, 1)
+        assert service.get_stats()["count"] == 3
+
+    asyncio.run(scenario())
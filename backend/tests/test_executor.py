@@ -0,0 +1,106 @@
+import asyncio
+import os
+import threading
+import time
+import httpx
+import pytest
+from bench.embeddings import HashingEmbeddingFunction
+from bench.loop_latency import percentile
+from vector_service import VectorServiceOverloaded
+
+class SlowEmbedding(HashingEmbeddingFunction):
+    """Blocks for `delay` seconds per call, like model inference would."""
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def __call__(self, input):
+        time.sleep(self.delay)
+        return super().__call__(input)
+
+def test_full_queue_is_rejected(make_service):
+    service = make_service(max_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        await service.add_documents(["a note"])
+        running = [asyncio.ensure_future(service._run(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(VectorServiceOverloaded, match="overloaded"):
+            await service._run(time.sleep, 0)
+        with pytest.raises(VectorServiceOverloaded):
+            await service.query("anything")
+        release.set()
+        await asyncio.gather(*running)
+        # Slots are given back once the calls finish
+        assert service._pending == 0
+        assert await service._run(lambda: "done") == "done"
+
+    asyncio.run(scenario())
+
+def test_cancelled_caller_keeps_its_slot_until_the_call_ends(make_service):
+    service = make_service(max_workers=1, max_queue=0)
+    release = threading.Event()
+
+    async def scenario():
+        call = asyncio.ensure_future(service._run(release.wait, 5))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        await asyncio.sleep(0)
+        # The thread is still busy, so the executor is still full
+        with pytest.raises(VectorServiceOverloaded):
+            await service._run(time.sleep, 0)
+        release.set()
+        while service._pending:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, make_service):
+    """The FastAPI app with its knowledge base swapped for one whose embeddings block for 50 ms."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    monkeypatch.setenv("MCP_CONFIG", os.path.join(backend_dir, "config.yaml"))
+    monkeypatch.setenv("MCP_DB_PATH", str(tmp_path / "unused"))
+    import main
+    service = make_service(embedding_fn=SlowEmbedding(0.05), max_workers=4, max_queue=64)
+    monkeypatch.setattr(main, "vector_service", service)
+    monkeypatch.setattr(main.mcp_core, "vector_service", service)
+    return main
+
+def test_liveness_stays_fast_under_concurrent_searches(app):
+    concurrency = 16
+    searches = 0
+
+    async def scenario():
+        nonlocal searches
+        await app.vector_service.add_documents([f"document {i} about topic {i % 7}" for i in range(50)])
+        stop = asyncio.Event()
+
+        async def client(i: int):
+            nonlocal searches
+            while not stop.is_set():
+                # Distinct queries, so the result cache and coalescing do not absorb them
+                await app.mcp_core._call_tool("kb_search", {"query": f"topic {i} {searches}", "n_results": 3})
+                searches += 1
+
+        latencies = []
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            clients = [asyncio.ensure_future(client(i)) for i in range(concurrency)]
+            deadline = time.perf_counter() + 1.5
+            while time.perf_counter() < deadline:
+                # Timed from when the probe is due, so time spent waiting for the loop counts
+                started = time.perf_counter()
+                await asyncio.sleep(0.005)
+                response = await http.get("/health/live")
+                latencies.append((time.perf_counter() - started - 0.005) * 1000)
+                assert response.status_code == 200
+            stop.set()
+            await asyncio.gather(*clients)
+        return latencies
+
+    latencies = asyncio.run(scenario())
+    assert searches >= concurrency and len(latencies) >= 50
+    # Run on the loop, every search would hold up the probe for its 50 ms embedding
+    assert percentile(latencies, 99) < 25
@@ -0,0 +1,49 @@
+import pytest
+from lexical_index import BM25Index, tokenize
+
+DOCUMENTS = {
+    "a": "ERR-1042 raised by the billing worker",
+    "b": "billing invoices are sent monthly",
+    "c": "the worker restarts after ERR-1042",
+    "d": "billing worker billing queue",
+    "e": "monthly report of worker restarts",
+}
+
+def build(path, ids):
+    index = BM25Index(str(path))
+    index.add_many(ids, [DOCUMENTS[i] for i in ids], [{"doc": i} for i in ids])
+    return index
+
+def test_compound_identifiers_yield_their_parts():
+    assert tokenize("See ERR-1042.") == ["see", "err-1042", "err", "1042"]
+
+def test_scores_after_deletes_match_a_fresh_index(tmp_path):
+    live = build(tmp_path / "live", list(DOCUMENTS))
+    live.delete(["b", "d"])
+    fresh = build(tmp_path / "fresh", ["a", "c", "e"])
+    for query in ("billing worker", "err-1042", "monthly restarts"):
+        assert live.search(query, 5) == pytest.approx(fresh.search(query, 5))
+    # Compaction drops the tombstones without changing any score
+    expected = live.search("billing worker", 5)
+    live.compact()
+    assert live.search("billing worker", 5) == pytest.approx(expected)
+
+def test_index_reloads_from_snapshot_and_log(tmp_path):
+    index = build(tmp_path / "index", list(DOCUMENTS))
+    index.compact()
+    index.delete(["a"])
+    index.add_many(["f"], ["late ERR-1042 report"], [None])
+    reopened = BM25Index(str(tmp_path / "index"))
+    assert len(reopened) == len(DOCUMENTS)
+    assert reopened.search("err-1042", 5) == pytest.approx(index.search("err-1042", 5))
+    assert [doc_id for doc_id, _ in reopened.search("worker", 5, where={"doc": "c"})] == ["c"]
+
+def test_writes_of_another_process_are_picked_up(tmp_path):
+    # Two instances over the same files stand in for two cluster workers
+    first = build(tmp_path / "index", ["a", "b"])
+    second = BM25Index(str(tmp_path / "index"))
+    first.add_many(["c"], [DOCUMENTS["c"]], [None])
+    assert "c" in [doc_id for doc_id, _ in second.search("restarts", 5)]
+    second.delete(["c"])
+    second.compact()
+    assert "c" not in [doc_id for doc_id, _ in first.search("restarts", 5)]
@@ -0,0 +1,100 @@
+import asyncio
+import time
+import pytest
+
+BACKENDS = ["numpy", "chroma"]
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_delete_removes_every_chunk(make_service, backend):
+    service = make_service(backend=backend, chunking={"size": 100, "overlap": 20})
+    long_text = " ".join(f"sentence {i} about rivers" for i in range(40))
+
+    async def scenario():
+        parent = await service.add_document(long_text)
+        await service.add_document("a note about mountains")
+        assert service.get_stats()["count"] > 2
+        removed = await service.delete_documents([parent])
+        assert removed > 1  # The chunks, counted as stored rows
+        assert service.get_stats()["count"] == 1
+        assert await service.query("rivers", 5) == ["a note about mountains"]
+        assert await service.delete_documents([parent]) == 0
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_expired_documents_are_swept(make_service, backend):
+    service = make_service(backend=backend)
+
+    async def scenario():
+        await service.add_documents(["short lived"], ttl=0.05)
+        await service.add_documents(["long lived"], ttl=3600)
+        await service.add_documents(["forever"])
+        assert await service.expire_documents() == 0
+        time.sleep(0.1)
+        result = await service.compact()
+        assert result["expired"] == 1
+        assert sorted(await service.query("lived forever", 5)) == ["forever", "long lived"]
+
+    asyncio.run(scenario())
+
+def test_collection_default_ttl_applies(make_service):
+    service = make_service(collections={"scratch": {"ttl_seconds": 0.05}})
+
+    async def scenario():
+        await service.add_documents(["temporary"], collection="scratch")
+        await service.add_documents(["kept"], collection="scratch", ttl=3600)
+        time.sleep(0.1)
+        assert await service.expire_documents("scratch") == 1
+        assert await service.query("temporary kept", 5, collections="scratch") == ["kept"]
+
+    asyncio.run(scenario())
+
+@pytest.mark.parametrize("storage", ["float32", "int8"])
+def test_compaction_reclaims_deleted_rows(make_service, storage):
+    options = {"collections": {"knowledge_base": {"storage": storage}}}
+    service = make_service(**options)
+    documents = [f"document {i} on topic {i % 9}" for i in range(300)]
+
+    async def scenario():
+        ids = (await service.add_documents(documents))["ids"]
+        await service.delete_documents(ids[:150])
+        assert service.backend.deleted_rows == 150
+        # Straight from the store: compaction does not invalidate cached results
+        embedding = service.embedding_fn(["topic 4"])[0]
+        expected = service.backend.query(embedding, 10)
+        result = await service.compact()
+        assert result["rows_reclaimed"] == 150 and result["bytes_freed"] > 0
+        assert service.backend.deleted_rows == 0
+        after = service.backend.query(embedding, 10)
+        # Many rows tie on score, so their order may change with their positions
+        assert [round(d, 5) for d in after.distances] == [round(d, 5) for d in expected.distances]
+        assert set(after.ids) <= set(ids[150:])
+        # Below min_deleted_fraction a background round leaves the store alone
+        await service.delete_documents(ids[150:160])
+        assert (await service.compact(force=False))["rows_reclaimed"] == 0
+
+    asyncio.run(scenario())
+    service.close()
+    reopened = make_service(**options)
+
+    async def after_reopen():
+        await reopened.initialize()
+        assert reopened.get_stats()["count"] == 140
+        assert reopened.backend.deleted_rows == 10
+
+    asyncio.run(after_reopen())
+
+def test_rows_written_during_compaction_survive(make_service):
+    service = make_service()
+    documents = [f"row {i}" for i in range(200)]
+
+    async def scenario():
+        ids = (await service.add_documents(documents))["ids"]
+        await service.delete_documents(ids[:100])
+        compaction = asyncio.ensure_future(service.compact())
+        added = await service.add_documents([f"late row {i}" for i in range(20)])
+        await compaction
+        assert added["added"] == 20
+        assert service.backend.count() == 120
+
+    asyncio.run(scenario())
@@ -0,0 +1,119 @@
+import asyncio
+import numpy as np
+import pytest
+from snapshot import MAGIC, SnapshotError, SnapshotReader, decode_batch, encode_batch, encode_end, encode_header
+
+def build_snapshot(compression="zlib", rows=5, dimension=4):
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((rows, dimension)).astype(np.float32)
+    ids = [f"id{i}" for i in range(rows)]
+    documents = [f"doc {i}" for i in range(rows)]
+    metadatas = [{"i": i} if i % 2 else None for i in range(rows)]
+    data = (
+        encode_header({"collection": "c", "dimension": dimension, "compression": compression})
+        + encode_batch(ids, documents, metadatas, embeddings, compression)
+        + encode_end(rows)
+    )
+    return data, ids, documents, metadatas, embeddings
+
+def read_all(data, chunk_size):
+    reader = SnapshotReader()
+    frames = []
+    for start in range(0, len(data), chunk_size):
+        frames.extend(reader.feed(data[start:start + chunk_size]))
+    reader.close()
+    return reader, frames
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_frames_round_trip_in_any_chunking(compression, chunk_size):
+    data, ids, documents, metadatas, embeddings = build_snapshot(compression)
+    reader, frames = read_all(data, chunk_size)
+    assert [kind for kind, _ in frames] == ["header", "batch", "end"]
+    batch = decode_batch(frames[1][1], reader.header)
+    assert batch.ids == ids and batch.documents == documents and batch.metadatas == metadatas
+    np.testing.assert_array_equal(batch.embeddings, embeddings)
+    assert frames[2][1] == {"rows": 5}
+
+def test_truncated_stream_is_rejected():
+    data = build_snapshot()[0]
+    reader = SnapshotReader()
+    reader.feed(data[:-3])
+    with pytest.raises(SnapshotError, match="truncated"):
+        reader.close()
+
+def test_stream_without_magic_is_rejected():
+    with pytest.raises(SnapshotError, match="Not a knowledge base snapshot"):
+        SnapshotReader().feed(b"PK\x03\x04" + b"\0" * 16)
+
+def test_corrupt_batch_is_rejected():
+    data = build_snapshot(compression="zlib")[0]
+    reader = SnapshotReader()
+    frames = reader.feed(data)
+    payload = bytearray(frames[1][1])
+    payload[len(payload) // 2] ^= 0xFF
+    with pytest.raises(SnapshotError):
+        decode_batch(bytes(payload), reader.header)
+
+def test_data_after_the_end_is_rejected():
+    data = build_snapshot()[0]
+    with pytest.raises(SnapshotError, match="after the end"):
+        SnapshotReader().feed(data + encode_end(0))
+
+def test_header_needs_a_known_format():
+    data = MAGIC + encode_header({"dimension": 4, "compression": "zlib", "format": 99})[len(MAGIC):]
+    with pytest.raises(SnapshotError, match="Unsupported snapshot format"):
+        SnapshotReader().feed(data)
+
+async def export(service, collection=None):
+    return b"".join([chunk async for chunk in service.iter_export(collection)])
+
+async def import_(service, data, collection=None, chunk_size=4096):
+    reports = []
+    chunks = (data[start:start + chunk_size] for start in range(0, len(data), chunk_size))
+    async for report in service.iter_import(chunks, collection):
+        reports.append(report)
+    return reports
+
+@pytest.mark.parametrize("backend", ["numpy", "chroma"])
+def test_collection_round_trips_through_a_snapshot(make_service, backend):
+    source = make_service("source", backend=backend, batch_size=64)
+    target = make_service("target", backend=backend, batch_size=64)
+    documents = [f"note {i} about subject {i % 11}" for i in range(150)]
+    metadatas = [{"n": i} for i in range(150)]
+
+    async def scenario():
+        await source.add_documents(documents, metadatas)
+        data = await export(source)
+        reports = await import_(target, data)
+        assert reports[-1]["rows"] == reports[-1]["added"] == 150
+        assert target.get_stats()["count"] == 150
+        # Embeddings arrive as stored, not recomputed
+        stored = {}
+        for service in (source, target):
+            rows = {}
+            for hits, embeddings in service.backend.scan_embeddings(1000):
+                for doc_id, document, metadata, embedding in zip(hits.ids, hits.documents, hits.metadatas, embeddings):
+                    rows[doc_id] = (document, metadata, embedding.tolist())
+            stored[service] = rows
+        assert stored[source] == stored[target]
+        # A second import skips every row
+        again = await import_(target, data)
+        assert (again[-1]["added"], again[-1]["skipped"]) == (0, 150)
+
+    asyncio.run(scenario())
+
+def test_import_rejects_truncated_and_mismatched_snapshots(make_service):
+    source = make_service("source")
+    target = make_service("target")
+
+    async def scenario():
+        await source.add_documents([f"row {i}" for i in range(20)])
+        data = await export(source)
+        with pytest.raises(SnapshotError, match="truncated"):
+            await import_(target, data[:-4])
+        header = encode_header({"collection": "c", "dimension": 3, "compression": "none"})
+        with pytest.raises(SnapshotError, match="dimensions"):
+            await import_(target, header + encode_end(0))
+
+    asyncio.run(scenario())
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+CLOCK = """
+  - name: {name}
+    description: Returns a fresh value on every execution
+    input_schema: {{type: object, properties: {{x: {{type: integer}}, y: {{type: integer}}}}}}
+    code: |
+      if x < 0:
+          raise ValueError("negative")
+      return str(import_module("time").perf_counter_ns())
+"""
+
+def config(ttl="null", pure="true", version="1"):
+    return (
+        f'name: test\nversion: "{version}"\ntools:\n'
+        + CLOCK.format(name="clock")
+        + f"    cache: {{pure: {pure}, ttl: {ttl}, max_entries: 8}}\n"
+    )
+
+def call(core, **arguments):
+    async def run():
+        result = await core._call_tool("clock", arguments)
+        return result[0].text
+    return asyncio.run(run())
+
+def test_pure_tool_results_are_served_from_the_cache(make_core):
+    core = make_core(config())
+    first = call(core, x=1, y=2)
+    assert call(core, y=2, x=1) == first  # Argument order does not matter
+    assert call(core, x=2, y=2) != first
+    stats = core.get_metrics()["tool_caches"]["clock"]
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 2)
+    assert stats["hit_ratio"] == round(1 / 3, 3)
+
+def test_cached_results_expire(make_core):
+    core = make_core(config(ttl=0.05))
+    first = call(core, x=1)
+    assert call(core, x=1) == first
+    time.sleep(0.1)
+    assert call(core, x=1) != first
+
+def test_errors_and_impure_tools_are_not_cached(make_core):
+    core = make_core(config(pure="false"))
+    assert call(core, x=1) != call(core, x=1)
+    assert "clock" not in core.registry.result_caches
+
+    core = make_core(config())
+    assert call(core, x=-1).startswith("Execution Error")
+    assert len(core.registry.result_caches["clock"]) == 0
+
+def test_new_config_version_starts_with_an_empty_cache(make_core):
+    core = make_core(config())
+    first = call(core, x=1)
+    asyncio.run(core.config_manager.update_from_yaml(config(version="2")))
+    assert call(core, x=1) != first
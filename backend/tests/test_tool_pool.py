@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from tool_pool import resource
+
+TOOL = """
+  - name: {name}
+    description: Runs in the worker pool
+    input_schema: {{type: object, properties: {{}}}}
+    execution: process
+    timeout: {timeout}
+    rlimits: {{memory_mb: {memory_mb}, cpu_seconds: {cpu_seconds}}}
+    code: |
+      {code}
+"""
+
+def config(**tools):
+    text = "name: test\ntool_pool: {workers: 1, default_timeout: 10}\ntools:\n"
+    for name, options in tools.items():
+        options = {"timeout": "null", "memory_mb": "null", "cpu_seconds": "null", **options}
+        text += TOOL.format(name=name, **options)
+    return text
+
+needs_rlimits = pytest.mark.skipif(resource is None, reason="rlimits need the resource module")
+
+PID = {"code": 'return str(import_module("os").getpid())'}
+
+def run(core, *names):
+    async def scenario():
+        return [(await core._call_tool(name, {}))[0].text for name in names]
+    return asyncio.run(scenario())
+
+def test_hung_worker_is_replaced(make_core):
+    core = make_core(config(pid=PID, hang={"code": "while True: pass", "timeout": 0.5}))
+    before, error, after = run(core, "pid", "hang", "pid")
+    assert error == "Execution Error: Tool timed out after 0.5s"
+    assert after.isdigit() and after != before
+    stats = core.tool_pool.get_stats()
+    assert (stats["timeouts"], stats["restarts"], stats["workers"], stats["busy"]) == (1, 1, 1, 0)
+
+@needs_rlimits
+def test_worker_recovers_from_memory_limit(make_core):
+    core = make_core(config(
+        pid=PID,
+        hog={"code": 'return len(bytearray(512 * 1024 * 1024))', "memory_mb": 256},
+        big={"code": 'return len(bytearray(300 * 1024 * 1024))'}
+    ))
+    before, error, allocated, after = run(core, "pid", "hog", "big", "pid")
+    assert error.startswith("Execution Error: MemoryError")
+    # The limit is lifted after the call, in the same worker
+    assert allocated == str(300 * 1024 * 1024)
+    assert after == before and core.tool_pool.get_stats()["restarts"] == 0
+
+@needs_rlimits
+def test_worker_killed_for_cpu_time_is_replaced(make_core):
+    core = make_core(config(pid=PID, spin={"code": "while True: pass", "cpu_seconds": 1}))
+    before, error, after = run(core, "pid", "spin", "pid")
+    assert error.startswith("Execution Error: Tool worker exited unexpectedly")
+    assert after.isdigit() and after != before
+    stats = core.tool_pool.get_stats()
+    assert (stats["crashes"], stats["restarts"]) == (1, 1)
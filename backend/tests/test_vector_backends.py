@@ -0,0 +1,116 @@
+import os
+import numpy as np
+import pytest
+from vector_backends import NumpyBackend, matches_where
+
+def random_vectors(count, dim=32, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def fill(backend, vectors, metadatas=None):
+    ids = [f"id{i}" for i in range(len(vectors))]
+    backend.add_many(ids, [f"doc {i}" for i in range(len(vectors))], vectors, metadatas or [None] * len(vectors))
+    return ids
+
+def test_int8_storage_re_ranks_exactly(tmp_path):
+    vectors = random_vectors(2000)
+    exact = NumpyBackend(str(tmp_path / "float32"), "c")
+    quantized = NumpyBackend(str(tmp_path / "int8"), "c", storage="int8")
+    fill(exact, vectors)
+    fill(quantized, vectors)
+    for query in random_vectors(20, seed=1):
+        expected, result = exact.query(query, 10), quantized.query(query, 10)
+        assert result.ids == expected.ids
+        np.testing.assert_allclose(result.distances, expected.distances, atol=1e-6)
+    assert quantized.bytes_per_vector == 32 + 4
+
+def test_switching_storage_keeps_the_float32_vectors(tmp_path):
+    vectors = random_vectors(300)
+    path = str(tmp_path)
+    fill(NumpyBackend(path, "c"), vectors)
+    query = random_vectors(1, seed=1)[0]
+    expected = NumpyBackend(path, "c").query(query, 5)
+    as_int8 = NumpyBackend(path, "c", storage="int8")
+    assert os.path.exists(as_int8.matrix_path)
+    assert as_int8.query(query, 5).ids == expected.ids
+    # Rows added while int8 are stored in float32 too, so switching back loses nothing
+    late = random_vectors(10, seed=2)
+    as_int8.add_many([f"late{i}" for i in range(10)], ["late"] * 10, late, [None] * 10)
+    back = NumpyBackend(path, "c")
+    assert back.count() == 310
+    assert back.query(query, 5).ids == expected.ids
+    assert back.query(late[3], 1).ids == ["late3"]
+
+def test_incomplete_matrix_is_reported_not_rebuilt(tmp_path):
+    backend = NumpyBackend(str(tmp_path), "c", storage="int8")
+    fill(backend, random_vectors(10))
+    os.remove(backend.matrix_path)
+    with pytest.raises(ValueError, match="missing or incomplete"):
+        NumpyBackend(str(tmp_path), "c", storage="int8")
+
+FILTERS = [
+    {"team": "billing"},
+    {"team": {"$ne": "billing"}},
+    {"team": {"$in": ["billing", "support"]}},
+    {"team": {"$nin": ["billing"]}},
+    {"team": None},
+    {"year": {"$gte": 2023}},
+    {"year": {"$lt": 2022}},
+    {"year": 2021},
+    {"year": {"$in": [2020, 2024]}},
+    {"flag": True},
+    {"tags": ["a", "b"]},
+    {"tags": {"$in": [["a"], "x"]}},
+    {"label": {"$gt": "m"}},  # Strings: answered row by row
+    {"$and": [{"team": "support"}, {"year": {"$gt": 2021}}]},
+    {"$or": [{"team": "billing"}, {"year": {"$lte": 2020}}]},
+    {"team": "support", "flag": {"$ne": True}},
+]
+
+def random_metadatas(count, seed=0):
+    rng = np.random.default_rng(seed)
+    metadatas = []
+    for i in range(count):
+        metadata = {}
+        if rng.random() < 0.8:
+            metadata["team"] = ["billing", "support", "sales"][rng.integers(3)]
+        if rng.random() < 0.7:
+            metadata["year"] = int(rng.integers(2019, 2026)) if rng.random() < 0.8 else float(rng.integers(2019, 2026))
+        if rng.random() < 0.5:
+            metadata["flag"] = bool(rng.integers(2))
+        if rng.random() < 0.3:
+            metadata["tags"] = [["a", "b"], ["a"], []][rng.integers(3)]
+        if rng.random() < 0.5:
+            metadata["label"] = "abcdefghijklmnopqrstuvwxyz"[rng.integers(26)]
+        metadatas.append(metadata or None)
+    return metadatas
+
+@pytest.mark.parametrize("where", FILTERS)
+def test_vectorized_filters_agree_with_matches_where(tmp_path, where):
+    metadatas = random_metadatas(500)
+    backend = NumpyBackend(str(tmp_path), "c")
+    ids = fill(backend, random_vectors(300), metadatas[:300])
+    backend.delete(ids[:20])
+    # Columns built now are extended by later rows
+    backend.ids_where(where)
+    backend.add_many([f"id{i}" for i in range(300, 500)], ["doc"] * 200, random_vectors(200, seed=3), metadatas[300:])
+    expected = [f"id{i}" for i in range(20, 500) if matches_where(metadatas[i], where)]
+    assert sorted(backend.ids_where(where)) == sorted(expected)
+    hits = backend.query(random_vectors(1, seed=4)[0], 500, where)
+    assert sorted(hits.ids) == sorted(expected)
+
+def test_filters_follow_compaction(tmp_path):
+    metadatas = [{"n": i} for i in range(100)]
+    backend = NumpyBackend(str(tmp_path), "c")
+    ids = fill(backend, random_vectors(100), metadatas)
+    assert len(backend.ids_where({"n": {"$lt": 50}})) == 50
+    backend.delete(ids[:30])
+    backend.compact()
+    assert sorted(backend.ids_where({"n": {"$lt": 50}})) == sorted(ids[30:50])
+    assert backend.query(random_vectors(1, seed=1)[0], 5, {"n": 70}).ids == ["id70"]
+
+def test_unknown_operator_is_rejected(tmp_path):
+    backend = NumpyBackend(str(tmp_path), "c")
+    fill(backend, random_vectors(3))
+    with pytest.raises(ValueError, match="Unsupported where operator"):
+        backend.ids_where({"n": {"$regex": "x"}})
@@ -0,0 +1,219 @@
+import asyncio
+import marshal
+import multiprocessing
+from types import CodeType
+from typing import Any, Dict, List, Optional, Set
+from models import RLimitsConfig, ToolPoolConfig
+
+try:
+    import resource
+except ImportError:  # Windows: run without rlimits
+    resource = None
+
+class ToolTimeout(RuntimeError):
+    """Raised when a tool exceeds its wall-clock timeout; its worker is replaced."""
+
+class ToolWorkerCrashed(RuntimeError):
+    """Raised when a worker dies mid-call (e.g. killed for exceeding its CPU limit)."""
+
+def _apply_rlimits(rlimits: Optional[dict]):
+    """Sets soft limits for the next call; passing None lifts them again."""
+    if resource is None:
+        return
+    rlimits = rlimits or {}
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    memory_mb = rlimits.get("memory_mb")
+    resource.setrlimit(
+        resource.RLIMIT_AS,
+        (memory_mb * 1024 * 1024 if memory_mb else hard, hard)
+    )
+    # RLIMIT_CPU counts total process CPU time, so the budget is relative to usage so far
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    cpu_seconds = rlimits.get("cpu_seconds")
+    if cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        resource.setrlimit(resource.RLIMIT_CPU, (int(usage.ru_utime + usage.ru_stime) + cpu_seconds, hard))
+    else:
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+def _worker_main(conn):
+    """Worker loop: receives (digest, code, arguments, rlimits) and replies with (ok, text)."""
+    import builtins
+    from types import FunctionType
+    loop = asyncio.new_event_loop()
+    codes: Dict[str, CodeType] = {}
+    base_globals = {
+        "__builtins__": builtins,
+        "asyncio": asyncio,
+        "import_module": __import__,
+        "vector_service": None  # Not available outside the server process
+    }
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        digest, code_bytes, arguments, rlimits = message
+        try:
+            code = codes.get(digest)
+            if code is None:
+                code = codes[digest] = marshal.loads(code_bytes)
+            _apply_rlimits(rlimits)
+            try:
+                func = FunctionType(code, {**base_globals, **arguments})
+                reply = (True, str(loop.run_until_complete(func())))
+            finally:
+                _apply_rlimits(None)
+        except BaseException as e:
+            reply = (False, f"{type(e).__name__}: {e}")
+        conn.send(reply)
+
+class _Worker:
+    __slots__ = ("process", "conn", "known")
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        # Code digests this worker has already received
+        self.known: Set[str] = set()
+
+class ToolProcessPool:
+    """
+    Warm pool of worker processes for configured tools with
+    `execution: process`. Each call gets a wall-clock timeout and optional
+    memory/CPU rlimits; a worker that times out or dies is killed and
+    replaced, so a runaway tool never takes down the server.
+    """
+    def __init__(self, config: Optional[ToolPoolConfig] = None):
+        self.config = config or ToolPoolConfig()
+        self._context = multiprocessing.get_context(self.config.start_method)
+        self._workers: List[_Worker] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self.busy = 0
+        self.waiting = 0
+        self.calls = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.restarts = 0
+
+    def configure(self, config: ToolPoolConfig):
+        """Applies a reloaded config; the worker count and start method keep their startup values."""
+        self.config = config.copy(update={"workers": self.config.workers, "start_method": self.config.start_method})
+
+    def _spawn(self) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn,), name="mcp-tool-worker", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        self._workers.append(worker)
+        return worker
+
+    def start(self):
+        """Starts the workers; called at startup or lazily on first use."""
+        if self._idle is not None:
+            return
+        self._idle = asyncio.Queue()
+        for _ in range(self.config.workers):
+            self._idle.put_nowait(self._spawn())
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        """Kills a worker and spawns its replacement; the killed one is reaped off the event loop."""
+        self._workers.remove(worker)
+        if worker.process.is_alive():
+            worker.process.kill()
+        asyncio.get_running_loop().run_in_executor(None, self._reap, [worker])
+        self.restarts += 1
+        return self._spawn()
+
+    @staticmethod
+    def _reap(workers: List[_Worker]):
+        """Waits for workers to exit, killing those that do not (blocking)."""
+        for worker in workers:
+            worker.process.join(timeout=1)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join(timeout=1)
+            worker.conn.close()
+
+    async def _recv(self, worker: _Worker):
+        """Waits for the worker's reply without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        fd = worker.conn.fileno()
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(fd)
+        return worker.conn.recv()
+
+    async def run(
+        self,
+        digest: str,
+        code: CodeType,
+        arguments: Dict[str, Any],
+        timeout: Optional[float] = None,
+        rlimits: Optional[RLimitsConfig] = None
+    ) -> str:
+        """Runs compiled tool code in a worker and returns its result as text."""
+        self.start()
+        self.calls += 1
+        self.waiting += 1
+        try:
+            worker = await self._idle.get()
+        finally:
+            self.waiting -= 1
+        self.busy += 1
+        try:
+            payload = None if digest in worker.known else marshal.dumps(code)
+            worker.conn.send((digest, payload, arguments, rlimits.dict() if rlimits else None))
+            worker.known.add(digest)
+            ok, text = await asyncio.wait_for(self._recv(worker), timeout or self.config.default_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            worker = self._replace(worker)
+            raise ToolTimeout(f"Tool timed out after {timeout or self.config.default_timeout}s")
+        except (EOFError, OSError):
+            self.crashes += 1
+            worker = self._replace(worker)
+            raise ToolWorkerCrashed("Tool worker exited unexpectedly (resource limit exceeded?)")
+        except asyncio.CancelledError:
+            # The reply would be read by the next caller, so the worker cannot be reused
+            worker = self._replace(worker)
+            raise
+        finally:
+            self.busy -= 1
+            self._idle.put_nowait(worker)
+        if not ok:
+            raise RuntimeError(text)
+        return text
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns pool saturation and failure counters."""
+        size = len(self._workers)
+        return {
+            "workers": size,
+            "busy": self.busy,
+            "waiting": self.waiting,
+            "saturation": round(self.busy / size, 3) if size else 0.0,
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "crashes": self.crashes,
+            "restarts": self.restarts
+        }
+
+    async def shutdown(self):
+        """Stops all workers, waiting for them on the default executor."""
+        workers, self._workers = self._workers, []
+        self._idle = None
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        await asyncio.get_running_loop().run_in_executor(None, self._reap, workers)
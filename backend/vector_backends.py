@@ -0,0 +1,715 @@
+import json
+import os
+import threading
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+import numpy as np
+
+class SearchHits(NamedTuple):
+    """Nearest neighbours of one query, best first."""
+    ids: List[str]
+    documents: List[str]
+    metadatas: List[Optional[dict]]
+    distances: List[float]
+
+class VectorBackend:
+    """
+    Storage and nearest-neighbour search for embedded documents.
+    Embeddings are computed by VectorService and passed in, so every backend
+    sees the same vectors. Methods are blocking and are called from the
+    VectorService executor threads.
+    """
+    name = "base"
+
+    def add(self, doc_id: str, document: str, embedding: Sequence[float], metadata: Optional[dict] = None):
+        """Stores a single document."""
+        self.add_many([doc_id], [document], [embedding], [metadata])
+
+    def add_many(
+        self,
+        ids: List[str],
+        documents: List[str],
+        embeddings: Sequence[Sequence[float]],
+        metadatas: List[Optional[dict]]
+    ):
+        """Stores a batch of documents in one write."""
+        raise NotImplementedError
+
+    def existing_ids(self, ids: List[str]) -> Set[str]:
+        """Returns the subset of `ids` already stored."""
+        raise NotImplementedError
+
+    def query(self, embedding: Sequence[float], n_results: int, where: Optional[dict] = None) -> SearchHits:
+        """Returns the `n_results` stored documents closest to `embedding`."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Returns the number of stored documents."""
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]) -> int:
+        """Deletes documents by ID and returns how many were removed."""
+        raise NotImplementedError
+
+    def dimension(self) -> Optional[int]:
+        """Returns the embedding dimension, or None while the store is empty."""
+        raise NotImplementedError
+
+    def get(self, ids: List[str]) -> SearchHits:
+        """Fetches stored documents by ID, in the given order; unknown IDs are left out. No distances."""
+        raise NotImplementedError
+
+    def scan(self, batch_size: int = 1000) -> Iterator[SearchHits]:
+        """Iterates over all stored documents in batches (without embeddings or distances)."""
+        raise NotImplementedError
+
+    def scan_embeddings(self, batch_size: int = 1000) -> Iterator[Tuple[SearchHits, np.ndarray]]:
+        """Like scan, with the float32 embeddings of each batch as one matrix."""
+        raise NotImplementedError
+
+    def ids_where(self, where: dict) -> List[str]:
+        """Returns the IDs of stored documents whose metadata matches `where`."""
+        raise NotImplementedError
+
+    @property
+    def deleted_rows(self) -> int:
+        """Deleted rows whose space has not been reclaimed yet."""
+        return 0
+
+    def compact(self) -> int:
+        """
+        Reclaims the space held by deleted rows and returns the bytes freed.
+        A no-op for stores that manage their own space.
+        """
+        return 0
+
+class ChromaBackend(VectorBackend):
+    """Backend over a persistent ChromaDB collection (SQLite + HNSW)."""
+    name = "chroma"
+
+    def __init__(self, db_path: str, collection_name: str, embedding_fn):
+        import chromadb
+        self.client = chromadb.PersistentClient(path=db_path)
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=embedding_fn
+        )
+
+    def add_many(self, ids, documents, embeddings, metadatas):
+        self.collection.add(
+            ids=ids,
+            documents=documents,
+            embeddings=embeddings,
+            # Chroma rejects empty metadata dicts, so omit them entirely
+            metadatas=[m or None for m in metadatas] if any(metadatas) else None
+        )
+
+    def existing_ids(self, ids):
+        if not ids:
+            return set()
+        return set(self.collection.get(ids=list(set(ids)), include=[])["ids"])
+
+    def query(self, embedding, n_results, where=None):
+        results = self.collection.query(
+            query_embeddings=[embedding],
+            n_results=n_results,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+        if not results["ids"]:
+            return SearchHits([], [], [], [])
+        return SearchHits(
+            ids=results["ids"][0],
+            documents=results["documents"][0],
+            metadatas=results["metadatas"][0] if results.get("metadatas") else [None] * len(results["ids"][0]),
+            distances=results["distances"][0] if results.get("distances") else []
+        )
+
+    def count(self):
+        return self.collection.count()
+
+    def delete(self, ids):
+        present = self.existing_ids(ids)
+        if present:
+            self.collection.delete(ids=list(present))
+        return len(present)
+
+    def dimension(self):
+        sample = self.collection.get(limit=1, include=["embeddings"])["embeddings"]
+        return len(sample[0]) if sample is not None and len(sample) else None
+
+    def get(self, ids):
+        if not ids:
+            return SearchHits([], [], [], [])
+        results = self.collection.get(ids=list(set(ids)), include=["documents", "metadatas"])
+        rows = {
+            doc_id: (document, metadata)
+            for doc_id, document, metadata in zip(results["ids"], results["documents"], results["metadatas"])
+        }
+        found = [doc_id for doc_id in ids if doc_id in rows]
+        return SearchHits(found, [rows[i][0] for i in found], [rows[i][1] for i in found], [])
+
+    def scan(self, batch_size=1000):
+        offset = 0
+        while True:
+            results = self.collection.get(limit=batch_size, offset=offset, include=["documents", "metadatas"])
+            if not results["ids"]:
+                return
+            yield SearchHits(results["ids"], results["documents"], results["metadatas"], [])
+            offset += len(results["ids"])
+
+    def scan_embeddings(self, batch_size=1000):
+        offset = 0
+        while True:
+            results = self.collection.get(
+                limit=batch_size, offset=offset, include=["documents", "metadatas", "embeddings"]
+            )
+            if not results["ids"]:
+                return
+            hits = SearchHits(results["ids"], results["documents"], results["metadatas"], [])
+            yield hits, np.asarray(results["embeddings"], dtype=np.float32)
+            offset += len(results["ids"])
+
+    def ids_where(self, where):
+        return self.collection.get(where=where, include=[])["ids"]
+
+def matches_where(metadata: Optional[dict], where: dict) -> bool:
+    """Evaluates the subset of Chroma's `where` syntax used with the NumPy backend."""
+    metadata = metadata or {}
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq":
+                ok = value == operand
+            elif op == "$ne":
+                ok = value != operand
+            elif op == "$in":
+                ok = value in operand
+            elif op == "$nin":
+                ok = value not in operand
+            elif op in ("$gt", "$gte", "$lt", "$lte"):
+                if value is None:
+                    return False
+                ok = {
+                    "$gt": value > operand,
+                    "$gte": value >= operand,
+                    "$lt": value < operand,
+                    "$lte": value <= operand,
+                }[op]
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+            if not ok:
+                return False
+    return True
+
+_RANGE_OPS = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}
+
+class _Column:
+    """One metadata key over the first `count` rows: its rows per value, and the values as numbers."""
+    __slots__ = ("count", "rows", "unhashable", "numbers", "non_numeric")
+
+    def __init__(self):
+        self.count = 0
+        self.rows: Dict[object, List[int]] = {}  # Rows without the key are listed under None
+        self.unhashable: List[int] = []  # Rows whose value is a list or dict
+        self.numbers = np.empty(0, dtype=np.float64)  # NaN where the value is missing or not a number
+        self.non_numeric = False  # Whether any value is neither missing nor a number
+
+class _MetadataColumns:
+    """
+    Evaluates `where` filters (the subset matches_where accepts) over all
+    rows at once. Each key a filter names gets a column, built on first
+    use and extended as rows are appended: an inverted map from value to
+    rows for equality and membership, and a float64 array for range
+    comparisons. Operands these cannot answer (lists compared with `$eq`,
+    ranges over strings) fall back to matches_where for that condition.
+    The metadata list is append-only; compaction starts a new instance.
+    """
+    def __init__(self, metadatas: List[Optional[dict]]):
+        self.metadatas = metadatas
+        self._columns: Dict[str, _Column] = {}
+        self._lock = threading.Lock()
+
+    def _column(self, key: str, size: int) -> _Column:
+        with self._lock:
+            column = self._columns.setdefault(key, _Column())
+            if column.count < size:
+                if len(column.numbers) < size:
+                    numbers = np.full(max(size, 2 * len(column.numbers)), np.nan)
+                    numbers[:column.count] = column.numbers[:column.count]
+                    column.numbers = numbers
+                for row in range(column.count, size):
+                    metadata = self.metadatas[row]
+                    value = metadata.get(key) if metadata else None
+                    if isinstance(value, (int, float)):
+                        column.numbers[row] = value
+                    elif value is not None:
+                        column.non_numeric = True
+                    if isinstance(value, (list, dict)):
+                        column.unhashable.append(row)
+                    else:
+                        column.rows.setdefault(value, []).append(row)
+                column.count = size
+            return column
+
+    def mask(self, where: dict, size: int) -> np.ndarray:
+        """Boolean mask of the first `size` rows whose metadata matches `where`."""
+        mask = np.ones(size, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self.mask(clause, size)
+                continue
+            if key == "$or":
+                matched = np.zeros(size, dtype=bool)
+                for clause in condition:
+                    matched |= self.mask(clause, size)
+                mask &= matched
+                continue
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, operand in condition.items():
+                mask &= self._condition(key, op, operand, size)
+        return mask
+
+    def _condition(self, key: str, op: str, operand, size: int) -> np.ndarray:
+        if op in ("$eq", "$ne", "$in", "$nin"):
+            values = [operand] if op in ("$eq", "$ne") else operand
+            if isinstance(values, (list, tuple, set)) and not any(isinstance(v, (list, dict)) for v in values):
+                column = self._column(key, size)
+                matched = np.zeros(size, dtype=bool)
+                for value in values:
+                    matched[column.rows.get(value, [])] = True
+                for row in column.unhashable:
+                    matched[row] = self.metadatas[row][key] in values
+                return ~matched if op in ("$ne", "$nin") else matched
+        elif op in _RANGE_OPS:
+            if isinstance(operand, (int, float)):
+                column = self._column(key, size)
+                if not column.non_numeric:
+                    # NaN (missing) compares false, as matches_where treats a missing value
+                    return _RANGE_OPS[op](column.numbers[:size], operand)
+        else:
+            raise ValueError(f"Unsupported where operator: {op}")
+        clause = {key: {op: operand}}
+        return np.fromiter((matches_where(m, clause) for m in self.metadatas[:size]), dtype=bool, count=size)
+
+# Vector encodings of the NumPy backend; int8 is searched approximately, then re-ranked exactly.
+# There is no float16 mode: NumPy has no native half-precision matrix-vector product, so
+# scanning float16 rows was several times slower than float32 for half the savings of int8.
+STORAGE_MODES = ("float32", "int8")
+
+# Rows copied at a time when re-encoding or compacting a matrix
+_COPY_BLOCK = 512
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes float32 rows as int8 with one scale per row (symmetric, so a
+    row's largest component maps to 127). Returns the codes and the scales.
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+class _MappedArray:
+    """
+    A .npy file opened memory-mapped, with spare rows that double in number
+    as it fills. Which rows are in use is tracked by the caller.
+    """
+    _INITIAL_CAPACITY = 1024
+
+    def __init__(self, path: str, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.array: Optional[np.ndarray] = np.load(path, mmap_mode="r+") if os.path.exists(path) else None
+
+    @property
+    def capacity(self) -> int:
+        return self.array.shape[0] if self.array is not None else 0
+
+    def ensure_capacity(self, rows: int, used: int, row_shape: Tuple[int, ...] = ()):
+        """Grows the file to hold at least `rows` rows, copying the first `used`."""
+        if rows <= self.capacity:
+            return
+        new_capacity = max(self._INITIAL_CAPACITY, self.capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+        tmp_path = self.path + ".tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=self.dtype, shape=(new_capacity, *row_shape))
+        if self.array is not None:
+            grown[:used] = self.array[:used]
+        grown.flush()
+        del grown
+        os.replace(tmp_path, self.path)
+        self.array = np.load(self.path, mmap_mode="r+")
+
+    def flush(self):
+        if self.array is not None:
+            self.array.flush()
+
+class NumpyBackend(VectorBackend):
+    """
+    Memory-resident flat index: a float32 matrix searched with one
+    matrix-vector product and argpartition top-k. Embeddings are expected
+    to be L2-normalized (as the default model's are), so the inner product
+    is the cosine similarity; distances are reported as 1 - similarity.
+
+    Rows live in `<name>.npy`, opened memory-mapped with spare capacity that
+    doubles as it fills. IDs, documents and metadata are appended to a
+    `<name>.jsonl` sidecar whose line count is the authoritative row count,
+    so reopening never copies the matrix. Deletes append tombstones and
+    mask rows out of search. `where` filters are evaluated over per-key
+    metadata columns (_MetadataColumns) into the same mask.
+
+    With int8 `storage`, rows are also kept as int8 codes
+    (`<name>.int8.npy`) with one scale per row (`<name>.scales.npy`), and
+    searches scan those, a quarter of the float32 bytes. The best
+    `rerank_factor` candidates per requested result are then re-scored
+    exactly against the float32 matrix, which stays on disk and is only
+    read at those rows, so it need not be resident. A collection can
+    switch between float32 and int8 in either direction; its files are
+    never removed on open.
+    """
+    name = "numpy"
+
+    def __init__(
+        self,
+        db_path: str,
+        collection_name: str,
+        dim: Optional[int] = None,
+        storage: str = "float32",
+        rerank_factor: int = 4
+    ):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown vector storage: {storage} (expected one of {', '.join(STORAGE_MODES)})")
+        os.makedirs(db_path, exist_ok=True)
+        self.storage = storage
+        self.rerank_factor = max(1, rerank_factor)
+        self.matrix_path = os.path.join(db_path, f"{collection_name}.npy")
+        self.sidecar_path = os.path.join(db_path, f"{collection_name}.jsonl")
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Optional[dict]] = []
+        self._columns = _MetadataColumns(self._metadatas)
+        self._index: Dict[str, int] = {}
+        self._deleted = np.zeros(0, dtype=bool)
+        # float32 rows are kept with either storage: int8 re-ranks against them
+        self._vectors = _MappedArray(self.matrix_path, np.float32)
+        self._codes: Optional[_MappedArray] = None
+        self._scales: Optional[_MappedArray] = None
+        if storage == "int8":
+            self._codes = _MappedArray(os.path.join(db_path, f"{collection_name}.int8.npy"), np.int8)
+            self._scales = _MappedArray(os.path.join(db_path, f"{collection_name}.scales.npy"), np.float32)
+        self.dim = dim
+        self._load()
+
+    @property
+    def bytes_per_vector(self) -> Optional[int]:
+        """Bytes each search scans per stored row."""
+        if self.dim is None:
+            return None
+        return 4 * self.dim if self.storage == "float32" else self.dim + 4
+
+    def _arrays(self) -> List[Tuple[_MappedArray, Tuple[int, ...]]]:
+        """The mapped arrays written for every row, with their row shapes."""
+        arrays = [(self._vectors, (self.dim,))]
+        if self._codes is not None:
+            arrays.extend([(self._codes, (self.dim,)), (self._scales, ())])
+        return arrays
+
+    def _load(self):
+        if not os.path.exists(self.sidecar_path):
+            return
+        deleted: Set[int] = set()
+        with open(self.sidecar_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                if "delete" in row:
+                    position = self._index.pop(row["delete"], None)
+                    if position is not None:
+                        deleted.add(position)
+                    continue
+                self._index[row["id"]] = len(self._ids)
+                self._ids.append(row["id"])
+                self._documents.append(row["document"])
+                self._metadatas.append(row.get("metadata"))
+        rows = len(self._ids)
+        if self._codes is not None and self._codes.capacity < rows:
+            self._encode_existing(rows)
+        if self._vectors.capacity < rows:
+            raise ValueError(f"{self.matrix_path} is missing or incomplete: it holds fewer rows than {self.sidecar_path}")
+        if self._vectors.array is not None:
+            self.dim = self._vectors.array.shape[1]
+        self._deleted = np.zeros(rows, dtype=bool)
+        if deleted:
+            self._deleted[list(deleted)] = True
+
+    def _encode_existing(self, rows: int):
+        """Builds the int8 codes of rows stored before the collection switched to int8 storage."""
+        source = np.load(self.matrix_path, mmap_mode="r") if os.path.exists(self.matrix_path) else None
+        if source is None or source.shape[0] < rows:
+            raise ValueError(f"{self._codes.path} is missing or incomplete and there are no float32 vectors to rebuild it from")
+        self.dim = source.shape[1]
+        self._codes.ensure_capacity(rows, 0, (self.dim,))
+        self._scales.ensure_capacity(rows, 0)
+        for start in range(0, rows, _COPY_BLOCK):
+            end = min(start + _COPY_BLOCK, rows)
+            self._write_rows(start, np.asarray(source[start:end], dtype=np.float32), float32=False)
+        self._codes.flush()
+        self._scales.flush()
+
+    def _write_rows(self, start: int, vectors: np.ndarray, float32: bool = True):
+        end = start + len(vectors)
+        if float32:
+            self._vectors.array[start:end] = vectors
+        if self._codes is not None:
+            codes, scales = quantize(vectors)
+            self._codes.array[start:end] = codes
+            self._scales.array[start:end] = scales
+
+    def add_many(self, ids, documents, embeddings, metadatas):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self.dim}")
+            start = len(self._ids)
+            end = start + len(ids)
+            for array, row_shape in self._arrays():
+                array.ensure_capacity(end, start, row_shape)
+            if end > len(self._deleted):
+                deleted = np.zeros(max(end, 2 * len(self._deleted)), dtype=bool)
+                deleted[:len(self._deleted)] = self._deleted
+                self._deleted = deleted
+            # Rows are written before the sidecar, so a crash never exposes unwritten vectors
+            self._write_rows(start, vectors)
+            for array, _ in self._arrays():
+                array.flush()
+            with open(self.sidecar_path, "a", encoding="utf-8") as f:
+                for doc_id, document, metadata in zip(ids, documents, metadatas):
+                    f.write(json.dumps({"id": doc_id, "document": document, "metadata": metadata or None}) + "\n")
+            for offset, (doc_id, document, metadata) in enumerate(zip(ids, documents, metadatas)):
+                self._index[doc_id] = start + offset
+                self._ids.append(doc_id)
+                self._documents.append(document)
+                self._metadatas.append(metadata or None)
+
+    def existing_ids(self, ids):
+        with self._lock:
+            return {doc_id for doc_id in ids if doc_id in self._index}
+
+    @staticmethod
+    def _scores(query: np.ndarray, vectors: Optional[np.ndarray], codes: Optional[np.ndarray], scales: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Scores every row. int8 codes are multiplied with the query in one
+        pass that widens them on the fly (no float32 copy of the matrix),
+        and each row's scale is applied to its score afterwards.
+        """
+        if codes is None:
+            return vectors @ query
+        scores = np.einsum("ij,j->i", codes, query, dtype=np.float32)
+        scores *= scales
+        return scores
+
+    def query(self, embedding, n_results, where=None):
+        query = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            size = len(self._ids)
+            if self.dim is None or size == 0:
+                return SearchHits([], [], [], [])
+            # Arrays replaced by a concurrent grow stay valid through these references
+            vectors = self._vectors.array
+            codes = self._codes.array[:size] if self._codes is not None else None
+            scales = self._scales.array[:size] if self._scales is not None else None
+            excluded = self._deleted[:size].copy()
+            # Compaction swaps in new lists, so positions stay valid against these
+            ids, documents, metadatas = self._ids, self._documents, self._metadatas
+            columns = self._columns
+        scores = self._scores(query, vectors[:size] if codes is None else None, codes, scales)
+        if where:
+            excluded |= ~columns.mask(where, size)
+        scores[excluded] = -np.inf
+        available = size - int(excluded.sum())
+        k = min(n_results, available)
+        if k <= 0:
+            return SearchHits([], [], [], [])
+        if codes is not None:
+            # Second stage: exact scores for the best approximate candidates
+            candidates = min(k * self.rerank_factor, available)
+            top = np.sort(np.argpartition(-scores, candidates - 1)[:candidates])
+            exact = vectors[top] @ query
+            order = np.argsort(-exact)[:k]
+            top, top_scores = top[order], exact[order]
+        else:
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            top_scores = scores[top]
+        return SearchHits(
+            ids=[ids[i] for i in top],
+            documents=[documents[i] for i in top],
+            metadatas=[metadatas[i] for i in top],
+            distances=[float(1.0 - score) for score in top_scores]
+        )
+
+    def count(self):
+        return len(self._index)
+
+    def delete(self, ids):
+        with self._lock:
+            removed = [doc_id for doc_id in ids if doc_id in self._index]
+            if not removed:
+                return 0
+            with open(self.sidecar_path, "a", encoding="utf-8") as f:
+                for doc_id in removed:
+                    f.write(json.dumps({"delete": doc_id}) + "\n")
+            for doc_id in removed:
+                self._deleted[self._index.pop(doc_id)] = True
+            return len(removed)
+
+    def dimension(self):
+        return self.dim
+
+    def get(self, ids):
+        with self._lock:
+            positions = [self._index[doc_id] for doc_id in ids if doc_id in self._index]
+            return SearchHits(
+                ids=[self._ids[i] for i in positions],
+                documents=[self._documents[i] for i in positions],
+                metadatas=[self._metadatas[i] for i in positions],
+                distances=[]
+            )
+
+    def scan(self, batch_size=1000):
+        for hits, _ in self._scan(batch_size, embeddings=False):
+            yield hits
+
+    def scan_embeddings(self, batch_size=1000):
+        return self._scan(batch_size, embeddings=True)
+
+    def _scan(self, batch_size: int, embeddings: bool) -> Iterator[Tuple[SearchHits, Optional[np.ndarray]]]:
+        with self._lock:
+            positions = sorted(self._index.values())
+            ids, documents, metadatas = self._ids, self._documents, self._metadatas
+            vectors = self._vectors.array
+        for start in range(0, len(positions), batch_size):
+            batch = positions[start:start + batch_size]
+            hits = SearchHits(
+                ids=[ids[i] for i in batch],
+                documents=[documents[i] for i in batch],
+                metadatas=[metadatas[i] for i in batch],
+                distances=[]
+            )
+            yield hits, np.asarray(vectors[batch], dtype=np.float32) if embeddings else None
+
+    def ids_where(self, where):
+        with self._lock:
+            size = len(self._ids)
+            ids, columns = self._ids, self._columns
+            live = ~self._deleted[:size]
+        return [ids[i] for i in np.flatnonzero(live & columns.mask(where, size))]
+
+    @property
+    def deleted_rows(self):
+        return len(self._ids) - len(self._index)
+
+    def _files(self) -> List[str]:
+        return [self.sidecar_path] + [array.path for array, _ in self._arrays()]
+
+    def compact(self):
+        """
+        Rewrites the matrices and the sidecar without deleted rows. Rows are
+        copied without holding the lock, so searches and writes go on; it is
+        taken again only to catch up with rows written or deleted meanwhile
+        and to swap the new files in. Searches already running keep reading
+        the old mappings, which stay valid after the swap.
+        """
+        with self._lock:
+            size = len(self._ids)
+            live = sorted(self._index.values())
+            if len(live) == size:
+                return 0
+            before = sum(os.path.getsize(path) for path in self._files() if os.path.exists(path))
+            ids, documents, metadatas = self._ids, self._documents, self._metadatas
+            sources = [(array, array.array, row_shape) for array, row_shape in self._arrays()]
+        targets = []
+        for array, _, _ in sources:
+            tmp_path = array.path + ".compact"
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)  # Left over from an interrupted compaction
+            targets.append(_MappedArray(tmp_path, array.dtype))
+        sidecar_tmp = self.sidecar_path + ".compact"
+        with open(sidecar_tmp, "w", encoding="utf-8") as f:
+            for i in live:
+                f.write(json.dumps({"id": ids[i], "document": documents[i], "metadata": metadatas[i]}) + "\n")
+        self._copy_rows(sources, targets, live, 0)
+
+        with self._lock:
+            added = [i for i in range(size, len(self._ids)) if not self._deleted[i]]
+            gone = [i for i in live if self._deleted[i]]
+            current = [(array, array.array, row_shape) for array, row_shape in self._arrays()]
+            self._copy_rows(current, targets, added, len(live))
+            with open(sidecar_tmp, "a", encoding="utf-8") as f:
+                # Tombstones first: a row deleted and then re-added must replay as live
+                for i in gone:
+                    f.write(json.dumps({"delete": self._ids[i]}) + "\n")
+                for i in added:
+                    f.write(json.dumps({"id": self._ids[i], "document": self._documents[i], "metadata": self._metadatas[i]}) + "\n")
+            positions = live + added
+            for (array, _, _), target in zip(current, targets):
+                target.flush()
+                target.array = None
+                os.replace(target.path, array.path)
+                array.array = np.load(array.path, mmap_mode="r+")
+            os.replace(sidecar_tmp, self.sidecar_path)
+            self._ids = [self._ids[i] for i in positions]
+            self._documents = [self._documents[i] for i in positions]
+            self._metadatas = [self._metadatas[i] for i in positions]
+            self._columns = _MetadataColumns(self._metadatas)
+            self._deleted = np.zeros(len(positions), dtype=bool)
+            self._deleted[:len(live)] = np.isin(live, gone)
+            self._index = {doc_id: n for n, doc_id in enumerate(self._ids) if not self._deleted[n]}
+            after = sum(os.path.getsize(path) for path in self._files())
+        return max(0, before - after)
+
+    @staticmethod
+    def _copy_rows(sources, targets: List[_MappedArray], positions: List[int], offset: int):
+        """Copies the given rows of each source array into its target, from row `offset` on."""
+        for (_, source, row_shape), target in zip(sources, targets):
+            target.ensure_capacity(offset + len(positions), offset, row_shape)
+            for start in range(0, len(positions), _COPY_BLOCK):
+                batch = positions[start:start + _COPY_BLOCK]
+                target.array[offset + start:offset + start + len(batch)] = source[batch]
+
+def create_backend(
+    kind: str,
+    db_path: str,
+    collection_name: str,
+    embedding_fn,
+    storage: str = "float32",
+    rerank_factor: int = 4
+) -> VectorBackend:
+    """
+    Instantiates the backend selected in `knowledge_base.backend`. Quantized
+    storage applies to the NumPy backend; Chroma keeps its own float32 index.
+    """
+    if kind == "chroma":
+        if storage != "float32":
+            raise ValueError(f"{storage} vector storage needs the numpy backend (Chroma stores float32)")
+        return ChromaBackend(db_path, collection_name, embedding_fn)
+    if kind == "numpy":
+        return NumpyBackend(db_path, collection_name, storage=storage, rerank_factor=rerank_factor)
+    raise ValueError(f"Unknown vector backend: {kind}")
@@ -1,41 +1,1134 @@
-import chromadb
-from chromadb.utils import embedding_functions
+import asyncio
+import hashlib
+import heapq
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
+import numpy as np
 import os
+from cache import LRUCache, SingleFlight
+from config_manager import RESTART_REQUIRED
+from metrics import MetricsRegistry
+from chunking import iter_chunks
+from lexical_index import BM25Index
+from models import CollectionConfig, KnowledgeBaseConfig
+from snapshot import COMPRESSIONS, SnapshotError, SnapshotReader, decode_batch, encode_batch, encode_end, encode_header
+from vector_backends import SearchHits, VectorBackend, create_backend
+
+class VectorServiceOverloaded(RuntimeError):
+    """Raised when the knowledge base executor queue is full."""
+
+# A document to ingest: its content and optional metadata
+DocumentRecord = Tuple[str, Optional[dict]]
+# A row written to the store: its ID, text and optional metadata
+StoredRecord = Tuple[str, str, Optional[dict]]
+
+T = TypeVar("T")
+
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+# Hits fetched per requested result when collapsing chunks of the same parent
+_COLLAPSE_OVERFETCH = 4
+
+# Ingest summaries kept for the recent-ingests resource
+_RECENT_INGESTS = 20
+
+# Metadata keys added to chunks, dropped when a document is reassembled
+_CHUNK_KEYS = ("parent_id", "chunk_index", "chunk_start", "chunk_end")
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Collection names double as Chroma collection names and file names
+_COLLECTION_NAME = re.compile(r"[a-zA-Z0-9][a-zA-Z0-9._-]{1,61}[a-zA-Z0-9]")
+
+def normalize_text(text: str) -> str:
+    """Applies Unicode (NFC) normalization and collapses whitespace."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+def document_id(content: str) -> str:
+    """
+    Stable, content-addressed document ID: a SHA-256 digest of the normalized
+    content, so the same text maps to the same ID across processes and restarts.
+    """
+    return hashlib.sha256(normalize_text(content).encode("utf-8")).hexdigest()[:32]
+
+async def _aiterate(items: Union[Iterable[T], AsyncIterable[T]]) -> AsyncIterator[T]:
+    """Iterates a sync or async iterable from async code."""
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+async def _batched(items: AsyncIterable[T], size: int) -> AsyncIterator[List[T]]:
+    """Groups an async stream into lists of at most `size` items."""
+    batch: List[T] = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def check_collection_name(name: str):
+    """Rejects names the stores cannot hold: 3-63 characters of [a-zA-Z0-9._-], alphanumeric at both ends."""
+    if not _COLLECTION_NAME.fullmatch(name):
+        raise ValueError(
+            f"Invalid collection name: {name!r} (3-63 characters of letters, digits, '.', '_' or '-', "
+            "starting and ending with a letter or digit)"
+        )
+
+def check_collections(config: KnowledgeBaseConfig):
+    """Validates the declared collections against the configured backend."""
+    for name, collection in {config.default_collection: None, **config.collections}.items():
+        check_collection_name(name)
+        if collection is not None and collection.storage != "float32" and config.backend != "numpy":
+            raise ValueError(f"Collection {name}: {collection.storage} vector storage needs the numpy backend")
+
+def _timed(fn, *args, **kwargs):
+    """Runs fn in the calling (executor) thread and returns (seconds, result)."""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+class Shard:
+    """
+    One named collection: its store handle, its lexical index and the
+    cached counters its stats are served from. A shard is opened once and
+    kept for the life of the service.
+    """
+    def __init__(self, name: str, backend: VectorBackend, lexical: Optional[BM25Index], count: int, search_seconds):
+        self.name = name
+        self.backend = backend
+        self.lexical = lexical
+        self.count = count
+        self.last_ingest: Optional[Dict[str, Any]] = None
+        # This shard's part of each search, fan-out included
+        self.search_seconds = search_seconds
+        self.expired = 0
+        self.last_compaction: Optional[Dict[str, Any]] = None
+        # One sweep/compaction of a shard at a time
+        self.maintenance = asyncio.Lock()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "storage": getattr(self.backend, "storage", "float32"),
+            "bytes_per_vector": getattr(self.backend, "bytes_per_vector", None),
+            "count": self.count,
+            "lexical_count": len(self.lexical) if self.lexical is not None else None,
+            "deleted_rows": self.backend.deleted_rows,
+            "expired": self.expired,
+            "last_ingest": self.last_ingest,
+            "last_compaction": self.last_compaction,
+            "search": self.search_seconds.summary()
+        }
 
 class VectorService:
     """
-    Manages the Vector Database (ChromaDB) for retrieval-augmented generation.
-    Handles document insertion, querying, and persistent storage.
+    Manages the Vector Database for retrieval-augmented generation.
+    Handles document insertion, querying, and persistent storage through a
+    pluggable backend (ChromaDB or an in-memory NumPy index).
+    Embedding and database calls run on a bounded thread pool so they
+    never block the event loop.
+
+    Construction is cheap: the store, the lexical index and the embedding
+    model are opened by initialize(), which start() runs in the background
+    and the first call that needs them awaits.
+
+    Documents live in named collections (shards), each with its own store
+    and lexical index. Calls that name no collection use the default one;
+    a search may span several collections, which are queried concurrently
+    and their hits merged.
     """
-    def __init__(self, db_path: str = "./db"):
-        self.client = chromadb.PersistentClient(path=db_path)
-        # Using default embedding function (can be customized)
-        self.embedding_fn = embedding_functions.DefaultEmbeddingFunction()
-        self.collection = self.client.get_or_create_collection(
-            name="knowledge_base",
-            embedding_function=self.embedding_fn
+    def __init__(
+        self,
+        db_path: str = "./db",
+        config: Optional[KnowledgeBaseConfig] = None,
+        embedding_fn=None,
+        metrics_registry: Optional[MetricsRegistry] = None
+    ):
+        self.config = config or KnowledgeBaseConfig()
+        registry = metrics_registry or MetricsRegistry()
+        self._embedding_seconds = registry.histogram(
+            "kb_embedding_seconds", "Embedding model time", ["op"]
+        )
+        self._search_seconds = registry.histogram("kb_search_seconds", "Vector search time (excluding embedding)")
+        self._lexical_seconds = registry.histogram("kb_lexical_search_seconds", "BM25 search time")
+        self._write_seconds = registry.histogram("kb_write_seconds", "Vector store write time per batch")
+        self._collection_seconds = registry.histogram(
+            "kb_collection_search_seconds", "Search time per collection, embedding excluded", ["collection"]
         )
+        # Using default embedding function unless one is injected (e.g. for offline benchmarks)
+        self.embedding_fn = embedding_fn
+        self.db_path = db_path
+        # Declared collections, and the ones opened so far (all declared ones by initialize())
+        self._collections: Dict[str, CollectionConfig] = {}
+        self.shards: Dict[str, Shard] = {}
+        self._opening: Dict[str, asyncio.Future] = {}
+        self.set_collections(self.config.collections)
+        self.ready = False
+        self.init_error: Optional[str] = None
+        # Seconds spent in each initialization phase
+        self.startup: Dict[str, float] = {}
+        self._init_task: Optional[asyncio.Task] = None
+        self._backfill_tasks = set()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.max_workers,
+            thread_name_prefix="vector"
+        )
+        # Calls submitted to the executor and not yet finished (running + queued)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
 
-    async def add_document(self, content: str, metadata: dict = None):
-        """Adds a document to the knowledge base."""
-        doc_id = str(hash(content))
-        self.collection.add(
-            documents=[content],
-            metadatas=[metadata or {}],
-            ids=[doc_id]
+        # Bumped on every write; cached query results are keyed by it
+        self.version = 0
+        # Writes also touch this file, so processes sharing db_path (cluster
+        # workers) drop their cached results when another one writes
+        self._version_path = os.path.join(db_path, "kb.version")
+        self._version_stamp = self._shared_version()
+        self._embedding_cache = LRUCache(
+            max_entries=self.config.embedding_cache_entries,
+            max_bytes=self.config.embedding_cache_bytes,
+            sizeof=lambda vector: vector.nbytes
         )
-        return doc_id
+        self._result_cache = LRUCache(max_entries=self.config.result_cache_entries)
+        # Identical concurrent searches share one embed + query
+        self._inflight = SingleFlight()
+
+        # Stats are served from these; writes keep them current and the
+        # background reconcile corrects drift, so readers never touch the store
+        self._dimension: Optional[int] = None
+        self._bytes_on_disk = 0
+        self._last_ingest: Optional[Dict[str, Any]] = None
+        self._recent_ingests: deque = deque(maxlen=_RECENT_INGESTS)
+        self._last_reconcile: Optional[Dict[str, Any]] = None
+        self._reconcile_task: Optional[asyncio.Task] = None
+        self._maintenance_task: Optional[asyncio.Task] = None
+
+    @property
+    def backend(self) -> Optional[VectorBackend]:
+        """Store of the default collection."""
+        shard = self.shards.get(self.config.default_collection)
+        return shard.backend if shard is not None else None
+
+    @property
+    def lexical(self) -> Optional[BM25Index]:
+        """Lexical index of the default collection."""
+        shard = self.shards.get(self.config.default_collection)
+        return shard.lexical if shard is not None else None
+
+    @property
+    def _count(self) -> int:
+        return sum(shard.count for shard in self.shards.values())
 
-    async def query(self, query_text: str, n_results: int = 3):
-        """Queries the knowledge base for similar documents."""
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=n_results
+    def configure(self, config: KnowledgeBaseConfig):
+        """
+        Applies a reloaded config. Settings in RESTART_REQUIRED (the backend,
+        executor, caches, lexical index and default collection) keep their
+        running values; the rest, such as collections, chunking, batch size
+        and the background intervals, take effect now.
+        """
+        fixed = [path.split(".", 1)[1] for path in RESTART_REQUIRED if path.startswith("knowledge_base.")]
+        config = config.copy(update={field: getattr(self.config, field) for field in fixed})
+        self.set_collections(config.collections)
+        self.config = config
+        # An interval set to 0 stops its loop; one set from 0 starts it
+        if self._reconcile_task is not None and config.stats_refresh_seconds <= 0:
+            self._reconcile_task.cancel()
+            self._reconcile_task = None
+        if self._maintenance_task is not None and config.compaction.interval_seconds <= 0:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        if self._init_task is not None or self.ready:
+            self._start_loops()
+
+    def set_collections(self, collections: Dict[str, CollectionConfig]):
+        """
+        Declares the named collections besides the default one; applied
+        again on every config reload. Collections added later are opened on
+        first use; removed ones are no longer reachable, though their files
+        are kept. Storage changes take effect when the shard is next opened.
+        """
+        check_collections(self.config.copy(update={"collections": collections}))
+        self._collections = dict(collections)
+
+    def _collection_config(self, name: str) -> CollectionConfig:
+        return self._collections.get(name) or CollectionConfig()
+
+    def collection_names(self) -> List[str]:
+        """The default collection first, then the others as declared."""
+        names = [self.config.default_collection]
+        names.extend(name for name in self._collections if name != names[0])
+        return names
+
+    def _open_shard(self, name: str, phases: Optional[Dict[str, float]] = None) -> Shard:
+        """Opens the store and lexical index of a collection (executor thread), adding their times to `phases`."""
+        phases = {} if phases is None else phases
+        started = time.perf_counter()
+        options = self._collection_config(name)
+        backend = create_backend(
+            self.config.backend, self.db_path, name, self.embedding_fn,
+            storage=options.storage, rerank_factor=options.rerank_factor
         )
-        return results["documents"][0] if results["documents"] else []
+        count = backend.count()
+        phases["db_open"] = phases.get("db_open", 0.0) + time.perf_counter() - started
+        lexical = None
+        if self.config.lexical.enabled:
+            started = time.perf_counter()
+            # The original single collection keeps the index file it had before collections existed
+            filename = "lexical_index" if name == "knowledge_base" else f"lexical_index-{name}"
+            lexical = BM25Index(
+                os.path.join(self.db_path, filename),
+                k1=self.config.lexical.k1,
+                b=self.config.lexical.b,
+                compact_every=self.config.lexical.compact_every
+            )
+            phases["lexical_load"] = phases.get("lexical_load", 0.0) + time.perf_counter() - started
+        return Shard(name, backend, lexical, count, self._collection_seconds.labels(name))
+
+    def _open(self) -> Dict[str, Shard]:
+        """Opens the vector stack (executor thread), recording the time of each phase."""
+        started = time.perf_counter()
+        if self.embedding_fn is None:
+            # Pulls in chromadb and onnxruntime, the bulk of a cold start
+            from chromadb.utils import embedding_functions
+            self.startup["imports"] = time.perf_counter() - started
+            self.embedding_fn = embedding_functions.DefaultEmbeddingFunction()
+        shards = {name: self._open_shard(name, self.startup) for name in self.collection_names()}
+        # The first embedding loads (or downloads) the model; pay for it here, not in a query
+        phase_started = time.perf_counter()
+        self._dimension = len(self.embedding_fn(["warmup"])[0])
+        self.startup["model_warmup"] = time.perf_counter() - phase_started
+        self.startup["total"] = time.perf_counter() - started
+        return shards
+
+    async def initialize(self):
+        """
+        Opens the store and warms up the model once; concurrent callers share
+        the work. Public operations await it, so they wait out a cold start.
+        """
+        if self.ready:
+            return
+        if self._init_task is None:
+            self._init_task = asyncio.ensure_future(self._initialize())
+        await asyncio.shield(self._init_task)
+
+    async def _initialize(self):
+        try:
+            shards = await asyncio.wrap_future(self._executor.submit(self._open))
+        except Exception as e:
+            self.init_error = f"{type(e).__name__}: {e}"
+            self._init_task = None  # The next call retries
+            raise
+        self.shards.update(shards)
+        self.init_error = None
+        self.ready = True
+        for shard in shards.values():
+            self._start_backfill(shard)
+
+    def _start_backfill(self, shard: Shard):
+        """Indexes a store that predates its lexical index once, in the background."""
+        if shard.lexical is not None and len(shard.lexical) < shard.count:
+            task = asyncio.get_running_loop().create_task(self._backfill(shard))
+            self._backfill_tasks.add(task)
+            task.add_done_callback(self._backfill_tasks.discard)
+
+    async def _shard(self, name: Optional[str]) -> Shard:
+        """
+        Returns the open shard of a declared collection (the default one
+        for None), opening it on first use; concurrent callers share the open.
+        """
+        await self.initialize()
+        name = name or self.config.default_collection
+        if name != self.config.default_collection and name not in self._collections:
+            raise ValueError(f"Unknown collection: {name} (expected one of {', '.join(self.collection_names())})")
+        shard = self.shards.get(name)
+        if shard is not None:
+            return shard
+        opening = self._opening.get(name)
+        if opening is None:
+            opening = asyncio.ensure_future(self._run(self._open_shard, name))
+            self._opening[name] = opening
+            opening.add_done_callback(lambda _: self._opening.pop(name, None))
+        shard = await asyncio.shield(opening)
+        if name not in self.shards:
+            self.shards[name] = shard
+            self._start_backfill(shard)
+        return self.shards[name]
+
+    async def _resolve(self, collections: Union[None, str, Iterable[str]]) -> List[Shard]:
+        """Shards for a `collections` argument: one name, several, "*" for all, or None for the default."""
+        if collections is None or isinstance(collections, str) and collections != "*":
+            return [await self._shard(collections)]
+        names = self.collection_names() if collections == "*" else list(dict.fromkeys(collections))
+        if not names:
+            raise ValueError("No collections given")
+        return list(await asyncio.gather(*(self._shard(name) for name in names)))
+
+    async def _run(self, fn, *args, **kwargs):
+        """Runs a blocking call on the executor, rejecting it when the queue is full."""
+        limit = self.config.max_workers + self.config.max_queue
+        if self._pending >= limit:
+            raise VectorServiceOverloaded(
+                f"Knowledge base is overloaded ({self._pending} calls pending, limit {limit}); retry later"
+            )
+        with self._pending_lock:
+            self._pending += 1
+        future = self._executor.submit(partial(fn, *args, **kwargs))
+        # Released when the call really finishes, even if the awaiting task is cancelled
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    async def _run_timed(self, histogram, fn, *args, **kwargs):
+        """Like _run, recording the call's execution time (not its queue wait) in `histogram`."""
+        elapsed, result = await self._run(_timed, fn, *args, **kwargs)
+        histogram.observe(elapsed)
+        return result
+
+    def _release(self, _future):
+        with self._pending_lock:
+            self._pending -= 1
+
+    async def add_document(
+        self, content: str, metadata: dict = None, collection: Optional[str] = None, ttl: Optional[float] = None
+    ):
+        """
+        Adds a document to a collection (the default one unless named),
+        chunking it when it is larger than the configured window. Returns
+        the (parent) document ID.
+        """
+        async for _ in self.iter_add_documents([(content, metadata)], collection=collection, ttl=ttl):
+            pass
+        return document_id(content)
+
+    def _split(self, content: str, metadata: Optional[dict]) -> Iterator[StoredRecord]:
+        """
+        Lazily expands a document into stored records. A document that fits in
+        one window is stored as-is under its own ID; larger ones become chunks
+        that carry their parent's ID and offsets in their metadata.
+        """
+        parent_id = document_id(content)
+        chunking = self.config.chunking
+        if not chunking.enabled:
+            yield parent_id, content, metadata
+            return
+        chunks = iter_chunks(content, chunking.size, chunking.overlap, chunking.unit)
+        first = next(chunks)
+        second = next(chunks, None)
+        if second is None:
+            yield parent_id, content, metadata
+            return
+        for chunk in (first, second):
+            yield self._chunk_record(parent_id, chunk, metadata)
+        for chunk in chunks:
+            yield self._chunk_record(parent_id, chunk, metadata)
+
+    @staticmethod
+    def _chunk_record(parent_id: str, chunk, metadata: Optional[dict]) -> StoredRecord:
+        chunk_metadata = {
+            **(metadata or {}),
+            "parent_id": parent_id,
+            "chunk_index": chunk.index,
+            "chunk_start": chunk.start,
+            "chunk_end": chunk.end
+        }
+        return f"{parent_id}-{chunk.index}", chunk.text, chunk_metadata
+
+    async def _write_batch(
+        self, shard: Shard, ids: List[str], documents: List[str], metadatas: List[Optional[dict]], embeddings=None
+    ) -> Tuple[List[str], int]:
+        """Runs a batch write on the executor and invalidates cached query results."""
+        new_ids, skipped, embed_seconds, write_seconds = await self._run(
+            self._add_batch, shard, ids, documents, metadatas, embeddings
+        )
+        if new_ids:
+            if embeddings is None:
+                self._embedding_seconds.observe("ingest", value=embed_seconds)
+            self._write_seconds.observe(value=write_seconds)
+            shard.count += len(new_ids)
+            self._bump_version()
+        return new_ids, skipped
+
+    def _bump_version(self):
+        """Marks the collection as changed so cached results are no longer served, here and in other processes."""
+        self.version += 1
+        self._result_cache.clear()
+        try:
+            with open(self._version_path, "a"):
+                pass
+            # Strictly later than the current stamp, so a coarse clock still changes it
+            stamp = max(time.time_ns(), (self._shared_version() or 0) + 1)
+            os.utime(self._version_path, ns=(stamp, stamp))
+            self._version_stamp = self._shared_version()
+        except OSError:
+            pass  # Only other processes' caches depend on it
+
+    def _shared_version(self) -> Optional[int]:
+        try:
+            return os.stat(self._version_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_shared_version(self):
+        """Drops cached results when another process sharing db_path has written since."""
+        stamp = self._shared_version()
+        if stamp != self._version_stamp:
+            self._version_stamp = stamp
+            self.version += 1
+            self._result_cache.clear()
+
+    def _add_batch(
+        self, shard: Shard, ids: List[str], documents: List[str], metadatas: List[Optional[dict]], embeddings=None
+    ) -> Tuple[List[str], int, float, float]:
+        """
+        Writes the documents whose IDs are not stored yet: one existence
+        lookup, one embedding call and one backend write per batch.
+        Rows that come with their `embeddings` (a snapshot import) are not
+        embedded again. Returns the added IDs, the number of skipped
+        duplicates and the embedding and write times.
+        """
+        existing = shard.backend.existing_ids(ids)
+        new_ids, new_documents, new_metadatas, kept = [], [], [], []
+        for row, (doc_id, content, metadata) in enumerate(zip(ids, documents, metadatas)):
+            if doc_id in existing:
+                continue
+            # Also drops repeats within the batch itself
+            existing.add(doc_id)
+            new_ids.append(doc_id)
+            new_documents.append(content)
+            new_metadatas.append(metadata)
+            kept.append(row)
+        embed_seconds = write_seconds = 0.0
+        if new_ids:
+            if embeddings is None:
+                embed_seconds, embeddings = _timed(self.embedding_fn, new_documents)
+                self._dimension = len(embeddings[0])
+            else:
+                embeddings = embeddings[kept]
+            write_seconds, _ = _timed(self._store, shard, new_ids, new_documents, embeddings, new_metadatas)
+        return new_ids, len(ids) - len(new_ids), embed_seconds, write_seconds
+
+    def _store(self, shard: Shard, ids: List[str], documents: List[str], embeddings, metadatas: List[Optional[dict]]):
+        """Writes rows to the shard's vector store, then to its lexical index."""
+        shard.backend.add_many(ids, documents, embeddings, metadatas)
+        if shard.lexical is not None:
+            shard.lexical.add_many(ids, documents, metadatas)
+
+    def _delete(self, shard: Shard, ids: List[str], chunks: bool = True) -> int:
+        """Deletes rows by ID, with `chunks` also the chunks of documents stored chunked."""
+        ids = list(ids)
+        if chunks and ids:
+            ids.extend(shard.backend.ids_where({"parent_id": {"$in": ids}}))
+        removed = shard.backend.delete(ids)
+        if shard.lexical is not None:
+            shard.lexical.delete(ids)
+        return removed
+
+    async def delete_documents(self, ids: List[str], collection: Optional[str] = None) -> int:
+        """
+        Deletes documents of a collection by ID, including every chunk of a
+        chunked document, and returns how many rows were removed. The space
+        is reclaimed by the next compaction.
+        """
+        return await self._remove(await self._shard(collection), ids)
+
+    async def _remove(self, shard: Shard, ids: List[str], chunks: bool = True) -> int:
+        removed = await self._run(self._delete, shard, ids, chunks)
+        if removed:
+            shard.count -= removed
+            self._bump_version()
+        return removed
+
+    async def expire_documents(self, collection: Optional[str] = None) -> int:
+        """Deletes the rows of a collection whose `expires_at` has passed and returns how many."""
+        shard = await self._shard(collection)
+        ids = await self._run(shard.backend.ids_where, {"expires_at": {"$lte": time.time()}})
+        # Chunks carry their parent's expiry, so they match on their own
+        removed = await self._remove(shard, ids, chunks=False) if ids else 0
+        shard.expired += removed
+        return removed
+
+    async def compact(self, collection: Optional[str] = None, force: bool = True) -> Dict[str, Any]:
+        """
+        Sweeps expired documents from a collection, then reclaims the space
+        of its deleted rows in the store and the lexical index. Without
+        `force`, space is only reclaimed once compaction.min_deleted_fraction
+        of the stored rows are deleted. The work runs on the executor and
+        the store keeps serving searches meanwhile.
+        """
+        shard = await self._shard(collection)
+        async with shard.maintenance:
+            started = time.perf_counter()
+            expired = await self.expire_documents(shard.name)
+            deleted = shard.backend.deleted_rows
+            threshold = self.config.compaction.min_deleted_fraction * (deleted + shard.count)
+            compacted = deleted > 0 and (force or deleted >= threshold)
+            bytes_freed = await self._run(self._compact_shard, shard) if compacted else 0
+            result = {
+                "finished_at": time.time(),
+                "duration": round(time.perf_counter() - started, 3),
+                "expired": expired,
+                "rows_reclaimed": deleted if compacted else 0,
+                "bytes_freed": bytes_freed,
+                "error": None
+            }
+            # Background rounds that found nothing to do do not hide the last real one
+            if force or expired or compacted:
+                shard.last_compaction = result
+            return result
+
+    @staticmethod
+    def _compact_shard(shard: Shard) -> int:
+        bytes_freed = shard.backend.compact()
+        if shard.lexical is not None:
+            shard.lexical.compact()
+        return bytes_freed
+
+    async def iter_add_documents(
+        self,
+        records: Union[Iterable[DocumentRecord], AsyncIterable[DocumentRecord]],
+        batch_size: Optional[int] = None,
+        collection: Optional[str] = None,
+        ttl: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Ingests (content, metadata) records into a collection in batches,
+        consuming the input lazily. Large documents are chunked on the fly;
+        added/skipped count stored rows. Rows already in the collection are
+        skipped before embedding. Yields a progress report after each batch
+        is written.
+
+        Documents expire `ttl` seconds after they are added (the
+        collection's ttl_seconds by default): their rows carry an
+        `expires_at` timestamp and the background sweep deletes them.
+        Re-adding a stored document does not extend its lifetime.
+        """
+        shard = await self._shard(collection)
+        batch_size = batch_size or self.config.batch_size
+        if ttl is None:
+            ttl = self._collection_config(shard.name).ttl_seconds
+        started = time.perf_counter()
+        documents_seen = 0
+        added = 0
+        skipped = 0
+        batches = 0
+
+        async def stored_records() -> AsyncIterator[StoredRecord]:
+            nonlocal documents_seen
+            async for content, metadata in _aiterate(records):
+                documents_seen += 1
+                if ttl is not None:
+                    metadata = {**(metadata or {}), "expires_at": round(time.time() + ttl, 3)}
+                for record in self._split(content, metadata):
+                    yield record
+
+        try:
+            async for batch in _batched(stored_records(), batch_size):
+                ids = [doc_id for doc_id, _, _ in batch]
+                documents = [content for _, content, _ in batch]
+                metadatas = [metadata for _, _, metadata in batch]
+                new_ids, batch_skipped = await self._write_batch(shard, ids, documents, metadatas)
+                added += len(new_ids)
+                skipped += batch_skipped
+                batches += 1
+                elapsed = time.perf_counter() - started
+                yield {
+                    "batch": batches,
+                    "batch_size": len(batch),
+                    "documents": documents_seen,
+                    "added": added,
+                    "skipped": skipped,
+                    "ids": new_ids,
+                    "elapsed": round(elapsed, 3),
+                    "docs_per_sec": round((added + skipped) / elapsed, 1) if elapsed > 0 else 0.0
+                }
+        finally:
+            # Recorded even when the caller stops early or a batch fails
+            if batches:
+                self._last_ingest = shard.last_ingest = {
+                    "collection": shard.name,
+                    "finished_at": time.time(),
+                    "duration": round(time.perf_counter() - started, 3),
+                    "documents": documents_seen,
+                    "added": added,
+                    "skipped": skipped
+                }
+                self._recent_ingests.append(self._last_ingest)
+
+    async def add_documents(
+        self,
+        documents: Iterable[str],
+        metadatas: Optional[Iterable[Optional[dict]]] = None,
+        batch_size: Optional[int] = None,
+        collection: Optional[str] = None,
+        ttl: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Adds many documents to a collection, embedding and writing them in batches."""
+        if metadatas is None:
+            records = ((content, None) for content in documents)
+        else:
+            records = zip(documents, metadatas)
+        ids: List[str] = []
+        progress: Dict[str, Any] = {"documents": 0, "added": 0, "skipped": 0, "batch": 0, "docs_per_sec": 0.0}
+        async for progress in self.iter_add_documents(records, batch_size, collection, ttl):
+            ids.extend(progress["ids"])
+        return {
+            "ids": ids,
+            "documents": progress["documents"],
+            "added": progress["added"],
+            "skipped": progress["skipped"],
+            "batches": progress["batch"],
+            "docs_per_sec": progress["docs_per_sec"]
+        }
+
+    def recent_ingests(self) -> List[Dict[str, Any]]:
+        """Summaries of the latest ingests, newest first."""
+        return list(reversed(self._recent_ingests))
+
+    async def iter_document(
+        self, doc_id: str, collection: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Optional[dict]]]:
+        """
+        Yields the stored text of a document with its metadata, without
+        loading more than one batch of rows at a time. A chunked document is
+        reassembled from its chunks in order with their overlap removed;
+        whitespace between token windows comes back as a single space.
+        Yields nothing for an unknown ID.
+        """
+        shard = await self._shard(collection)
+        hits = await self._run(shard.backend.get, [doc_id])
+        if hits.ids:
+            yield hits.documents[0], hits.metadatas[0]
+            return
+        batch_size = self.config.batch_size
+        emitted = 0  # Offset into the parent up to which text has been yielded
+        index = 0
+        while True:
+            ids = [f"{doc_id}-{i}" for i in range(index, index + batch_size)]
+            hits = await self._run(shard.backend.get, ids)
+            for text, metadata in zip(hits.documents, hits.metadatas):
+                start = metadata["chunk_start"]
+                if start > emitted and emitted:
+                    text = " " + text
+                elif start < emitted:
+                    text = text[emitted - start:]
+                emitted = metadata["chunk_end"]
+                yield text, {k: v for k, v in metadata.items() if k not in _CHUNK_KEYS}
+            if len(hits.ids) < batch_size:
+                return
+            index += batch_size
+
+    def _embedding_name(self) -> str:
+        name = getattr(self.embedding_fn, "name", None)
+        return name() if callable(name) else type(self.embedding_fn).__name__
+
+    def _export_batch(self, batches: Iterator, compression: str) -> Optional[Tuple[bytes, int]]:
+        batch = next(batches, None)
+        if batch is None:
+            return None
+        hits, embeddings = batch
+        return encode_batch(hits.ids, hits.documents, hits.metadatas, embeddings, compression), len(hits.ids)
+
+    async def iter_export(self, collection: Optional[str] = None, compression: str = "zlib") -> AsyncIterator[bytes]:
+        """
+        Streams a snapshot of a collection (see snapshot.py): every stored
+        row with its raw embedding, read, encoded and compressed one batch
+        at a time on the executor. Rows written while the export runs may
+        or may not be included.
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression} (expected one of {', '.join(COMPRESSIONS)})")
+        shard = await self._shard(collection)
+        batches = shard.backend.scan_embeddings(self.config.batch_size)
+        # The first batch is read before the header is yielded, so an unknown
+        # collection or a full executor fails before anything is sent
+        encoded = await self._run(self._export_batch, batches, compression)
+        yield encode_header({
+            "collection": shard.name,
+            "dimension": self._dimension,
+            "compression": compression,
+            "embedding_function": self._embedding_name(),
+            "created_at": time.time()
+        })
+        rows = 0
+        while encoded is not None:
+            rows += encoded[1]
+            yield encoded[0]
+            encoded = await self._run(self._export_batch, batches, compression)
+        yield encode_end(rows)
+
+    def _check_snapshot(self, header: Dict[str, Any]):
+        if header["dimension"] != self._dimension:
+            raise SnapshotError(
+                f"Snapshot embeddings have {header['dimension']} dimensions; the embedding model produces {self._dimension}"
+            )
+        name = self._embedding_name()
+        if header.get("embedding_function") not in (None, name):
+            raise SnapshotError(
+                f"Snapshot was embedded with {header['embedding_function']}; this server embeds queries with {name}"
+            )
+
+    async def iter_import(
+        self, chunks: Union[Iterable[bytes], AsyncIterable[bytes]], collection: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Loads a snapshot stream into a collection (the default one unless
+        named, whichever collection it was exported from). The stored
+        embeddings are written as they are, never recomputed; rows whose
+        IDs are already stored are skipped. Yields a progress report after
+        each batch is written.
+        """
+        shard = await self._shard(collection)
+        reader = SnapshotReader()
+        started = time.perf_counter()
+        rows = added = skipped = batches = 0
+        async for chunk in _aiterate(chunks):
+            for kind, payload in reader.feed(chunk):
+                if kind == "header":
+                    self._check_snapshot(payload)
+                elif kind == "batch":
+                    batch = await self._run(decode_batch, payload, reader.header)
+                    new_ids, batch_skipped = await self._write_batch(
+                        shard, batch.ids, batch.documents, batch.metadatas, batch.embeddings
+                    )
+                    rows += len(batch.ids)
+                    added += len(new_ids)
+                    skipped += batch_skipped
+                    batches += 1
+                    elapsed = time.perf_counter() - started
+                    yield {
+                        "batch": batches,
+                        "rows": rows,
+                        "added": added,
+                        "skipped": skipped,
+                        "elapsed": round(elapsed, 3),
+                        "rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else 0.0
+                    }
+                elif payload["rows"] != rows:
+                    raise SnapshotError(f"Snapshot declares {payload['rows']} rows but holds {rows}")
+        reader.close()
+
+    async def _embed_query(self, query_text: str) -> np.ndarray:
+        """Returns the embedding of a query, computing it only on a cache miss."""
+        key = normalize_text(query_text)
+        embedding = self._embedding_cache.get(key)
+        if embedding is None:
+            embeddings = await self._run_timed(self._embedding_seconds.labels("query"), self.embedding_fn, [key])
+            embedding = np.asarray(embeddings[0], dtype=np.float32)
+            self._embedding_cache.put(key, embedding)
+        return embedding
+
+    async def query(
+        self,
+        query_text: str,
+        n_results: int = 3,
+        where: Optional[dict] = None,
+        collapse: bool = False,
+        mode: str = "vector",
+        collections: Union[None, str, List[str]] = None
+    ):
+        """
+        Queries the knowledge base. `mode` selects dense similarity
+        ("vector"), BM25 ("lexical") or both fused with reciprocal rank
+        fusion ("hybrid"). With `collapse`, only the best-matching chunk of
+        each parent document is returned. `collections` is a collection
+        name, a list of names or "*" for all of them; None searches the
+        default collection.
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode} (expected one of {', '.join(SEARCH_MODES)})")
+        if mode != "vector" and not self.config.lexical.enabled:
+            raise ValueError("Lexical search is disabled (knowledge_base.lexical.enabled)")
+        shards = await self._resolve(collections)
+        self._check_shared_version()
+        # The version is captured before searching so a result computed while a
+        # write lands is stored under the old version and never served after it
+        key = (
+            self.version,
+            tuple(shard.name for shard in shards),
+            normalize_text(query_text),
+            n_results,
+            json.dumps(where, sort_keys=True) if where else None,
+            collapse,
+            mode
+        )
+        cached = self._result_cache.get(key)
+        if cached is None:
+            cached = await self._inflight.do(
+                key, lambda: self._search(key, shards, query_text, n_results, where, collapse, mode)
+            )
+        return list(cached)
+
+    async def _vector_hits(self, shard: Shard, embedding: Awaitable[np.ndarray], fetch: int, where: Optional[dict]) -> SearchHits:
+        return await self._run_timed(self._search_seconds.labels(), shard.backend.query, await embedding, fetch, where)
+
+    def _lexical_hits(self, shard: Shard, query_text: str, fetch: int, where: Optional[dict]) -> SearchHits:
+        """BM25 top hits with their stored documents; distances are negated scores."""
+        ranked = shard.lexical.search(query_text, fetch, where)
+        hits = shard.backend.get([doc_id for doc_id, _ in ranked])
+        scores = dict(ranked)
+        return hits._replace(distances=[-scores[doc_id] for doc_id in hits.ids])
+
+    def _fuse(self, vector: SearchHits, lexical: SearchHits, fetch: int) -> SearchHits:
+        """Reciprocal rank fusion; distances are negated fused scores."""
+        k = self.config.lexical.rrf_k
+        scores: Dict[str, float] = {}
+        rows: Dict[str, Tuple[str, Optional[dict]]] = {}
+        for hits in (vector, lexical):
+            for rank, (doc_id, document, metadata) in enumerate(zip(hits.ids, hits.documents, hits.metadatas)):
+                scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+                rows[doc_id] = (document, metadata)
+        ranked = sorted(scores, key=scores.get, reverse=True)[:fetch]
+        return SearchHits(
+            ids=ranked,
+            documents=[rows[doc_id][0] for doc_id in ranked],
+            metadatas=[rows[doc_id][1] for doc_id in ranked],
+            distances=[-scores[doc_id] for doc_id in ranked]
+        )
+
+    async def _shard_hits(
+        self,
+        shard: Shard,
+        query_text: str,
+        embedding: Optional[Awaitable[np.ndarray]],
+        fetch: int,
+        where: Optional[dict],
+        mode: str
+    ) -> SearchHits:
+        """Searches one shard in the given mode, recording its latency."""
+        started = time.perf_counter()
+        if mode == "vector":
+            hits = await self._vector_hits(shard, embedding, fetch, where)
+        elif mode == "lexical":
+            hits = await self._run_timed(
+                self._lexical_seconds.labels(), self._lexical_hits, shard, query_text, fetch, where
+            )
+        else:
+            # Each ranking is fetched deeper than the final cut so fusion has overlap to work with
+            depth = max(fetch * 2, 10)
+            vector, lexical = await asyncio.gather(
+                self._vector_hits(shard, embedding, depth, where),
+                self._run_timed(self._lexical_seconds.labels(), self._lexical_hits, shard, query_text, depth, where)
+            )
+            hits = self._fuse(vector, lexical, fetch)
+        shard.search_seconds.observe(time.perf_counter() - started)
+        return hits
+
+    @staticmethod
+    def _merge(results: List[SearchHits], fetch: int) -> SearchHits:
+        """
+        Merges per-shard hits, each already sorted by distance, into the
+        overall top `fetch` with a heap, reading no further than needed.
+        """
+        rows = heapq.merge(
+            *(zip(hits.distances, hits.ids, hits.documents, hits.metadatas) for hits in results),
+            key=lambda row: row[0]
+        )
+        top = list(islice(rows, fetch))
+        return SearchHits(
+            ids=[row[1] for row in top],
+            documents=[row[2] for row in top],
+            metadatas=[row[3] for row in top],
+            distances=[row[0] for row in top]
+        )
+
+    async def _search(
+        self,
+        key: tuple,
+        shards: List[Shard],
+        query_text: str,
+        n_results: int,
+        where: Optional[dict],
+        collapse: bool,
+        mode: str
+    ) -> Tuple[str, ...]:
+        """
+        Runs one search in the given mode, caching the result under `key`.
+        Several shards are searched concurrently, sharing one query
+        embedding, and each returns its own top `fetch` for the merge.
+        BM25 and fused scores are per-shard, so across shards they rank
+        approximately rather than exactly.
+        """
+        fetch = n_results * _COLLAPSE_OVERFETCH if collapse else n_results
+        # Started once, awaited by every shard's vector search
+        embedding = asyncio.ensure_future(self._embed_query(query_text)) if mode != "lexical" else None
+        if len(shards) == 1:
+            hits = await self._shard_hits(shards[0], query_text, embedding, fetch, where, mode)
+        else:
+            hits = self._merge(await asyncio.gather(
+                *(self._shard_hits(shard, query_text, embedding, fetch, where, mode) for shard in shards)
+            ), fetch)
+        if collapse:
+            documents = self._collapse(hits, n_results)
+        else:
+            documents = tuple(hits.documents)
+        if key[0] == self.version:
+            self._result_cache.put(key, documents)
+        return documents
+
+    @staticmethod
+    def _collapse(hits: SearchHits, n_results: int) -> Tuple[str, ...]:
+        """Keeps the first (best) hit per parent document, in rank order."""
+        seen = set()
+        documents = []
+        for doc_id, document, metadata in zip(hits.ids, hits.documents, hits.metadatas):
+            parent_id = (metadata or {}).get("parent_id", doc_id)
+            if parent_id in seen:
+                continue
+            seen.add(parent_id)
+            documents.append(document)
+            if len(documents) == n_results:
+                break
+        return tuple(documents)
+
+    def _disk_usage(self) -> int:
+        """Sums the size of every file under the store directory."""
+        total = 0
+        for root, _, files in os.walk(self.db_path):
+            for filename in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, filename))
+                except OSError:
+                    pass  # Removed while walking (e.g. a compaction temp file)
+        return total
+
+    def _read_store_stats(self, shards: List[Shard]) -> Tuple[List[int], Optional[int], int]:
+        counts = [shard.backend.count() for shard in shards]
+        dimensions = [shard.backend.dimension() for shard in shards]
+        dimension = next((d for d in dimensions if d is not None), None)
+        return counts, dimension, self._disk_usage()
+
+    async def reconcile_stats(self):
+        """
+        Re-reads the count of every open collection, the dimension and the
+        disk usage from the stores on the executor. Counts read while a write
+        landed are discarded; the incremental counters already reflect it.
+        """
+        await self.initialize()
+        version = self.version
+        started = time.perf_counter()
+        shards = list(self.shards.values())
+        counts, dimension, bytes_on_disk = await self._run(self._read_store_stats, shards)
+        if self.version == version:
+            for shard, count in zip(shards, counts):
+                shard.count = count
+        if dimension is not None:
+            self._dimension = dimension
+        self._bytes_on_disk = bytes_on_disk
+        self._last_reconcile = {
+            "finished_at": time.time(),
+            "duration": round(time.perf_counter() - started, 3),
+            "error": None
+        }
+
+    async def _reconcile_loop(self):
+        while True:
+            try:
+                await self.reconcile_stats()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Keep serving the last known values; the next round retries
+                self._last_reconcile = {"finished_at": time.time(), "duration": None, "error": str(e)}
+            await asyncio.sleep(self.config.stats_refresh_seconds)
+
+    async def _maintenance_loop(self):
+        """Sweeps expired documents and compacts collections with enough deleted rows."""
+        while True:
+            await asyncio.sleep(self.config.compaction.interval_seconds)
+            for name in [name for name in self.collection_names() if name in self.shards]:
+                try:
+                    await self.compact(name, force=False)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Retried in the next round
+                    self.shards[name].last_compaction = {"finished_at": time.time(), "error": str(e)}
+
+    def start(self):
+        """
+        Starts initialization (ending with a warmup embedding), the periodic
+        stats reconcile and the expiry/compaction sweep in the background;
+        needs a running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if not self.ready and self._init_task is None:
+            self._init_task = loop.create_task(self._initialize())
+            # A failure is reported in init_error and retried by the next call
+            self._init_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        self._start_loops()
+
+    def _start_loops(self):
+        loop = asyncio.get_running_loop()
+        if self._reconcile_task is None and self.config.stats_refresh_seconds > 0:
+            self._reconcile_task = loop.create_task(self._reconcile_loop())
+        if self._maintenance_task is None and self.config.compaction.interval_seconds > 0:
+            self._maintenance_task = loop.create_task(self._maintenance_loop())
+
+    async def _backfill(self, shard: Shard):
+        await self._run(self._backfill_lexical, shard)
+        # Lexical results cached while the index was incomplete are dropped
+        self._bump_version()
+
+    def _backfill_lexical(self, shard: Shard):
+        """Indexes stored rows missing from a lexical index (e.g. written before it existed)."""
+        for hits in shard.backend.scan(self.config.batch_size):
+            missing = [i for i, doc_id in enumerate(hits.ids) if doc_id not in shard.lexical]
+            if missing:
+                shard.lexical.add_many(
+                    [hits.ids[i] for i in missing],
+                    [hits.documents[i] for i in missing],
+                    [hits.metadatas[i] for i in missing]
+                )
 
     def get_stats(self):
-        """Returns collection statistics."""
+        """
+        Returns statistics from cached counters; never queries the store.
+        Counts are summed over the open collections, which are also
+        reported one by one.
+        """
+        lexical_counts = [len(shard.lexical) for shard in self.shards.values() if shard.lexical is not None]
         return {
-            "count": self.collection.count()
+            "backend": self.config.backend,
+            "ready": self.ready,
+            "init_error": self.init_error,
+            "count": self._count,
+            "lexical_count": sum(lexical_counts) if lexical_counts else None,
+            "default_collection": self.config.default_collection,
+            "collections": {name: shard.get_stats() for name, shard in self.shards.items()},
+            "dimension": self._dimension,
+            "bytes_on_disk": self._bytes_on_disk,
+            "last_ingest": self._last_ingest,
+            "last_reconcile": self._last_reconcile,
+            "pending": self._pending,
+            "version": self.version,
+            "coalesced": self._inflight.coalesced,
+            "caches": {
+                "embedding": self._embedding_cache.stats(),
+                "results": self._result_cache.stats()
+            },
+            "timings": {
+                "embedding_query": self._embedding_seconds.labels("query").summary(),
+                "embedding_ingest": self._embedding_seconds.labels("ingest").summary(),
+                "search": self._search_seconds.labels().summary(),
+                "lexical_search": self._lexical_seconds.labels().summary(),
+                "write": self._write_seconds.labels().summary()
+            }
         }
+
+    def close(self):
+        """Stops the background loops and the executor, waiting for in-flight calls to finish."""
+        for task in (self._reconcile_task, self._maintenance_task):
+            if task is not None:
+                task.cancel()
+        self._reconcile_task = self._maintenance_task = None
+        self._executor.shutdown(wait=True)
@@ -1,11 +1,17 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 import json
+import threading
 import time
 import pandas as pd
 
 # --- Configuration ---
 BACKEND_URL = "http://localhost:8000"
+TIMEOUT = (3.05, 10)  # (connect, read) seconds; a down backend fails fast instead of hanging
+INGEST_TIMEOUT = (3.05, 300)  # Large ingests stream progress, but each batch can take a while
+CACHE_TTL = 2.0  # Seconds a GET response is reused without asking the backend
+INGEST_BATCH_LINES = 500  # NDJSON lines per chunk of an ingest upload
 
 st.set_page_config(
     page_title="FastAPI_MCP_PoC Dashboard",
@@ -138,30 +144,124 @@ menu = st.sidebar.radio("Navigate", [
 ])
 
 # --- Helper Functions ---
+@st.cache_resource
+def get_client():
+    """One pooled HTTP session shared by every rerun and browser session."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_response_cache():
+    """path -> (fetched_at, etag, body) of recent GETs, shared like the client."""
+    return {}, threading.Lock()
+
+def cached_get(path):
+    """
+    GETs a JSON endpoint, reusing the last body for CACHE_TTL seconds.
+    After that the request carries the last ETag, and a 304 reuses the
+    body without transferring it again.
+    """
+    cache, lock = get_response_cache()
+    with lock:
+        entry = cache.get(path)
+    if entry and time.monotonic() - entry[0] < CACHE_TTL:
+        return entry[2]
+    headers = {"If-None-Match": entry[1]} if entry and entry[1] else {}
+    response = get_client().get(f"{BACKEND_URL}{path}", headers=headers, timeout=TIMEOUT)
+    if response.status_code == 304 and entry:
+        body = entry[2]
+    else:
+        response.raise_for_status()
+        body = response.json()
+    with lock:
+        cache[path] = (time.monotonic(), response.headers.get("ETag"), body)
+    return body
+
+def invalidate(path):
+    cache, lock = get_response_cache()
+    with lock:
+        cache.pop(path, None)
+
 def get_metrics():
     try:
-        response = requests.get(f"{BACKEND_URL}/metrics")
-        return response.json()
-    except:
+        return cached_get("/metrics")
+    except requests.RequestException:
         return None
 
 def get_config():
+    """The current YAML, its version and the settings waiting for a restart."""
+    try:
+        return cached_get("/config")
+    except requests.RequestException:
+        return {}
+
+def get_logs(cursor=None, **filters):
+    """Fetches log events newer than `cursor` (the newest ones when None)."""
+    params = {k: v for k, v in filters.items() if v}
+    if cursor is not None:
+        params["cursor"] = cursor
     try:
-        response = requests.get(f"{BACKEND_URL}/config")
-        return response.json().get("yaml", "")
-    except:
-        return ""
+        response = get_client().get(f"{BACKEND_URL}/logs", params={**params, "limit": 500}, timeout=TIMEOUT)
+        return response.json()
+    except requests.RequestException:
+        return None
 
 def update_config(yaml_content):
     try:
-        response = requests.post(
+        response = get_client().post(
             f"{BACKEND_URL}/config/update",
-            json={"yaml": yaml_content}
+            json={"yaml": yaml_content},
+            timeout=TIMEOUT
+        )
+        invalidate("/config")
+        return response.json()
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+def search_kb(query, n_results, mode, collections=None):
+    try:
+        response = get_client().post(
+            f"{BACKEND_URL}/kb/search",
+            json={"query": query, "n_results": n_results, "mode": mode, "collapse": True, "collection": collections},
+            timeout=TIMEOUT
         )
         return response.json()
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+def iter_ndjson_chunks(records):
+    """Encodes (content, metadata) records as NDJSON, several lines per chunk."""
+    lines = []
+    for content, metadata in records:
+        lines.append(json.dumps({"content": content, "metadata": metadata} if metadata else content))
+        if len(lines) == INGEST_BATCH_LINES:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+def ingest_kb(records, collection=None):
+    """
+    Streams records to the bulk-ingest endpoint (chunked upload) and yields
+    its NDJSON progress reports as they arrive.
+    """
+    with get_client().post(
+        f"{BACKEND_URL}/kb/ingest",
+        params={"collection": collection} if collection else None,
+        data=iter_ndjson_chunks(records),
+        headers={"Content-Type": "application/x-ndjson"},
+        stream=True,
+        timeout=INGEST_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+    invalidate("/metrics")
+
 # --- Dashboard View ---
 if menu == "📊 Dashboard":
     st.header("🚀 Server Performance")
@@ -245,23 +345,86 @@ if menu == "📊 Dashboard":
 # --- Knowledge Base View ---
 elif menu == "🧠 Knowledge Base":
     st.header("🧠 Vector Knowledge Base")
+    collections = list((get_metrics() or {}).get("kb_collections") or {}) or [None]
     
     with st.container(border=True):
         st.subheader("📝 Ingest Context")
+        target = st.selectbox("Collection", collections, format_func=lambda name: name or "default")
         content = st.text_area("Drop document content or snippets here...", height=250)
+        uploaded = st.file_uploader("...or upload files", type=["txt", "md", "jsonl", "ndjson"], accept_multiple_files=True)
+        split = st.radio("Split text into", ["One document per file", "One document per line"], horizontal=True)
         if st.button("🚀 Push to ChromaDB"):
-            st.toast("Processing vector embeddings...")
-            st.success("Knowledge synchronized with the neural index.")
+            records, problems = [], []
+            texts = ([("pasted", content)] if content.strip() else []) + [
+                (f.name, f.getvalue().decode("utf-8", errors="replace")) for f in uploaded or []
+            ]
+            for source, text in texts:
+                if source.endswith((".jsonl", ".ndjson")):
+                    for number, line in enumerate(text.splitlines(), 1):
+                        if not line.strip():
+                            continue
+                        try:
+                            item = json.loads(line)
+                            records.append((item, None) if isinstance(item, str) else (item["content"], item.get("metadata")))
+                        except ValueError as e:
+                            problems.append(f"{source}, line {number}: {e}")
+                        except (KeyError, TypeError):
+                            problems.append(f"{source}, line {number}: expected a string or an object with a \"content\" field")
+                elif split == "One document per line":
+                    records.extend((line, {"source": source}) for line in text.splitlines() if line.strip())
+                else:
+                    records.append((text, {"source": source}))
+            if problems:
+                st.error("Could not parse the upload:\n\n" + "\n".join(f"- {problem}" for problem in problems[:10]))
+            elif not records:
+                st.warning("Nothing to ingest.")
+            else:
+                progress = st.progress(0.0, text=f"Embedding {len(records)} documents...")
+                summary = None
+                try:
+                    for report in ingest_kb(records, target):
+                        if "status" in report:
+                            summary = report
+                        else:
+                            progress.progress(
+                                min(report["documents"] / len(records), 1.0),
+                                text=f"{report['documents']}/{len(records)} documents · {report['docs_per_sec']} docs/s"
+                            )
+                except (requests.RequestException, ValueError) as e:
+                    summary = {"status": "error", "message": str(e)}
+                if summary and summary["status"] == "success":
+                    progress.progress(1.0, text="Done")
+                    st.success(
+                        f"Knowledge synchronized: {summary['added']} added, {summary['skipped']} already stored "
+                        f"({summary['docs_per_sec']} docs/s)."
+                    )
+                else:
+                    st.error(f"Ingest Failed: {(summary or {}).get('message', 'no summary received')}")
 
     st.divider()
     
     with st.container(border=True):
         st.subheader("🔍 Semantic Retrieval")
         query = st.text_input("Ask a question to your KB...")
+        search_cols = st.columns(3)
+        with search_cols[0]:
+            mode = st.selectbox("Mode", ["vector", "lexical", "hybrid"])
+        with search_cols[1]:
+            n_results = st.slider("Results", 1, 20, 3)
+        with search_cols[2]:
+            searched = st.multiselect("Collections", collections, default=collections[:1], format_func=lambda name: name or "default")
         if query:
-            with st.status("Searching vector space..."):
-                time.sleep(0.5)
-                st.write("Top match: *Simulated results for PoC*")
+            with st.status("Searching vector space...") as status:
+                result = search_kb(query, n_results, mode, [name for name in searched if name] or None)
+                if result.get("status") == "success":
+                    status.update(label=f"{len(result['results'])} matches in {result['elapsed_ms']} ms", state="complete")
+                    for rank, document in enumerate(result["results"], 1):
+                        st.markdown(f"**{rank}.** {document}")
+                    if not result["results"]:
+                        st.write("No matches.")
+                else:
+                    status.update(label="Search failed", state="error")
+                    st.error(result.get("message"))
 
 # --- API Endpoints View ---
 elif menu == "🔗 API Endpoints":
@@ -270,9 +433,21 @@ elif menu == "🔗 API Endpoints":
     
     endpoints = [
         {"method": "GET", "path": "/", "desc": "Health check and welcome message"},
+        {"method": "GET", "path": "/health/live", "desc": "Liveness probe"},
+        {"method": "GET", "path": "/health/ready", "desc": "Readiness probe (503 until the knowledge base is warm)"},
         {"method": "GET", "path": "/metrics", "desc": "Live server statistics (JSON)"},
+        {"method": "GET", "path": "/metrics/prometheus", "desc": "Metrics in Prometheus text format"},
         {"method": "GET", "path": "/config", "desc": "Current YAML configuration"},
         {"method": "POST", "path": "/config/update", "desc": "Hot-reload configuration"},
+        {"method": "POST", "path": "/kb/ingest", "desc": "Bulk NDJSON ingestion with streamed progress"},
+        {"method": "POST", "path": "/kb/search", "desc": "Knowledge base search (vector, lexical or hybrid)"},
+        {"method": "POST", "path": "/kb/delete", "desc": "Delete documents (and their chunks) by ID"},
+        {"method": "POST", "path": "/kb/compact", "desc": "Sweep expired documents and reclaim deleted space now"},
+        {"method": "GET", "path": "/kb/export", "desc": "Stream a collection snapshot with its embeddings"},
+        {"method": "POST", "path": "/kb/import", "desc": "Load a snapshot without re-embedding"},
+        {"method": "GET", "path": "/resources/read?uri=", "desc": "Stream an MCP resource (e.g. kb://doc/{id})"},
+        {"method": "GET", "path": "/logs", "desc": "Filtered event log, read from a cursor"},
+        {"method": "GET", "path": "/logs/stream", "desc": "Live event log tail (SSE)"},
         {"method": "GET", "path": "/mcp/sse", "desc": "MCP Protocol SSE connection"},
         {"method": "POST", "path": "/mcp/messages", "desc": "MCP Message routing"},
     ]
@@ -291,8 +466,13 @@ elif menu == "⚙️ Configuration":
     st.warning("Dynamic Reloading: Changes here update Tools and Resources without downtime.")
     
     current_config = get_config()
+    if current_config.get("restart_pending"):
+        st.info(
+            "Applied after a server restart: "
+            + ", ".join(f"`{path}`" for path in current_config["restart_pending"])
+        )
     with st.container(border=True):
-        new_config = st.text_area("YAML Definition", value=current_config, height=500)
+        new_config = st.text_area("YAML Definition", value=current_config.get("yaml", ""), height=500)
         if st.button("🔥 Deploy Configuration"):
             result = update_config(new_config)
             if result.get("status") == "success":
@@ -304,7 +484,41 @@ elif menu == "⚙️ Configuration":
 # --- Logs View ---
 elif menu == "📋 System Logs":
     st.header("📋 Runtime Stream")
+    filter_cols = st.columns(3)
+    with filter_cols[0]:
+        kind = st.selectbox("Kind", ["", "tool", "resource"])
+    with filter_cols[1]:
+        outcome = st.selectbox("Outcome", ["", "ok", "error", "rejected"])
+    with filter_cols[2]:
+        name = st.text_input("Tool / resource name")
+    filters = {"kind": kind, "outcome": outcome, "name": name}
+
+    # Only events past the cursor are fetched; earlier ones are kept in the session
+    if st.session_state.get("log_filters") != filters:
+        st.session_state.log_filters = filters
+        st.session_state.log_cursor = None
+        st.session_state.log_events = []
+    page = get_logs(st.session_state.log_cursor, **filters)
+    if page is None:
+        st.error("❌ Link Severed: Backend Unreachable")
+    else:
+        if page["missed"]:
+            st.warning(f"{page['missed']} events were overwritten before they could be read")
+        st.session_state.log_cursor = page["cursor"]
+        st.session_state.log_events = (st.session_state.log_events + page["events"])[-1000:]
+
     with st.container(border=True):
-        st.code("Initializing MCP Server...\nVector Database connected.\nHTTP Server listening on port 8000\n[MCP] List tools requested\n[MCP] Call tool 'calculator' successful", language="text")
+        events = st.session_state.log_events
+        if events:
+            df = pd.DataFrame(reversed(events))
+            df["time"] = pd.to_datetime(df["ts"], unit="s").dt.strftime("%H:%M:%S.%f").str[:-3]
+            st.dataframe(
+                df[["seq", "time", "kind", "name", "outcome", "duration_ms", "session_id", "detail"]],
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info("No events yet. Call a tool or read a resource to see it here.")
         if st.button("🔄 Refresh Stream"):
-            st.toast("Logs flushed")
+            st.rerun()
+        st.caption(f"Live tail: `{BACKEND_URL}/logs/stream` (Server-Sent Events)")